@@ -1,26 +1,62 @@
 import json
 import logging
+import sys
 from argparse import Namespace
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from copy import copy
 from os import environ
 from pathlib import Path
 from shutil import which
+from threading import Lock
 
 from python.runfiles import Runfiles
 
 from dwyu.apply_fixes.bazel_query import BazelQuery
 from dwyu.apply_fixes.buildozer_executor import BuildozerExecutor
-from dwyu.apply_fixes.get_dwyu_reports import gather_reports, get_reports_search_dir
-from dwyu.apply_fixes.search_missing_deps import search_missing_deps
+from dwyu.apply_fixes.get_dwyu_reports import (
+    LOG_FROM_STDIN,
+    gather_processed_dep_files,
+    gather_reports,
+    gather_reports_from_build_events,
+    gather_reports_from_log_stream,
+    get_report_configuration,
+    get_reports_search_dir,
+    query_reports,
+    read_manifests,
+)
+from dwyu.apply_fixes.graph_snapshot import load_graph_snapshot
+from dwyu.apply_fixes.journal import ReportJournal
+from dwyu.apply_fixes.merge_reports import MERGE_UNION, merge_reports_per_target
+from dwyu.apply_fixes.query_cache import QueryCache
+from dwyu.apply_fixes.search_missing_deps import (
+    ConfiguredDependencyGraph,
+    DependencyGraph,
+    HeaderProviders,
+    ProcessedDepsIndex,
+    UnresolvedHeaders,
+    query_configured_dependency_graph,
+    query_dependency_graph,
+    search_missing_deps,
+)
 from dwyu.apply_fixes.utils import args_string_to_list
+from dwyu.apply_fixes.visibility import VisibilityChecker
 
 log = logging.getLogger()
 
 # Bazel sets this environment for 'bazel run' to document the workspace root
 WORKSPACE_ENV_VAR = "BUILD_WORKSPACE_DIRECTORY"
 
+# The DWYU aspect writes reports as compact JSON with ordered keys
+ANALYZED_TARGET_PREFIX = b'{"analyzed_target":"'
+CLEAN_REPORT_MARKER = b'"is_ok":true'
+
 # From https://registry.bazel.build/modules/buildozer
 BUNDLED_BUILDOZER = "buildozer_binary/buildozer.exe"
 
+# Amount of reports with findings after which the fixes queued while the DWYU build is still running are executed
+STREAMED_FIXES_BATCH_SIZE = 50
+
 
 class RequestedFixes:
     def __init__(self, main_args: Namespace) -> None:
@@ -28,6 +64,31 @@ class RequestedFixes:
         self.move_private_deps_to_impl_deps = main_args.fix_deps_which_should_be_private or main_args.fix_all
         self.add_missing_deps = main_args.fix_missing_deps or main_args.fix_all
 
+    @property
+    def kinds(self) -> list[str]:
+        """
+        Names of the requested kinds of fixes, as recorded in the journal.
+        """
+        return [
+            kind
+            for kind, requested in (
+                ("fix_unused", self.remove_unused_deps),
+                ("fix_private", self.move_private_deps_to_impl_deps),
+                ("fix_missing", self.add_missing_deps),
+            )
+            if requested
+        ]
+
+    @property
+    def fixes_dep_findings(self) -> bool:
+        return self.remove_unused_deps or self.move_private_deps_to_impl_deps
+
+    def without_dep_findings(self) -> "RequestedFixes":
+        remaining = copy(self)
+        remaining.remove_unused_deps = False
+        remaining.move_private_deps_to_impl_deps = False
+        return remaining
+
 
 def check_bazel_available() -> bool:
     if not which("bazel"):
@@ -81,52 +142,380 @@ def add_discovered_deps(
         buildozer.execute(task=f"add implementation_deps {' '.join(list(set(add_to_impl_deps)))}", target=target)
 
 
-def perform_fixes(
-    bazel_query: BazelQuery, buildozer: BuildozerExecutor, report: Path, requested_fixes: RequestedFixes
-) -> None:
-    with report.open(encoding="utf-8") as report_in:
-        content = json.load(report_in)
-        target = content["analyzed_target"]
-        buildozer_target = buildozer.adapt_target_to_platform(target)
-
-        if requested_fixes.remove_unused_deps:
-            if unused_deps := buildozer.adapt_targets_to_platform(content["unused_deps"]):
-                buildozer.execute(task=f"remove deps {' '.join(unused_deps)}", target=buildozer_target)
-            if unused_impl_deps := buildozer.adapt_targets_to_platform(content["unused_implementation_deps"]):
-                buildozer.execute(
-                    task=f"remove implementation_deps {' '.join(unused_impl_deps)}", target=buildozer_target
-                )
+def load_json_file(file: Path) -> dict:
+    with file.open(encoding="utf-8") as file_in:
+        return json.load(file_in)
 
-        if requested_fixes.move_private_deps_to_impl_deps:
-            deps_which_should_be_private = buildozer.adapt_targets_to_platform(content["deps_which_should_be_private"])
-            if deps_which_should_be_private:
-                buildozer.execute(
-                    task=f"move deps implementation_deps {' '.join(deps_which_should_be_private)}",
-                    target=buildozer_target,
-                )
 
-        if requested_fixes.add_missing_deps:
-            # Do not adapt the added targets to the platform. In BUILD files one should universally use the UNIX style.
-            # Buildozer adds the dependencies purely via string replacement without handling them like a path.
-            discovered_missing_public_deps = search_missing_deps(
-                bazel_query=bazel_query,
-                target=target,
-                headers_without_direct_dep=content["public_includes_without_dep"],
+def load_report(report: Path) -> dict:
+    """
+    Usually, most reports belong to targets without findings. For those we only need to know the analyzed target. The
+    DWYU aspect writes the analyzed target as first key and a compact marker for reports without findings. Thus, we
+    can detect those reports without decoding them.
+    """
+    content = report.read_bytes()
+    if content.startswith(ANALYZED_TARGET_PREFIX) and CLEAN_REPORT_MARKER in content:
+        target_end = content.index(b'"', len(ANALYZED_TARGET_PREFIX))
+        return {"analyzed_target": content[len(ANALYZED_TARGET_PREFIX) : target_end].decode(), "is_ok": True}
+    return json.loads(content)
+
+
+def index_processed_deps(
+    reports: dict[Path, dict], bazel_query: BazelQuery, pool: ThreadPoolExecutor
+) -> ProcessedDepsIndex:
+    processed_dep_files = gather_processed_dep_files(
+        {report: content["analyzed_target"] for report, content in reports.items()}
+    )
+    log.debug(f"Indexing {len(processed_dep_files)} processed dependency files")
+    processed_deps = list(pool.map(load_json_file, [file for _, file in processed_dep_files]))
+
+    # Only ask Bazel for the repository mapping if there are external dependencies with canonical names
+    uses_canonical_repo_names = any(
+        dep["target"].startswith("@@") and not dep["target"].startswith("@@//") for dep in processed_deps
+    )
+    index = ProcessedDepsIndex(
+        apparent_repo_names=bazel_query.get_apparent_repo_names() if uses_canonical_repo_names else None
+    )
+    for content in reports.values():
+        index.add_analyzed_target(content["analyzed_target"])
+    for (target, _), processed_dep in zip(processed_dep_files, processed_deps, strict=True):
+        index.add_processed_dep(target=target, processed_dep=processed_dep)
+    return index
+
+
+def group_targets_by_configuration(targets: list[str], reports: dict[Path, dict]) -> dict[str | None, list[str]]:
+    selected_targets = set(targets)
+    targets_per_configuration: dict[str | None, list[str]] = {}
+    for report, content in reports.items():
+        if content["analyzed_target"] in selected_targets:
+            targets_per_configuration.setdefault(get_report_configuration(report), []).append(
+                content["analyzed_target"]
             )
-            discovered_missing_private_deps = search_missing_deps(
-                bazel_query=bazel_query,
-                target=target,
-                headers_without_direct_dep=content["private_includes_without_dep"],
+    return targets_per_configuration
+
+
+def get_dependency_graph(
+    bazel_query: BazelQuery,
+    targets: list[str],
+    reports: dict[Path, dict],
+    graph_snapshot: Path | None,
+    visibility: VisibilityChecker,
+) -> DependencyGraph | ConfiguredDependencyGraph:
+    """
+    For 'bazel query' we can gather the dependency graph of all targets with a single batched query instead of
+    executing one query per target. The configured graph of 'bazel cquery' is queried once per configuration in which
+    DWYU analyzed the targets, which we deduce from the location of the reports. A graph snapshot replaces querying
+    the graph. Targets which are not part of the snapshot are queried individually.
+    """
+    if graph_snapshot:
+        dependency_graph, package_groups = load_graph_snapshot(graph_snapshot)
+        for name, package_group in package_groups.items():
+            visibility.register_package_group(name=name, package_group=package_group)
+        return dependency_graph
+
+    if bazel_query.uses_cquery:
+        targets_per_configuration = group_targets_by_configuration(targets=targets, reports=reports)
+        log.debug(
+            f"Querying the configured dependency graph of {len(targets)} targets with missing dependencies in "
+            f"{len(targets_per_configuration)} configurations"
+        )
+        return query_configured_dependency_graph(
+            bazel_query=bazel_query, targets_per_configuration=targets_per_configuration
+        )
+
+    log.debug(f"Querying the dependency graph of {len(targets)} targets with missing dependencies")
+    return query_dependency_graph(bazel_query=bazel_query, targets=targets)
+
+
+def discover_reports(args: Namespace, workspace: Path) -> Iterable[Path]:
+    if args.build_event_json_file:
+        log.debug(f"Build event file: '{args.build_event_json_file}'")
+        return gather_reports_from_build_events(args.build_event_json_file)
+
+    if args.dwyu_log_file == LOG_FROM_STDIN and not args.dwyu_targets:
+        # 'bazel info' would wait until the build writing the log is finished. Thus, use the convenience symlink.
+        reports_search_dir = args.reports_search_path or workspace / "bazel-bin"
+        log.debug(f"Reports search directory: '{reports_search_dir}'")
+        return gather_reports_from_log_stream(log=sys.stdin, search_path=reports_search_dir)
+
+    reports_search_dir = get_reports_search_dir(main_args=args, workspace_root=workspace)
+    log.debug(f"Reports search directory: '{reports_search_dir}'")
+    if args.dwyu_targets:
+        return query_reports(main_args=args, workspace_root=workspace, search_path=reports_search_dir)
+    return gather_reports(main_args=args, search_path=reports_search_dir)
+
+
+def reports_arrive_while_building(args: Namespace) -> bool:
+    """
+    Whether the reports are discovered from the output of a DWYU build which might still be running.
+    """
+    if args.dwyu_manifest:
+        return False
+    return bool(args.build_event_json_file) or (args.dwyu_log_file == LOG_FROM_STDIN and not args.dwyu_targets)
+
+
+def load_and_announce_report(report: Path, on_report_loaded: Callable[[Path, dict], None] | None) -> dict:
+    content = load_report(report)
+    if on_report_loaded:
+        on_report_loaded(report, content)
+    return content
+
+
+def load_reports(
+    args: Namespace,
+    workspace: Path,
+    pool: ThreadPoolExecutor,
+    on_report_loaded: Callable[[Path, dict], None] | None = None,
+) -> dict[Path, dict]:
+    if args.dwyu_manifest:
+        reports_search_dir = get_reports_search_dir(main_args=args, workspace_root=workspace)
+        log.debug(f"Reports search directory: '{reports_search_dir}'")
+        return read_manifests(manifests=args.dwyu_manifest, search_path=reports_search_dir)
+
+    # Reports announced by a still running build are loaded as soon as they are available
+    loading = {
+        report: pool.submit(load_and_announce_report, report, on_report_loaded)
+        for report in discover_reports(args, workspace)
+    }
+    return {report: loading_report.result() for report, loading_report in loading.items()}
+
+
+def get_targets_with_missing_deps(reports: Iterable[dict]) -> list[str]:
+    return [
+        report["analyzed_target"]
+        for report in reports
+        if report["public_includes_without_dep"] or report["private_includes_without_dep"]
+    ]
+
+
+def select_reports_to_fix(reports: dict[Path, dict], journal: ReportJournal | None) -> dict[Path, dict]:
+    """
+    Reports without findings are only relevant for knowing which targets have been analyzed. Reports recorded in the
+    journal have already been processed in a previous execution.
+    """
+    reports_with_findings = {report: content for report, content in reports.items() if not content.get("is_ok")}
+    log.debug(f"Skipping {len(reports) - len(reports_with_findings)} reports without findings")
+    if not journal:
+        return reports_with_findings
+
+    unprocessed = {
+        report: content
+        for report, content in reports_with_findings.items()
+        if not journal.is_processed(report=report, content=content)
+    }
+    log.info(f"Skipping {len(reports_with_findings) - len(unprocessed)} reports which have already been processed")
+    return unprocessed
+
+
+class AppliedFixesRecorder:
+    """
+    Record the reports in the journal as soon as all buildozer commands for their target have been executed. Thus, an
+    interrupted execution keeps the progress made so far. Reports for whose target a buildozer command failed are not
+    recorded to retry them in the next execution.
+
+    The results of commands executed in earlier flushes, e.g. while the DWYU build was still running, are taken into
+    account when recording the reports of their target.
+    """
+
+    def __init__(
+        self,
+        journal: ReportJournal,
+        reports: dict[Path, dict],
+        buildozer: BuildozerExecutor,
+        previous_results: dict[str, list[int]] | None = None,
+    ) -> None:
+        self._journal = journal
+        self._reports_per_target: dict[str, list[tuple[Path, dict]]] = {}
+        for report, content in reports.items():
+            target = buildozer.adapt_target_to_platform(content["analyzed_target"])
+            self._reports_per_target.setdefault(target, []).append((report, content))
+        self._previous_results = dict(previous_results or {})
+        self._lock = Lock()
+
+    def record_flushed_targets(self, results: dict[str, list[int]]) -> None:
+        with self._lock:
+            processed = []
+            for target, target_results in results.items():
+                processed.extend(
+                    self._make_records(target=target, results=self._previous_results.pop(target, []) + target_results)
+                )
+            self._journal.record(processed)
+
+    def record_remaining(self) -> None:
+        """
+        Record the reports for whose target no buildozer command had to be executed in the last flush.
+        """
+        with self._lock:
+            self._journal.record(
+                record
+                for target in list(self._reports_per_target)
+                for record in self._make_records(target=target, results=self._previous_results.pop(target, []))
             )
-            add_discovered_deps(
-                extra_public_deps=discovered_missing_public_deps,
-                extra_private_deps=discovered_missing_private_deps,
+
+    def _make_records(self, target: str, results: list[int]) -> list[tuple[Path, dict, int]]:
+        reports = self._reports_per_target.pop(target, [])
+        # Buildozer return codes: 0 for a change, 2 for a failure and 3 for no change
+        if 2 in results:
+            return []
+        return [(report, content, results.count(0)) for report, content in reports]
+
+
+class StreamedFixes:
+    """
+    Fix the findings about existing dependencies as soon as a report is loaded, while the DWYU build announcing the
+    reports is still running. This is only possible with the union merge strategy, for which fixing each report of a
+    target on its own is equivalent to fixing the merged report of the target. Adding missing dependencies has to wait
+    until all reports are loaded, as the dependency graph is queried for all targets at once and Bazel cannot answer
+    queries while it is building.
+
+    The queued commands are executed in batches. Their results are kept to record the reports in the journal later.
+    """
+
+    def __init__(
+        self, buildozer: BuildozerExecutor, requested_fixes: RequestedFixes, journal: ReportJournal | None
+    ) -> None:
+        self._buildozer = buildozer
+        self._requested_fixes = requested_fixes
+        self._journal = journal
+        self._queued_reports = 0
+        self._results: dict[str, list[int]] = {}
+        self._lock = Lock()
+        self._flush_lock = Lock()
+
+    @property
+    def results(self) -> dict[str, list[int]]:
+        return self._results
+
+    def add_report(self, report: Path, content: dict) -> None:
+        if content.get("is_ok") or (self._journal and self._journal.is_processed(report=report, content=content)):
+            return
+        fix_dep_findings(buildozer=self._buildozer, content=content, requested_fixes=self._requested_fixes)
+
+        with self._lock:
+            self._queued_reports += 1
+            if self._queued_reports < STREAMED_FIXES_BATCH_SIZE:
+                return
+            self._queued_reports = 0
+        self._flush()
+
+    def _flush(self) -> None:
+        # Commands queued while another batch is executed are executed with the next batch
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._buildozer.flush(on_targets_flushed=self._record_results)
+        finally:
+            self._flush_lock.release()
+
+    def _record_results(self, results: dict[str, list[int]]) -> None:
+        with self._lock:
+            for target, target_results in results.items():
+                self._results.setdefault(target, []).extend(target_results)
+
+
+def make_streamed_fixes(
+    args: Namespace, buildozer: BuildozerExecutor, requested_fixes: RequestedFixes, journal: ReportJournal | None
+) -> StreamedFixes | None:
+    """
+    Findings about existing dependencies are fixed while the DWYU build is still running, if the reports of the same
+    target do not have to be intersected before fixing them.
+    """
+    if (
+        reports_arrive_while_building(args)
+        and args.merge_findings == MERGE_UNION
+        and requested_fixes.fixes_dep_findings
+    ):
+        return StreamedFixes(buildozer=buildozer, requested_fixes=requested_fixes, journal=journal)
+    return None
+
+
+def fix_dep_findings(buildozer: BuildozerExecutor, content: dict, requested_fixes: RequestedFixes) -> None:
+    """
+    Fix the findings about existing dependencies, which in contrast to adding missing dependencies requires no
+    information about the dependency graph.
+    """
+    buildozer_target = buildozer.adapt_target_to_platform(content["analyzed_target"])
+
+    if requested_fixes.remove_unused_deps:
+        if unused_deps := buildozer.adapt_targets_to_platform(content["unused_deps"]):
+            buildozer.execute(task=f"remove deps {' '.join(unused_deps)}", target=buildozer_target)
+        if unused_impl_deps := buildozer.adapt_targets_to_platform(content["unused_implementation_deps"]):
+            buildozer.execute(task=f"remove implementation_deps {' '.join(unused_impl_deps)}", target=buildozer_target)
+
+    if requested_fixes.move_private_deps_to_impl_deps:
+        deps_which_should_be_private = buildozer.adapt_targets_to_platform(content["deps_which_should_be_private"])
+        if deps_which_should_be_private:
+            buildozer.execute(
+                task=f"move deps implementation_deps {' '.join(deps_which_should_be_private)}",
                 target=buildozer_target,
-                buildozer=buildozer,
-                use_impl_deps=content["use_implementation_deps"],
             )
 
 
+def perform_fixes(
+    bazel_query: BazelQuery,
+    buildozer: BuildozerExecutor,
+    content: dict,
+    requested_fixes: RequestedFixes,
+    dependency_graph: DependencyGraph | ConfiguredDependencyGraph | None = None,
+    visibility: VisibilityChecker | None = None,
+    processed_deps: ProcessedDepsIndex | None = None,
+    header_providers: HeaderProviders | None = None,
+    unresolved_headers: UnresolvedHeaders | None = None,
+) -> None:
+    target = content["analyzed_target"]
+    buildozer_target = buildozer.adapt_target_to_platform(target)
+
+    fix_dep_findings(buildozer=buildozer, content=content, requested_fixes=requested_fixes)
+
+    if requested_fixes.add_missing_deps:
+        # Do not adapt the added targets to the platform. In BUILD files one should universally use the UNIX style.
+        # Buildozer adds the dependencies purely via string replacement without handling them like a path.
+        discovered_missing_public_deps = search_missing_deps(
+            bazel_query=bazel_query,
+            target=target,
+            headers_without_direct_dep=content["public_includes_without_dep"],
+            dependency_graph=dependency_graph,
+            visibility=visibility,
+            processed_deps=processed_deps,
+            header_providers=header_providers,
+            unresolved_headers=unresolved_headers,
+        )
+        discovered_missing_private_deps = search_missing_deps(
+            bazel_query=bazel_query,
+            target=target,
+            headers_without_direct_dep=content["private_includes_without_dep"],
+            dependency_graph=dependency_graph,
+            visibility=visibility,
+            processed_deps=processed_deps,
+            header_providers=header_providers,
+            unresolved_headers=unresolved_headers,
+        )
+        add_discovered_deps(
+            extra_public_deps=discovered_missing_public_deps,
+            extra_private_deps=discovered_missing_private_deps,
+            target=buildozer_target,
+            buildozer=buildozer,
+            use_impl_deps=content["use_implementation_deps"],
+        )
+
+
+def execute_fixes(
+    buildozer: BuildozerExecutor,
+    journal: ReportJournal | None,
+    reports: dict[Path, dict],
+    previous_results: dict[str, list[int]] | None,
+) -> None:
+    if not journal:
+        buildozer.flush()
+        return
+
+    recorder = AppliedFixesRecorder(
+        journal=journal, reports=reports, buildozer=buildozer, previous_results=previous_results
+    )
+    buildozer.flush(on_targets_flushed=recorder.record_flushed_targets)
+    recorder.record_remaining()
+
+
 def main(args: Namespace) -> int:
     if args.verbose:
         log.setLevel(logging.DEBUG)
@@ -147,37 +536,114 @@ def main(args: Namespace) -> int:
         return 1
     log.debug(f"Workspace: '{workspace}'")
 
-    reports_search_dir = get_reports_search_dir(main_args=args, workspace_root=workspace)
-    log.debug(f"Reports search directory: '{reports_search_dir}'")
-
-    reports = gather_reports(main_args=args, search_path=reports_search_dir)
-    if not reports:
-        log.fatal(
-            """
-ERROR: Did not find any DWYU report files.
-Did you forget to run DWYU beforehand?
-Maybe the tool used the wrong output directory, have a look at the apply_fixes CLI options via '--help'.
-        """.strip()
-        )
-        return 1
-
     bazel_query = BazelQuery(
         workspace=workspace,
         use_cquery=args.use_cquery,
         query_args=args_string_to_list(args.bazel_args),
         startup_args=args_string_to_list(args.bazel_startup_args),
+        cache=QueryCache(directory=args.query_cache_dir, workspace=workspace) if args.query_cache_dir else None,
     )
     buildozer_executor = BuildozerExecutor(
         binary=buildozer_binary,
         buildozer_args=args_string_to_list(args.buildozer_args),
         workspace=workspace,
         dry=args.dry_run,
+        jobs=args.jobs,
+    )
+    requested_fixes = RequestedFixes(args)
+    journal = ReportJournal(file=args.journal, fix_kinds=requested_fixes.kinds) if args.journal else None
+
+    streamed_fixes = make_streamed_fixes(
+        args=args, buildozer=buildozer_executor, requested_fixes=requested_fixes, journal=journal
     )
-    for report in reports:
-        log.debug(f"Processing report file '{report}'")
-        perform_fixes(
-            report=report, bazel_query=bazel_query, buildozer=buildozer_executor, requested_fixes=RequestedFixes(args)
+    if streamed_fixes:
+        # Only the remaining fixes are performed after loading all reports. The commands queued for the last batch of
+        # streamed fixes are executed together with them.
+        requested_fixes = requested_fixes.without_dep_findings()
+
+    # Reports are loaded and processed in a thread pool, which overlaps reading report files and waiting on Bazel. The
+    # matching itself is pure Python and does not run in parallel. Bazel queries are serialized by BazelQuery and
+    # buildozer commands are queued until all reports have been processed, unless they are fixed while the build is
+    # running. Only the buildozer processes run in parallel.
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        loaded_reports = load_reports(
+            args=args,
+            workspace=workspace,
+            pool=pool,
+            on_report_loaded=streamed_fixes.add_report if streamed_fixes else None,
         )
+        if not loaded_reports:
+            log.fatal(
+                """
+ERROR: Did not find any DWYU report files.
+Did you forget to run DWYU beforehand?
+Maybe the tool used the wrong output directory, have a look at the apply_fixes CLI options via '--help'.
+        """.strip()
+            )
+            return 1
+
+        processed_deps = None
+        # Reports for the same target from multiple configurations are fixed together
+        merged_reports = merge_reports_per_target(reports=loaded_reports, strategy=args.merge_findings)
+        reports_to_fix = select_reports_to_fix(reports=merged_reports, journal=journal)
+
+        targets = get_targets_with_missing_deps(reports_to_fix.values()) if requested_fixes.add_missing_deps else []
+        if targets and args.use_processed_deps:
+            # Targets whose transitive dependencies are covered by the files of the DWYU aspect need no query at all
+            processed_deps = index_processed_deps(reports=loaded_reports, bazel_query=bazel_query, pool=pool)
+            targets = [target for target in targets if processed_deps.get_dependencies(target) is None]
+
+        # Shared between all reports to reuse the visibility and header information across targets
+        visibility = VisibilityChecker(bazel_query)
+        header_providers = HeaderProviders()
+        unresolved_headers = UnresolvedHeaders()
+        dependency_graph = (
+            get_dependency_graph(
+                bazel_query=bazel_query,
+                targets=targets,
+                reports=reports_to_fix,
+                graph_snapshot=args.graph_snapshot,
+                visibility=visibility,
+            )
+            if targets
+            else None
+        )
+
+        fixes = []
+        for report, content in reports_to_fix.items():
+            log.debug(f"Processing report file '{report}'")
+            fixes.append(
+                pool.submit(
+                    perform_fixes,
+                    bazel_query=bazel_query,
+                    buildozer=buildozer_executor,
+                    content=content,
+                    requested_fixes=requested_fixes,
+                    dependency_graph=dependency_graph,
+                    visibility=visibility,
+                    processed_deps=processed_deps,
+                    header_providers=header_providers,
+                    unresolved_headers=unresolved_headers,
+                )
+            )
+        for fix in fixes:
+            fix.result()
+
+    unresolved_headers.log_summary()
+
+    # Reports with headers for which no dependency was selected are not recorded to retry them in the next execution,
+    # e.g. after making the missing dependency available or visible
+    unresolved_targets = unresolved_headers.targets
+    execute_fixes(
+        buildozer=buildozer_executor,
+        journal=None if args.dry_run else journal,
+        reports={
+            report: content
+            for report, content in reports_to_fix.items()
+            if content["analyzed_target"] not in unresolved_targets
+        },
+        previous_results=streamed_fixes.results if streamed_fixes else None,
+    )
     buildozer_executor.summary.print_summary()
 
     return 0
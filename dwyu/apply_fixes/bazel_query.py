@@ -1,28 +1,227 @@
+import json
+import logging
+import re
+import shlex
+import subprocess
+from collections.abc import Iterator
+from contextlib import contextmanager
+from io import StringIO
 from pathlib import Path
 from subprocess import CompletedProcess
+from tempfile import TemporaryDirectory, TemporaryFile
+from threading import Lock
+from typing import TextIO
 
+from dwyu.apply_fixes.query_cache import QueryCache
 from dwyu.apply_fixes.utils import execute_and_capture
 
+log = logging.getLogger()
+
+# Amount of characters read at once when decoding a query output stream
+STREAM_CHUNK_SIZE = 64 * 1024
+
+JSONPROTO_RESULTS_START = re.compile(r'"results"\s*:\s*\[')
+JSONPROTO_RESULTS_SEPARATOR = re.compile(r"[\s,]*")
+
+
+def iter_streamed_jsonproto(output: TextIO) -> Iterator[dict]:
+    """
+    Decode the records of the 'streamed_jsonproto' output, which consists of one JSON document per line.
+    """
+    for line in output:
+        if line.strip():
+            yield json.loads(line)
+
+
+def decode_jsonproto_trailer(trailer: str) -> dict:
+    """
+    Decode the fields following the results array of the 'jsonproto' output, e.g. ', "configurations": [...]}'.
+    """
+    trailer = trailer.strip().removeprefix(",")
+    try:
+        return json.loads("{" + trailer)
+    except json.JSONDecodeError as err:
+        raise ValueError(f"Unexpected end of the jsonproto query output: '{trailer[:100]}'") from err
+
+
+def iter_jsonproto_results(output: TextIO, configurations: list[dict] | None = None) -> Iterator[dict]:
+    """
+    The 'jsonproto' output of cquery is a single JSON document '{"results": [...], "configurations": [...]}'. Instead
+    of decoding the whole document at once, we read the output in chunks and decode the individual results as soon as
+    they are complete.
+
+    The results reference their configuration, whose details are only listed in the 'configurations' table following
+    the results. If a list is provided via 'configurations', it is extended by this table after the last result has
+    been yielded.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    in_results = False
+    for chunk in iter(lambda: output.read(STREAM_CHUNK_SIZE), ""):
+        buffer += chunk
+        if not in_results:
+            if (results_start := JSONPROTO_RESULTS_START.search(buffer)) is None:
+                continue
+            buffer = buffer[results_start.end() :]
+            in_results = True
+
+        pos = 0
+        while True:
+            pos = JSONPROTO_RESULTS_SEPARATOR.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            if buffer[pos] == "]":
+                if configurations is not None:
+                    trailer = decode_jsonproto_trailer(buffer[pos + 1 :] + output.read())
+                    configurations.extend(trailer.get("configurations", []))
+                return
+            try:
+                result, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # The result is not yet complete
+                break
+            yield result
+        buffer = buffer[pos:]
+
+    if in_results:
+        raise ValueError(f"Unexpected end of the jsonproto query output: '{buffer[:100]}'")
+
 
 class BazelQuery:
-    def __init__(self, workspace: Path, use_cquery: bool, query_args: list[str], startup_args: list[str]) -> None:
+    def __init__(
+        self,
+        workspace: Path,
+        use_cquery: bool,
+        query_args: list[str],
+        startup_args: list[str],
+        cache: QueryCache | None = None,
+    ) -> None:
         self._workspace = workspace
         self._use_cquery = use_cquery
         self._query_args = query_args
         self._startup_args = startup_args
+        self._cache = cache
+        self._lock = Lock()
+        self._repo_mapping: dict[str, str] | None = None
+
+    def execute(
+        self, query: str, args: list[str], enforce_query: bool = False, use_query_file: bool = False
+    ) -> CompletedProcess:
+        """
+        Queries covering many targets can exceed the command line length limit of the system. For those, we can pass
+        the query via a file to Bazel instead of as command line argument.
+
+        The Bazel server executes only one command at a time. Thus, concurrent callers are serialized here instead of
+        having them block each other on the Bazel server lock.
+        """
+        with self._lock:
+            if self._cache is None:
+                return self._execute(query=query, args=args, enforce_query=enforce_query, use_query_file=use_query_file)
+
+            # Key on the query itself instead of the temporary query file
+            key = self._cache.make_key(self._make_cmd(args=[*args, query], enforce_query=enforce_query))
+            if (cached_process := self._cache.load(key)) is not None:
+                log.debug(f"Using cached result for query: {query}")
+                return cached_process
+
+            process = self._execute(query=query, args=args, enforce_query=enforce_query, use_query_file=use_query_file)
+            self._cache.store(key=key, process=process)
+            return process
+
+    @contextmanager
+    def stream(
+        self, query: str, args: list[str], enforce_query: bool = False, use_query_file: bool = False
+    ) -> Iterator[TextIO]:
+        """
+        Provide the query output as stream while Bazel is still producing it. This allows processing large outputs
+        incrementally instead of buffering them completely in memory. Only a successful query is reported completely,
+        a failing query raises a CalledProcessError after the output has been processed.
 
-    def execute(self, query: str, args: list[str], enforce_query: bool = False) -> CompletedProcess:
+        When using the query cache, the output is buffered to be able to store it in the cache.
+        """
+        if self._cache is not None:
+            yield StringIO(
+                self.execute(query=query, args=args, enforce_query=enforce_query, use_query_file=use_query_file).stdout
+            )
+            return
+
+        with (
+            self._lock,
+            self._pass_query(query=query, args=args, use_query_file=use_query_file) as query_args,
+            TemporaryFile(mode="w+", encoding="utf-8") as stderr,
+        ):
+            cmd = self._make_cmd(args=query_args, enforce_query=enforce_query)
+            log.debug(f"Executing command: {shlex.join(cmd)}")
+            with subprocess.Popen(
+                cmd, cwd=self._workspace, stdout=subprocess.PIPE, stderr=stderr, text=True, encoding="utf-8"
+            ) as process:
+                try:
+                    yield process.stdout
+                except BaseException:
+                    process.kill()
+                    raise
+                # Bazel blocks if the pipe is full. Thus, consume output which was not processed.
+                while process.stdout.read(STREAM_CHUNK_SIZE):
+                    pass
+
+            if process.returncode != 0:
+                stderr.seek(0)
+                raise subprocess.CalledProcessError(returncode=process.returncode, cmd=cmd, stderr=stderr.read())
+
+    def get_repo_mapping(self) -> dict[str, str]:
+        """
+        Map the apparent names of the repositories visible to the main repository to their canonical names. Requires
+        Bzlmod and Bazel 7.1 or newer. Without those, no canonical repository names appear in labels to begin with.
+        The mapping is fetched only once.
+        """
+        with self._lock:
+            if self._repo_mapping is None:
+                cmd = ["bazel", *self._startup_args, "mod", "dump_repo_mapping", ""]
+                try:
+                    self._repo_mapping = json.loads(execute_and_capture(cmd=cmd, cwd=self._workspace).stdout)
+                except subprocess.CalledProcessError as error:
+                    log.warning(f"Failed to dump the repository mapping of the main repository:\n{error.stderr}")
+                    self._repo_mapping = {}
+            return self._repo_mapping
+
+    def get_apparent_repo_names(self) -> dict[str, str]:
+        """
+        Map the canonical names of the repositories visible to the main repository to their apparent names.
+        """
+        apparent_repo_names: dict[str, str] = {}
+        for apparent_name, canonical_name in sorted(self.get_repo_mapping().items()):
+            # The main repository is also visible under the name of the root module
+            if apparent_name and canonical_name:
+                apparent_repo_names.setdefault(canonical_name, apparent_name)
+        return apparent_repo_names
+
+    @property
+    def uses_cquery(self) -> bool:
+        return self._use_cquery
+
+    def _execute(self, query: str, args: list[str], enforce_query: bool, use_query_file: bool) -> CompletedProcess:
+        with self._pass_query(query=query, args=args, use_query_file=use_query_file) as query_args:
+            return execute_and_capture(
+                cmd=self._make_cmd(args=query_args, enforce_query=enforce_query), cwd=self._workspace
+            )
+
+    @contextmanager
+    def _pass_query(self, query: str, args: list[str], use_query_file: bool) -> Iterator[list[str]]:
+        if not use_query_file:
+            yield [*args, query]
+            return
+
+        with TemporaryDirectory() as tmp_dir:
+            query_file = Path(tmp_dir) / "query.txt"
+            query_file.write_text(query, encoding="utf-8")
+            yield [*args, f"--query_file={query_file}"]
+
+    def _make_cmd(self, args: list[str], enforce_query: bool) -> list[str]:
         query_kind = "query" if not self._use_cquery or enforce_query else "cquery"
-        cmd = [
+        return [
             "bazel",
             *self._startup_args,
             query_kind,
             *self._query_args,
             *args,
-            query,
         ]
-        return execute_and_capture(cmd=cmd, cwd=self._workspace)
-
-    @property
-    def uses_cquery(self) -> bool:
-        return self._use_cquery
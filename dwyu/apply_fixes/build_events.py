@@ -0,0 +1,122 @@
+import json
+import logging
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+log = logging.getLogger()
+
+DWYU_OUTPUT_GROUP = "dwyu"
+
+# Seconds to wait before checking again for new build events while Bazel is still writing the file
+POLL_INTERVAL = 0.1
+
+# Seconds without any new build event after which we assume the build is no longer running. Bazel publishes progress
+# events regularly, thus this is only reached if the build was aborted without writing the last build event.
+IDLE_TIMEOUT = 600
+
+
+def iter_build_events(
+    build_event_file: Path, poll_interval: float = POLL_INTERVAL, idle_timeout: float = IDLE_TIMEOUT
+) -> Iterator[dict]:
+    """
+    Decode the file created by Bazel via '--build_event_json_file', which contains one JSON document per build event.
+    The file can still be written by a running build. We follow the file until Bazel announces the last build event.
+    """
+    idle_since = time.monotonic()
+    while not build_event_file.is_file():
+        if time.monotonic() - idle_since > idle_timeout:
+            raise FileNotFoundError(f"ERROR: The provided build event file '{build_event_file}' does not exist.")
+        time.sleep(poll_interval)
+
+    with build_event_file.open(encoding="utf-8") as events:
+        line = ""
+        while True:
+            line += events.readline()
+            if not line.endswith("\n"):
+                # Bazel has not yet finished writing the current event
+                if time.monotonic() - idle_since > idle_timeout:
+                    raise RuntimeError(
+                        f"ERROR: The build event file '{build_event_file}' ended without the last build event. "
+                        "Has the build been aborted?"
+                    )
+                time.sleep(poll_interval)
+                continue
+
+            idle_since = time.monotonic()
+            if not line.strip():
+                line = ""
+                continue
+            event = json.loads(line)
+            line = ""
+            yield event
+            if event.get("lastMessage"):
+                return
+
+
+def file_uri_to_path(uri: str) -> Path:
+    parsed = urlparse(uri)
+    if parsed.scheme != "file":
+        raise RuntimeError(
+            f"ERROR: The DWYU report '{uri}' is not available in the local file system. Please ensure Bazel downloads"
+            " the DWYU reports when building remotely, e.g. via '--remote_download_regex=.*_dwyu_report\\.json$'."
+        )
+    return Path(url2pathname(parsed.path))
+
+
+def iter_reports_from_build_events(events: Iterator[dict], report_suffix: str) -> Iterator[Path]:
+    """
+    The files of an output group are published as named sets of files, which can reference further named sets. Bazel
+    announces each named set before the first event referencing it. We yield the reports of the 'dwyu' output group as
+    soon as the target or aspect producing them is completed.
+
+    The output group of each target contains the reports of all its dependencies. Named sets are shared between the
+    targets, thus each named set is expanded only once to yield each report only once.
+
+    A failed target does not list its output groups. Thus, the reports with findings, which are the ones we are
+    interested in, are taken from the events of the failed DWYU actions instead. Bazel publishes an event for each
+    failed action, with '--build_event_publish_all_actions' also for the successful ones.
+    """
+    named_sets: dict[str, dict] = {}
+    expanded_sets: set[str] = set()
+    yielded_reports: set[str] = set()
+
+    for event in events:
+        event_id = event.get("id", {})
+        if "namedSet" in event_id:
+            named_sets[event_id["namedSet"]["id"]] = event.get("namedSetOfFiles", {})
+            continue
+
+        if "actionCompleted" in event_id:
+            files = [event.get("action", {}).get("primaryOutput", {})]
+        elif "targetCompleted" in event_id:
+            files = expand_output_group(
+                completed=event.get("completed", {}), named_sets=named_sets, expanded_sets=expanded_sets
+            )
+        else:
+            continue
+
+        for file in files:
+            if file.get("name", "").endswith(report_suffix) and file["uri"] not in yielded_reports:
+                yielded_reports.add(file["uri"])
+                yield file_uri_to_path(file["uri"])
+
+
+def expand_output_group(completed: dict, named_sets: dict[str, dict], expanded_sets: set[str]) -> Iterator[dict]:
+    """
+    Yield the files of the 'dwyu' output group which are not part of an already expanded named set.
+    """
+    for output_group in completed.get("outputGroup", []):
+        if output_group.get("name") != DWYU_OUTPUT_GROUP:
+            continue
+        pending = [file_set["id"] for file_set in output_group.get("fileSets", [])]
+        while pending:
+            set_id = pending.pop()
+            if set_id in expanded_sets:
+                continue
+            expanded_sets.add(set_id)
+            named_set = named_sets.pop(set_id, {})
+            pending.extend(file_set["id"] for file_set in named_set.get("fileSets", []))
+            yield from named_set.get("files", [])
@@ -0,0 +1,71 @@
+import logging
+import sys
+from argparse import ArgumentParser, Namespace, RawDescriptionHelpFormatter
+from os import environ
+from pathlib import Path
+
+from dwyu.apply_fixes.graph_snapshot import build_graph_snapshot
+
+logging.basicConfig(format="%(message)s", level=logging.INFO)
+log = logging.getLogger()
+
+# Bazel sets this environment for 'bazel run' to document the directory from which the tool was invoked
+WORKING_DIRECTORY_ENV_VAR = "BUILD_WORKING_DIRECTORY"
+
+
+def cli() -> Namespace:
+    parser = ArgumentParser(
+        formatter_class=RawDescriptionHelpFormatter,
+        description="""
+Convert a recorded Bazel query dump into a graph snapshot, which can be provided to apply_fixes via '--graph-snapshot'.
+This allows searching missing dependencies without executing Bazel queries, e.g. by recording the dump once per commit in CI.
+
+The dump has to be recorded with '--output=streamed_jsonproto' and has to contain the rule inputs.
+The snapshot only knows about the recorded targets. Thus, the dump should contain the transitive dependencies of all targets of interest, including rules which are not cc_* rules, e.g. alias targets.
+Recording the package groups allows evaluating the visibility of dependencies offline as well.
+For example:
+  bazel query --output=streamed_jsonproto --noimplicit_deps \\
+    --proto:output_rule_attrs=hdrs,include_prefix,name,strip_include_prefix,visibility \\
+    'kind("rule", deps(//...)) + kind("package_group", //...)' > dump.jsonl
+    """.strip(),
+    )
+    parser.add_argument(
+        "--dump",
+        metavar="PATH",
+        type=Path,
+        required=True,
+        help="Recorded Bazel query output.",
+    )
+    parser.add_argument(
+        "--output",
+        metavar="PATH",
+        type=Path,
+        required=True,
+        help="Store the graph snapshot in this file.",
+    )
+    return parser.parse_args()
+
+
+def resolve_path(path: Path) -> Path:
+    """
+    'bazel run' executes the tool in its runfiles directory. Relative paths are meant relative to the user's working
+    directory, though.
+    """
+    working_dir = environ.get(WORKING_DIRECTORY_ENV_VAR)
+    return Path(working_dir) / path if working_dir and not path.is_absolute() else path
+
+
+def main(args: Namespace) -> int:
+    dump = resolve_path(args.dump)
+    if not dump.is_file():
+        log.fatal(f"ERROR: The provided query dump '{dump}' does not exist.")
+        return 1
+
+    output = resolve_path(args.output)
+    amount_rules = build_graph_snapshot(dump=dump, snapshot=output)
+    log.info(f"Stored graph snapshot with {amount_rules} rules in '{output}'")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(cli()))
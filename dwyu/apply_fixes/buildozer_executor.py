@@ -1,12 +1,24 @@
 import logging
+import re
 import subprocess
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 from platform import system
+from tempfile import TemporaryDirectory
+from threading import Lock
 
 from dwyu.apply_fixes.summary import Summary
+from dwyu.apply_fixes.utils import normalize_label
 
 log = logging.getLogger()
 
+# Buildozer reports errors for a specific target as 'error while executing commands [...] on target <label>: <error>'
+BUILDOZER_TARGET_ERROR = re.compile(r" on target (\S+): ")
+# Printing the attributes we edit before and after the tasks of a target tells whether the tasks changed the target
+PRINT_EDITED_ATTRIBUTES = "print label deps implementation_deps"
+
 
 class BuildozerExecutor:
     """
@@ -15,24 +27,74 @@ class BuildozerExecutor:
     There are several options influencing how buildozer should be executed. To allow setting and processing them
     centrally once we use buildozer through the indirection of this class. Furthermore, this allows us to automatically
     build up a summary of all executed commands.
+
+    Commands are not executed immediately, but queued until 'flush()' is called. The queued commands are executed via
+    buildozer commands files, in which all tasks for a target are combined into a single line. This prevents paying the
+    overhead of a dedicated buildozer process per command.
+
+    Commands can be queued concurrently. When flushing, the commands are grouped by the BUILD file they edit and the
+    groups are distributed over up to 'jobs' partitions. Each partition is executed by a single buildozer process and
+    the partitions are executed in parallel. The partitions are disjoint by BUILD file, thus no BUILD file is edited by
+    concurrent buildozer processes.
     """
 
-    def __init__(self, binary: str, buildozer_args: list[str], workspace: Path, dry: bool) -> None:
+    def __init__(self, binary: str, buildozer_args: list[str], workspace: Path, dry: bool, jobs: int = 1) -> None:
         self._base_cmd = self._make_base_cmd(binary=binary, args=buildozer_args, dry=dry)
         self._workspace = workspace
         self._dry = dry
+        self._jobs = jobs
 
         self._summary = Summary()
+        self._pending_tasks: dict[str, list[str]] = {}
+        self._lock = Lock()
 
     @property
     def summary(self) -> Summary:
         return self._summary
 
     def execute(self, task: str, target: str) -> None:
-        command = [*self._base_cmd, task, target]
-        log.log(logging.INFO if self._dry else logging.DEBUG, f"Executing buildozer command: {command}")
-        process = subprocess.run(command, cwd=self._workspace, check=False, capture_output=True)
-        self._summary.add_command(cmd=command, buildozer_result=process.returncode)
+        """
+        Queue a buildozer command. Tasks for the same target are executed in the order they are queued.
+        """
+        with self._lock:
+            self._pending_tasks.setdefault(target, []).append(task)
+
+    def flush(self, on_targets_flushed: Callable[[dict[str, list[int]]], None] | None = None) -> None:
+        """
+        Execute all queued commands and record their results in the summary. Buildozer tells us only per line of the
+        commands file whether it failed or changed the target. Thus, all commands for a target share the result of
+        the target. Commands are executed ordered by BUILD file and target, independent of the order in which they were
+        queued. The summary lists the commands sorted by target. Flushing must not be executed concurrently, as
+        concurrent flushes could edit the same BUILD file.
+
+        As soon as a partition has been executed, 'on_targets_flushed' is called with the result of each command of the
+        targets in the partition. It is called concurrently for the partitions executed in parallel.
+        """
+        with self._lock:
+            pending_tasks = self._pending_tasks
+            self._pending_tasks = {}
+        if not pending_tasks:
+            return
+
+        tasks_per_build_file = self._group_by_build_file(pending_tasks)
+        for tasks_per_target in tasks_per_build_file.values():
+            for target, tasks in tasks_per_target.items():
+                for task in tasks:
+                    log.log(
+                        logging.INFO if self._dry else logging.DEBUG,
+                        f"Executing buildozer command: {[*self._base_cmd, task, target]}",
+                    )
+
+        partitions = self._partition_build_files(tasks_per_build_file)
+        with ThreadPoolExecutor(max_workers=len(partitions)) as pool:
+            partition_results = pool.map(
+                partial(self._execute_partition, on_targets_flushed=on_targets_flushed), partitions
+            )
+        results = {target: result for partition in partition_results for target, result in partition.items()}
+
+        for target in sorted(pending_tasks):
+            for task, result in zip(pending_tasks[target], results[target], strict=True):
+                self._summary.add_command(cmd=[*self._base_cmd, task, target], buildozer_result=result)
 
     def adapt_targets_to_platform(self, targets: list[str]) -> list[str]:
         return [self.adapt_target_to_platform(t) for t in targets]
@@ -47,6 +109,102 @@ class BuildozerExecutor:
             return target.replace("//", "::PLACEHOLDER::").replace("/", "\\").replace("::PLACEHOLDER::", "//")
         return target
 
+    def _group_by_build_file(self, tasks_per_target: dict[str, list[str]]) -> dict[Path, dict[str, list[str]]]:
+        groups: dict[Path, dict[str, list[str]]] = {}
+        for target in sorted(tasks_per_target):
+            groups.setdefault(self._resolve_build_file(target), {})[target] = tasks_per_target[target]
+        return {build_file: groups[build_file] for build_file in sorted(groups)}
+
+    def _partition_build_files(
+        self, tasks_per_build_file: dict[Path, dict[str, list[str]]]
+    ) -> list[dict[Path, dict[str, list[str]]]]:
+        """
+        Distribute the BUILD files round-robin over at most 'jobs' partitions. Each partition is executed by a single
+        buildozer process to avoid paying the process overhead per BUILD file.
+        """
+        partitions: list[dict[Path, dict[str, list[str]]]] = [
+            {} for _ in range(min(self._jobs, len(tasks_per_build_file)))
+        ]
+        for idx, (build_file, tasks_per_target) in enumerate(tasks_per_build_file.items()):
+            partitions[idx % len(partitions)][build_file] = tasks_per_target
+        return partitions
+
+    def _execute_partition(
+        self,
+        tasks_per_build_file: dict[Path, dict[str, list[str]]],
+        on_targets_flushed: Callable[[dict[str, list[int]]], None] | None = None,
+    ) -> dict[str, list[int]]:
+        tasks_per_target = {
+            target: tasks
+            for tasks_per_target in tasks_per_build_file.values()
+            for target, tasks in tasks_per_target.items()
+        }
+        process = self._run_commands_file(tasks_per_target)
+        target_results = self._evaluate_results(process=process, targets=list(tasks_per_target))
+        results = {target: [target_results[target]] * len(tasks) for target, tasks in tasks_per_target.items()}
+        if on_targets_flushed is not None:
+            on_targets_flushed(results)
+        return results
+
+    def _run_commands_file(self, tasks_per_target: dict[str, list[str]]) -> subprocess.CompletedProcess:
+        """
+        Each line of a buildozer commands file consists of the commands separated by '|' followed by the target label.
+        We use '-k' to ensure a failing command does not prevent the commands for other targets from being applied.
+        """
+        with TemporaryDirectory() as tmp_dir:
+            commands_file = Path(tmp_dir) / "buildozer_commands.txt"
+            commands_file.write_text(
+                "".join(
+                    f"{PRINT_EDITED_ATTRIBUTES}|{'|'.join(tasks)}|{PRINT_EDITED_ATTRIBUTES}|{target}\n"
+                    for target, tasks in tasks_per_target.items()
+                ),
+                encoding="utf-8",
+            )
+            command = [*self._base_cmd, "-k", "-f", str(commands_file)]
+            log.debug(f"Executing buildozer for {len(tasks_per_target)} targets: {command}")
+            return subprocess.run(command, cwd=self._workspace, check=False, capture_output=True, text=True)
+
+    def _evaluate_results(self, process: subprocess.CompletedProcess, targets: list[str]) -> dict[str, int]:
+        """
+        Buildozer reports a single return code for the whole commands file and changes only per BUILD file. Errors are
+        reported per target. Whether the tasks changed a target, we deduce from the edited attributes printed before
+        and after the tasks. This works as well in dry mode, in which buildozer does not edit the BUILD files. We
+        express the result for each target as the return code of executing its tasks individually.
+        """
+        if process.returncode not in (0, 2, 3):
+            raise RuntimeError(
+                f"Running buildozer failed with the unexpected return code {process.returncode}:\n{process.stderr}"
+            )
+
+        failed_targets = set(BUILDOZER_TARGET_ERROR.findall(process.stderr))
+        printed_attributes = parse_printed_records(process.stdout)
+        has_unattributed_error = process.returncode == 2 and not failed_targets
+
+        results = {}
+        for target in targets:
+            before_and_after = printed_attributes.get(make_record_key(target), [])
+            if target in failed_targets:
+                results[target] = 2
+            elif len(before_and_after) == 2:
+                results[target] = 0 if before_and_after[0] != before_and_after[1] else 3
+            elif has_unattributed_error:
+                results[target] = 2
+            else:
+                results[target] = 3
+        return results
+
+    def _resolve_build_file(self, target: str) -> Path:
+        """
+        Resolve the BUILD file in the same way as buildozer, which prefers 'BUILD.bazel' over 'BUILD'.
+        """
+        package = target.split("//", 1)[1].rsplit(":", 1)[0]
+        package_dir = (self._workspace / package).resolve()
+        for build_file_name in ("BUILD.bazel", "BUILD"):
+            if (build_file := package_dir / build_file_name).is_file():
+                return build_file
+        # Buildozer will fail for this target. We still need a unique BUILD file for grouping the commands.
+        return package_dir / "BUILD"
+
     @staticmethod
     def _make_base_cmd(binary: str, dry: bool, args: list[str]) -> list[str]:
         command = [binary]
@@ -55,3 +213,32 @@ class BuildozerExecutor:
         if dry:
             command.append("-stdout")
         return command
+
+
+def make_record_key(label: str) -> str:
+    """
+    Buildozer prints the label of a target in its shortest form, e.g. '//foo' for '//foo:foo'. On Windows, the package
+    of the label we provide uses backslashes.
+    """
+    label = normalize_label(label).replace("\\", "/")
+    if ":" not in label:
+        label = f"{label}:{label.rsplit('/', 1)[-1]}"
+    return label
+
+
+def parse_printed_records(output: str) -> dict[str, list[str]]:
+    """
+    Buildozer prints each record of the print commands on a line starting with the label of the target. Values which
+    are no plain lists, e.g. a select statement, can continue on the following lines. In dry mode, the content of the
+    changed BUILD files precedes the records. No line of a BUILD file starts with '//'.
+    """
+    records: dict[str, list[str]] = {}
+    values: list[str] | None = None
+    for line in output.splitlines():
+        if line.startswith("//"):
+            label, _, value = line.partition(" ")
+            values = records.setdefault(make_record_key(label), [])
+            values.append(value)
+        elif values is not None:
+            values[-1] += f"\n{line}"
+    return records
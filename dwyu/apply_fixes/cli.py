@@ -1,8 +1,15 @@
 import logging
+import os
 import sys
 from argparse import ArgumentParser, Namespace, RawDescriptionHelpFormatter
 from pathlib import Path
 
+from dwyu.apply_fixes.merge_reports import MERGE_INTERSECTION, MERGE_UNION
+
+# Threads only overlap waiting on the file system, Bazel and buildozer. Matching reports is pure Python and does not
+# profit from more threads, thus a few threads are sufficient.
+DEFAULT_JOBS = min(4, os.cpu_count() or 1)
+
 log = logging.getLogger()
 
 
@@ -68,6 +75,7 @@ The script expects 'bazel' to be available on PATH.
         type=Path,
         help="""
         Search recursively for DWYU report files below this path.
+        Directories which never contain reports, e.g. '_objs', '_virtual_includes' or runfiles trees, are skipped.
         This disables automatically deducing the 'bazel-bin' dir.
         When used together with the '--dwyu-log-file' option, please note the extra constraints documented in the '--dwyu-log-file' option.
         """,
@@ -80,6 +88,56 @@ The script expects 'bazel' to be available on PATH.
         Extract the relevant DWYU report files from a file containing the command line output of executing DWYU.
         This is the recommended approach, since it is the most efficient one for large workspaces and it cannot find outdated DWYU report files by chance.
         When you combine this option with '--reports-search-path', beware that '--reports-search-path' has to point exactly to the 'bazel-bin' directory and cannot point to a sub directory.
+        Provide '-' to read the log from stdin while the DWYU build is still running, e.g. 'bazel build <dwyu_options> 2>&1 | <apply_fixes> --dwyu-log-file -'.
+        Each report is loaded as soon as its log line is available.
+        With the 'union' merge strategy, unused dependencies and dependencies which should be private are fixed while the build is still running.
+        Adding missing dependencies starts after the build is finished, since Bazel cannot answer queries while building.
+        In this case, the reports are located via the 'bazel-bin' convenience symlink in the workspace, unless '--reports-search-path' is provided.
+        """,
+    )
+    parser.add_argument(
+        "--dwyu-manifest",
+        metavar="PATH",
+        type=Path,
+        action="append",
+        help="""
+        Read the DWYU findings from a manifest created by a DWYU aspect with 'aggregate_reports = True' via '--output_groups=dwyu_manifest'.
+        A single manifest contains the findings for a target and all its dependencies analyzed by DWYU, which is much faster than discovering and reading the individual report files.
+        Can be provided multiple times, e.g. for multiple targets DWYU was executed on.
+        When you combine this option with '--reports-search-path', beware that '--reports-search-path' has to point exactly to the 'bazel-bin' directory.
+        Takes precedence over all other means of discovering report files.
+        """,
+    )
+    parser.add_argument(
+        "--dwyu-targets",
+        type=str,
+        metavar="STRING",
+        help="""
+        Ask Bazel for the exact DWYU report files of these target patterns instead of searching for them.
+        Requires '--dwyu-aspect' to know which aspect created the reports.
+        This executes 'bazel cquery --output=files' with the DWYU aspect, thus use '--bazel-args' and '--bazel-startup-args' to provide the same configuration as was used to execute DWYU.
+        Outdated DWYU report files cannot be found by chance this way.
+        Patterns have to be provided as continuous string, e.g.: --dwyu-targets='//foo/... -//foo/bar/...'.
+        Takes precedence over '--dwyu-log-file'.
+        """,
+    )
+    parser.add_argument(
+        "--dwyu-aspect",
+        type=str,
+        metavar="LABEL",
+        help="The DWYU aspect used to create the reports, e.g. '//:aspect.bzl%%dwyu'. Required by '--dwyu-targets'.",
+    )
+    parser.add_argument(
+        "--build-event-json-file",
+        metavar="PATH",
+        type=Path,
+        help="""
+        Discover the DWYU report files via the Build Event Protocol file Bazel created for executing DWYU via '--build_event_json_file'.
+        Bazel announces the exact report files of the 'dwyu' output group, thus no directory has to be searched and no outdated report files can be found by chance.
+        The reports of failed targets are taken from the events of the failed DWYU actions, thus '--keep_going' is sufficient to discover all reports.
+        The file is followed until Bazel announces the last build event. Thus, this script can be started while the DWYU build is still running and loads the reports as soon as they are created.
+        Fixing the reports overlaps the build in the same way as for '--dwyu-log-file -'.
+        Takes precedence over '--dwyu-targets', '--dwyu-log-file' and '--reports-search-path'.
         """,
     )
     parser.add_argument(
@@ -90,6 +148,30 @@ The script expects 'bazel' to be available on PATH.
         Your project might use select statements to exchange dependencies.
         In such cases you should use 'bazel cquery' to allow this script understanding the dependency tree properly.
         To ensure the cquery command uses the same configuration as your DWYU execution, use the options '--bazel-args' and '--bazel-startup-args'.
+        The dependency graph is queried with a single cquery per configuration in which DWYU analyzed the targets, as deduced from the 'bazel-out/<config>' location of the report files.
+        """,
+    )
+    parser.add_argument(
+        "--use-processed-deps",
+        action="store_true",
+        help="""
+        When searching for missing dependencies, use the information about the dependencies the DWYU aspect stored next to the report files instead of querying Bazel.
+        This works only for targets whose transitive dependencies have all been analyzed by DWYU as well, e.g. by using a recursive DWYU aspect.
+        For all other targets, Bazel is queried as usual.
+        Checking the visibility of the discovered dependencies can still require Bazel queries.
+        """,
+    )
+    parser.add_argument(
+        "--graph-snapshot",
+        metavar="PATH",
+        type=Path,
+        help="""
+        When searching for missing dependencies, use a pre-recorded graph snapshot instead of querying the dependency graph via Bazel.
+        Create the snapshot from a recorded query output with 'bazel run @depend_on_what_you_use//dwyu/apply_fixes:build_graph_snapshot'.
+        Targets which are not part of the snapshot are queried via Bazel as usual.
+        Visibility is evaluated based on the snapshot as far as possible. Only dependencies relying on the default visibility of their package require Bazel queries.
+        Beware, the snapshot is not validated against the workspace. An outdated snapshot yields outdated results.
+        The snapshot is based on 'bazel query' and cannot be combined with '--use-cquery'.
         """,
     )
     parser.add_argument(
@@ -112,6 +194,44 @@ The script expects 'bazel' to be available on PATH.
         Arguments have to be provided as continuous string, e.g.: --bazel-startup-args='--foo --tick=tock'.
         """,
     )
+    parser.add_argument(
+        "--query-cache-dir",
+        metavar="PATH",
+        type=Path,
+        help="""
+        Cache the results of Bazel queries in this directory and reuse them in later executions of this script.
+        Cached results are invalidated as soon as a BUILD, .bzl or MODULE file in the workspace changes.
+        Detecting this requires walking the source tree, skipping the directories listed in .bazelignore.
+        This is useful when running this script repeatedly, e.g. after fixing some issues manually.
+        Beware, changes outside the workspace, e.g. to a local override of an external repository, are not detected.
+        """,
+    )
+    parser.add_argument(
+        "--merge-findings",
+        choices=[MERGE_UNION, MERGE_INTERSECTION],
+        default=MERGE_UNION,
+        help="""
+        Executing DWYU for multiple configurations or behind transitions creates multiple reports for the same target.
+        Those reports are merged to process each target only once.
+        With 'union' (default), issues found in any configuration are fixed.
+        With 'intersection', only issues found in all configurations are fixed.
+        This prevents for example removing dependencies which are used only in some configurations.
+        """,
+    )
+    parser.add_argument(
+        "--journal",
+        metavar="PATH",
+        type=Path,
+        help="""
+        Record in this file which reports have been processed and skip those reports in later executions of this script.
+        Reports are identified by their path, their content and the requested kinds of fixes.
+        Thus, reports recreated with different findings or processed with different '--fix-*' options are processed again.
+        This allows resuming an aborted execution and processing only the reports which changed since the last execution.
+        Reports are recorded after the fixes have been applied.
+        Reports for which a fix failed or for which no dependency providing a missing header was selected are not recorded.
+        Delete the file to process all reports again, e.g. after reverting the applied fixes.
+        """,
+    )
     parser.add_argument(
         "--buildozer",
         metavar="PATH",
@@ -127,6 +247,20 @@ The script expects 'bazel' to be available on PATH.
         Arguments have to be provided as continuous string, e.g.: --buildozer-args='-foo -tick=tock'.
         """,
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        metavar="N",
+        default=DEFAULT_JOBS,
+        help=f"""
+        Number of threads loading and processing reports and number of parallel buildozer processes.
+        Threads overlap reading report files and waiting on buildozer.
+        Matching the headers of the reports to dependencies is CPU bound Python code, which is not sped up by more threads.
+        Bazel queries are always executed one after another, as the Bazel server does not execute queries in parallel anyway.
+        Only the buildozer processes, which edit disjoint sets of BUILD files, truly run in parallel.
+        Defaults to {DEFAULT_JOBS}.
+        """,
+    )
     parser.add_argument(
         "--verbose",
         action="store_true",
@@ -140,4 +274,16 @@ The script expects 'bazel' to be available on PATH.
         logging.fatal("Please choose at least one of the 'fix-..' options")
         sys.exit(1)
 
+    if bool(args.dwyu_targets) != bool(args.dwyu_aspect):
+        logging.fatal("Options '--dwyu-targets' and '--dwyu-aspect' have to be used together")
+        sys.exit(1)
+
+    if args.graph_snapshot and args.use_cquery:
+        logging.fatal("Option '--graph-snapshot' cannot be combined with '--use-cquery'")
+        sys.exit(1)
+
+    if args.jobs < 1:
+        logging.fatal("Option '--jobs' requires a value of at least 1")
+        sys.exit(1)
+
     return args
@@ -1,37 +1,212 @@
 import argparse
-from os import walk
+import json
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from os import scandir
 from pathlib import Path
+from queue import Queue
+from typing import TextIO
 
+from dwyu.apply_fixes.build_events import DWYU_OUTPUT_GROUP, iter_build_events, iter_reports_from_build_events
 from dwyu.apply_fixes.utils import args_string_to_list, execute_and_capture
 
+REPORT_SUFFIX = "_dwyu_report.json"
+PROCESSED_DEP_MARKER = "_processed_dep_"
+DWYU_REPORT_ANCHOR = "DWYU Report: "
 
-def gather_reports(main_args: argparse.Namespace, search_path: Path) -> list[Path]:
-    reports = []
+# Bazel creates the output directory of each configuration in this directory of the execution root
+BAZEL_OUT_DIR = "bazel-out"
+
+# Directories in the output tree which never contain reports, but can contain a huge amount of files. External
+# repositories are not pruned, as their targets can be analyzed as well.
+PRUNED_DIRS = frozenset(("_objs", "_virtual_includes"))
+PRUNED_DIR_PREFIXES = ("_solib_",)
+PRUNED_DIR_SUFFIXES = (".runfiles",)
+
+# Amount of directories listed in parallel. Listing directories is I/O bound, especially on network file systems.
+SEARCH_THREADS = 16
+
+# Providing this instead of a path as DWYU log file reads the log from stdin
+LOG_FROM_STDIN = Path("-")
 
+
+def gather_reports(main_args: argparse.Namespace, search_path: Path) -> Iterable[Path]:
     if main_args.dwyu_log_file:
         if not main_args.dwyu_log_file.is_file():
             raise FileNotFoundError(f"ERROR: The provided DWYU log file '{main_args.dwyu_log_file}' does not exist.")
-        for report in parse_dwyu_execution_log(main_args.dwyu_log_file):
-            if "/bin/" in report:
-                reports.append(search_path / report.split("/bin/", 1)[1])
-            else:
-                raise RuntimeError(f"Unexpected report path format: '{report}'")
-        return reports
-
-    # We explicitly use os.walk() as it has better performance than Path.glob() in large and deeply nested file trees.
-    for root, _, files in walk(search_path):
-        for file in files:
-            if file.endswith("_dwyu_report.json"):
-                reports.append(Path(root) / file)  # noqa: PERF401
+        return [
+            locate_in_search_path(report=report, search_path=search_path)
+            for report in parse_dwyu_execution_log(main_args.dwyu_log_file)
+        ]
+
+    return search_reports(search_path)
+
+
+def is_pruned_dir(name: str) -> bool:
+    return name in PRUNED_DIRS or name.endswith(PRUNED_DIR_SUFFIXES) or name.startswith(PRUNED_DIR_PREFIXES)
+
+
+def scan_dir(directory: str) -> tuple[list[Path], list[str]]:
+    """
+    List a single directory. Provides the reports in the directory and the sub directories which have to be searched.
+    Like os.walk(), symlinks to directories are not followed and unreadable directories are ignored.
+    """
+    reports = []
+    sub_dirs = []
+    try:
+        with scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if not is_pruned_dir(entry.name):
+                        sub_dirs.append(entry.path)
+                elif entry.name.endswith(REPORT_SUFFIX):
+                    reports.append(Path(entry.path))
+    except OSError:
+        pass
+    return reports, sub_dirs
+
+
+def search_reports(search_path: Path, threads: int = SEARCH_THREADS) -> Iterator[Path]:
+    """
+    Search recursively for reports below the search path. Directories which can never contain reports are skipped.
+    Listing directories is dominated by waiting for the file system, thus we list many directories in parallel. The
+    reports are provided as soon as they are discovered.
+    """
+    scanned: Queue[Future[tuple[list[Path], list[str]]]] = Queue()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        pool.submit(scan_dir, str(search_path)).add_done_callback(scanned.put)
+        pending = 1
+        while pending:
+            reports, sub_dirs = scanned.get().result()
+            pending += len(sub_dirs) - 1
+            for sub_dir in sub_dirs:
+                pool.submit(scan_dir, sub_dir).add_done_callback(scanned.put)
+            yield from reports
+
+
+def gather_reports_from_log_stream(log: TextIO, search_path: Path) -> Iterator[Path]:
+    """
+    Discover the reports while the DWYU build is still writing its log, e.g. when piping the build output into this
+    tool. Each report is provided as soon as its log line is available.
+    """
+    for report in iter_dwyu_execution_log(log):
+        yield locate_in_search_path(report=report, search_path=search_path)
+
+
+def locate_in_search_path(report: str, search_path: Path) -> Path:
+    """
+    Reports are listed relative to the execution root. If the search path is the output directory of a configuration,
+    reports of other configurations are located in the output directory of their own configuration.
+    """
+    if "/bin/" not in report:
+        raise RuntimeError(f"Unexpected report path format: '{report}'")
+    output_root = search_path.parent.parent
+    if output_root.name == BAZEL_OUT_DIR and search_path.name == "bin" and report.startswith(f"{BAZEL_OUT_DIR}/"):
+        return output_root / report.split("/", 1)[1]
+    return search_path / report.split("/bin/", 1)[1]
+
+
+def get_report_configuration(report: Path) -> str | None:
+    """
+    Reports are located in the output directory of the configuration in which the target has been analyzed, e.g.
+    'bazel-out/k8-fastbuild/bin/foo/bar_dwyu_report.json'. Reports found via the 'bazel-bin' convenience symlink are
+    resolved to find the output directory.
+    """
+    for path in (report, report.resolve()):
+        parts = path.parts
+        for idx in range(len(parts) - 3, -1, -1):
+            if parts[idx] == BAZEL_OUT_DIR and parts[idx + 2] == "bin":
+                return parts[idx + 1]
+    return None
+
+
+def query_reports(main_args: argparse.Namespace, workspace_root: Path, search_path: Path) -> list[Path]:
+    """
+    Ask Bazel for the exact report files the DWYU aspect creates for the given target patterns. This requires no search
+    and cannot find outdated report files. Bazel lists the files relative to the execution root, thus we locate them in
+    the search path like the reports from the DWYU log.
+    """
+    process = execute_and_capture(
+        cmd=[
+            "bazel",
+            *args_string_to_list(main_args.bazel_startup_args),
+            "cquery",
+            *args_string_to_list(main_args.bazel_args),
+            f"--aspects={main_args.dwyu_aspect}",
+            f"--output_groups={DWYU_OUTPUT_GROUP}",
+            "--output=files",
+            "--",
+            *args_string_to_list(main_args.dwyu_targets),
+        ],
+        cwd=workspace_root,
+    )
+    return [
+        locate_in_search_path(report=report, search_path=search_path)
+        for report in process.stdout.splitlines()
+        if report.endswith(REPORT_SUFFIX)
+    ]
+
+
+def read_manifests(manifests: list[Path], search_path: Path) -> dict[Path, dict]:
+    """
+    The manifest created by the DWYU aspect lists only the reports of targets with findings, including their content.
+    Thus, a single file replaces discovering and reading the individual reports. The report paths are relative to the
+    execution root, thus we locate them in the search path like the reports from the DWYU log.
+    """
+    reports = {}
+    for manifest in manifests:
+        if not manifest.is_file():
+            raise FileNotFoundError(f"ERROR: The provided DWYU manifest '{manifest}' does not exist.")
+        with manifest.open(encoding="utf-8") as manifest_in:
+            for line in manifest_in:
+                if line.strip():
+                    report = json.loads(line)
+                    reports[locate_in_search_path(report=report.pop("report"), search_path=search_path)] = report
     return reports
 
 
+def gather_reports_from_build_events(build_event_file: Path) -> Iterator[Path]:
+    """
+    Discover the reports via the Build Event Protocol. The reports are provided while the build is still running,
+    which allows processing them before the build is completed. This requires no search path, as Bazel announces the
+    absolute paths of the reports.
+    """
+    return iter_reports_from_build_events(events=iter_build_events(build_event_file), report_suffix=REPORT_SUFFIX)
+
+
+def gather_processed_dep_files(reports: dict[Path, str]) -> list[tuple[str, Path]]:
+    """
+    Next to each report, the DWYU aspect stores a '<target_name>_processed_dep_<hash>.json' file for each direct
+    dependency of the analyzed target. Find those files for the given mapping of reports to their analyzed targets and
+    return them together with the analyzed target they belong to.
+
+    Each directory containing reports is listed only once, independent of how many reports it contains.
+    """
+    analyzed_targets_per_dir: dict[Path, dict[str, str]] = {}
+    for report, target in reports.items():
+        analyzed_targets_per_dir.setdefault(report.parent, {})[report.name.removesuffix(REPORT_SUFFIX)] = target
+
+    processed_dep_files = []
+    for directory, analyzed_targets in analyzed_targets_per_dir.items():
+        with scandir(directory) as entries:
+            for entry in entries:
+                if PROCESSED_DEP_MARKER not in entry.name or not entry.name.endswith(".json"):
+                    continue
+                target_name = entry.name.rsplit(PROCESSED_DEP_MARKER, maxsplit=1)[0]
+                if target_name in analyzed_targets:
+                    processed_dep_files.append((analyzed_targets[target_name], Path(entry.path)))
+    return processed_dep_files
+
+
+def iter_dwyu_execution_log(log: TextIO) -> Iterator[str]:
+    for line in log:
+        if line.startswith(DWYU_REPORT_ANCHOR):
+            yield line.strip().split(DWYU_REPORT_ANCHOR)[1]
+
+
 def parse_dwyu_execution_log(log_file: Path) -> list[str]:
-    dwyu_report_anchor = "DWYU Report: "
     with log_file.open() as log:
-        return [
-            line.strip().split(dwyu_report_anchor)[1] for line in log.readlines() if line.startswith(dwyu_report_anchor)
-        ]
+        return list(iter_dwyu_execution_log(log))
 
 
 def get_reports_search_dir(main_args: argparse.Namespace, workspace_root: Path) -> Path:
@@ -0,0 +1,92 @@
+import json
+import logging
+from dataclasses import astuple
+from pathlib import Path
+
+from dwyu.apply_fixes.bazel_query import iter_streamed_jsonproto
+from dwyu.apply_fixes.search_missing_deps import Dependency, DependencyGraph, VirtualIncludes, parse_dependency
+from dwyu.apply_fixes.visibility import PackageGroup, parse_package_group
+
+log = logging.getLogger()
+
+# Increase whenever the structure of the snapshot file changes
+SNAPSHOT_FORMAT_VERSION = 2
+
+
+def build_graph_snapshot(dump: Path, snapshot: Path) -> int:
+    """
+    Convert a recorded query dump into a compact snapshot, which apply_fixes loads instead of querying Bazel. We
+    already extract the information about the header files provided by the rules while building the snapshot. Virtual
+    header paths are reconstructed on demand after loading, thus we only store the information required for this.
+    Labels are stored once and referenced by their index, as most labels appear many times as rule input.
+
+    Returns the amount of rules stored in the snapshot.
+    """
+    labels: dict[str, int] = {}
+    rules = []
+    dependencies = []
+    package_groups = []
+
+    def intern(label: str) -> int:
+        return labels.setdefault(label, len(labels))
+
+    with dump.open(encoding="utf-8") as dump_in:
+        for target in iter_streamed_jsonproto(dump_in):
+            if target["type"] == "RULE":
+                rule = target["rule"]
+                rules.append([intern(rule["name"]), [intern(rule_input) for rule_input in rule.get("ruleInput", [])]])
+                if (dep := parse_dependency(target)) is not None:
+                    virtual_includes = astuple(dep.virtual_includes) if dep.virtual_includes else None
+                    dependencies.append([intern(dep.target), dep.headers, dep.visibility, virtual_includes])
+            elif target["type"] == "PACKAGE_GROUP":
+                package_groups.append(target["packageGroup"])
+
+    content = {
+        "version": SNAPSHOT_FORMAT_VERSION,
+        "labels": list(labels),
+        "rules": rules,
+        "dependencies": dependencies,
+        "package_groups": package_groups,
+    }
+    snapshot.parent.mkdir(parents=True, exist_ok=True)
+    snapshot.write_text(json.dumps(content, separators=(",", ":")), encoding="utf-8")
+    return len(rules)
+
+
+def load_graph_snapshot(snapshot: Path) -> tuple[DependencyGraph, dict[str, PackageGroup]]:
+    """
+    Load a snapshot created by 'build_graph_snapshot()'. Provides the dependency graph of all recorded rules and the
+    recorded package groups.
+    """
+    if not snapshot.is_file():
+        raise FileNotFoundError(f"ERROR: The provided graph snapshot '{snapshot}' does not exist.")
+
+    with snapshot.open(encoding="utf-8") as snapshot_in:
+        content = json.load(snapshot_in)
+    if content.get("version") != SNAPSHOT_FORMAT_VERSION:
+        raise RuntimeError(
+            f"ERROR: The graph snapshot '{snapshot}' has an unsupported format version. "
+            "Please rebuild it with the 'build_graph_snapshot' tool."
+        )
+
+    labels = content["labels"]
+    dependencies = {
+        name: Dependency(
+            target=labels[name],
+            headers=headers,
+            visibility=visibility,
+            virtual_includes=VirtualIncludes(*virtual_includes) if virtual_includes else None,
+        )
+        for name, headers, visibility, virtual_includes in content["dependencies"]
+    }
+    graph = DependencyGraph()
+    for name, rule_inputs in content["rules"]:
+        graph.add_rule(
+            name=labels[name],
+            rule_inputs=[labels[rule_input] for rule_input in rule_inputs],
+            dependency=dependencies.get(name),
+        )
+    package_groups = dict(parse_package_group(package_group) for package_group in content["package_groups"])
+
+    log.debug(f"Loaded graph snapshot with {len(content['rules'])} rules and {len(package_groups)} package groups")
+    return graph, package_groups
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import logging
+import os
+from collections.abc import Iterable
+from pathlib import Path
+
+log = logging.getLogger()
+
+
+def compute_report_digest(content: dict, fix_kinds: Iterable[str]) -> str:
+    """
+    Reports can be loaded from the report files or from manifests. Hashing the decoded content makes the digest
+    independent of the source the report has been loaded from. The requested kinds of fixes are part of the digest,
+    since a report processed for some kinds of fixes has to be processed again for other kinds of fixes.
+    """
+    return hashlib.sha256(json.dumps([sorted(fix_kinds), content], sort_keys=True).encode()).hexdigest()
+
+
+class ReportJournal:
+    """
+    Persistent record of the reports whose fixes have been applied, allowing to skip them in later executions of
+    apply_fixes. This allows resuming an aborted execution and processing only the reports which changed since the
+    last execution.
+
+    The journal is a JSON Lines file. Each line documents the fixes applied for a single report, which is identified
+    by its path, the requested kinds of fixes and a digest of both together with its content. Thus, a report which is
+    recreated with different findings or processed with different fix options is processed again. Lines are only
+    appended and written after the fixes have been applied. A line which is incomplete due to an aborted execution is
+    ignored.
+    """
+
+    def __init__(self, file: Path, fix_kinds: Iterable[str]) -> None:
+        self._file = file
+        self._fix_kinds = sorted(fix_kinds)
+        # An aborted execution might have left an incomplete line, which must not be continued by the next entry
+        self._terminate_last_line = False
+        self._digests = self._load()
+
+    def is_processed(self, report: Path, content: dict) -> bool:
+        return self._digests.get(self._make_key(report)) == compute_report_digest(content, self._fix_kinds)
+
+    def record(self, reports: Iterable[tuple[Path, dict, int]]) -> None:
+        """
+        Append an entry for each tuple of report, report content and the amount of applied fixes. The entries are
+        persisted before returning to not lose them if the execution is aborted afterwards.
+        """
+        entries = []
+        for report, content, fixes in reports:
+            digest = compute_report_digest(content, self._fix_kinds)
+            self._digests[self._make_key(report)] = digest
+            entries.append(
+                json.dumps(
+                    {
+                        "report": str(report),
+                        "fix_kinds": self._fix_kinds,
+                        "sha256": digest,
+                        "target": content["analyzed_target"],
+                        "fixes": fixes,
+                    }
+                )
+            )
+        if not entries:
+            return
+
+        self._file.parent.mkdir(parents=True, exist_ok=True)
+        with self._file.open(mode="a", encoding="utf-8") as journal:
+            if self._terminate_last_line:
+                journal.write("\n")
+                self._terminate_last_line = False
+            journal.write("".join(f"{entry}\n" for entry in entries))
+            journal.flush()
+            os.fsync(journal.fileno())
+
+    def _make_key(self, report: Path) -> tuple[str, tuple[str, ...]]:
+        return str(report), tuple(self._fix_kinds)
+
+    def _load(self) -> dict[tuple[str, tuple[str, ...]], str]:
+        if not self._file.is_file():
+            return {}
+
+        content = self._file.read_text(encoding="utf-8")
+        self._terminate_last_line = bool(content) and not content.endswith("\n")
+        digests = {}
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                digests[(entry["report"], tuple(entry["fix_kinds"]))] = entry["sha256"]
+            except (json.JSONDecodeError, KeyError, TypeError):
+                log.debug(f"Ignoring invalid journal entry '{line.strip()}'")
+        log.debug(f"Loaded {len(digests)} processed reports from journal '{self._file}'")
+        return digests
@@ -0,0 +1,86 @@
+import logging
+from collections.abc import Hashable, Sequence
+from itertools import chain
+from pathlib import Path
+
+from dwyu.apply_fixes.search_missing_deps import normalize_header
+
+log = logging.getLogger()
+
+MERGE_UNION = "union"
+MERGE_INTERSECTION = "intersection"
+
+# Report fields listing dependencies of the analyzed target
+DEP_FINDINGS = ("unused_deps", "unused_implementation_deps", "deps_which_should_be_private")
+# Report fields mapping files of the analyzed target to included headers for which a direct dependency is missing
+INCLUDE_FINDINGS = ("public_includes_without_dep", "private_includes_without_dep")
+
+
+def merge_findings(findings: Sequence[Sequence[Hashable]], strategy: str) -> list:
+    """
+    Merge the findings while keeping the order in which they are reported.
+    """
+    if strategy == MERGE_INTERSECTION:
+        others = [set(other) for other in findings[1:]]
+        return [finding for finding in dict.fromkeys(findings[0]) if all(finding in other for other in others)]
+    return list(dict.fromkeys(chain(*findings)))
+
+
+def flatten(includes: dict[str, list[str]]) -> list[tuple[str, str]]:
+    return [(file, include) for file, file_includes in includes.items() for include in file_includes]
+
+
+def merge_include_findings(findings: list[dict[str, list[str]]], strategy: str) -> dict[str, list[str]]:
+    """
+    Generated files are located in the output tree of the configuration. Thus, we compare the files and includes
+    independent of the configuration and keep the paths of the first report mentioning them.
+    """
+    includes = [
+        {(normalize_header(file), normalize_header(include)): (file, include) for file, include in flatten(finding)}
+        for finding in findings
+    ]
+    merged: dict[str, list[str]] = {}
+    for key in merge_findings(findings=[list(report_includes) for report_includes in includes], strategy=strategy):
+        file, include = next(report_includes[key] for report_includes in includes if key in report_includes)
+        merged.setdefault(file, []).append(include)
+    return merged
+
+
+def merge_target_reports(contents: list[dict], strategy: str) -> dict:
+    """
+    Reports without findings might have been loaded only partially. Thus, the remaining fields are taken from a
+    report with findings.
+    """
+    merged = dict(next((content for content in contents if not content.get("is_ok")), contents[0]))
+    for field in DEP_FINDINGS:
+        merged[field] = merge_findings(findings=[content.get(field, []) for content in contents], strategy=strategy)
+    for field in INCLUDE_FINDINGS:
+        merged[field] = merge_include_findings(
+            findings=[content.get(field, {}) for content in contents], strategy=strategy
+        )
+    merged["is_ok"] = not any(merged[field] for field in (*DEP_FINDINGS, *INCLUDE_FINDINGS))
+    return merged
+
+
+def merge_reports_per_target(reports: dict[Path, dict], strategy: str) -> dict[Path, dict]:
+    """
+    Executing DWYU for multiple configurations or behind transitions creates a report per configuration for the same
+    target. We merge those reports to query and edit each target only once. A union of the findings fixes issues
+    appearing in any configuration. An intersection fixes only issues appearing in all configurations, e.g. to not
+    remove dependencies which are used only in some configurations.
+
+    Each target is represented by the first of its reports.
+    """
+    reports_per_target: dict[str, dict[Path, dict]] = {}
+    for report, content in reports.items():
+        reports_per_target.setdefault(content["analyzed_target"], {})[report] = content
+
+    merged = {}
+    for target, target_reports in reports_per_target.items():
+        report = next(iter(target_reports))
+        if len(target_reports) == 1:
+            merged[report] = target_reports[report]
+            continue
+        log.debug(f"Merging {len(target_reports)} reports for target '{target}' via {strategy}")
+        merged[report] = merge_target_reports(contents=list(target_reports.values()), strategy=strategy)
+    return merged
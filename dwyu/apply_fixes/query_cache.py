@@ -0,0 +1,140 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from subprocess import CompletedProcess
+
+log = logging.getLogger()
+
+# Files in the source tree influencing the result of Bazel queries. Additionally, all '*.bzl' files are considered.
+BAZEL_FILE_NAMES = {
+    ".bazelignore",
+    ".bazelrc",
+    ".bazelversion",
+    "BUILD",
+    "BUILD.bazel",
+    "MODULE.bazel",
+    "MODULE.bazel.lock",
+    "WORKSPACE",
+    "WORKSPACE.bazel",
+    "WORKSPACE.bzlmod",
+}
+
+DEFAULT_MAX_SIZE_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+
+
+def read_bazelignore(workspace: Path) -> set[Path]:
+    """
+    Directories listed in the '.bazelignore' file of the workspace. Bazel does not consider BUILD files in them, thus
+    they cannot influence the query results.
+    """
+    bazelignore = workspace / ".bazelignore"
+    if not bazelignore.is_file():
+        return set()
+    lines = (line.strip() for line in bazelignore.read_text(encoding="utf-8").splitlines())
+    return {workspace / line.rstrip("/") for line in lines if line and not line.startswith("#")}
+
+
+def compute_workspace_fingerprint(workspace: Path) -> str:
+    """
+    Fingerprint all files influencing the Bazel build graph based on their path, size and modification time. This is
+    sufficient to detect edits without having to read the content of all those files. Hidden directories, the Bazel
+    convenience symlinks and the directories listed in '.bazelignore' are not part of the source tree and thus skipped.
+
+    Beware, this walks the whole source tree on each execution. The cost grows with the number of directories in the
+    workspace, but it is still small compared to a single Bazel query. Asking Bazel for the relevant files, e.g. via
+    'buildfiles(//...)', would be more precise but requires a query itself, which defeats the purpose of the cache.
+    External dependencies are covered by 'MODULE.bazel.lock', as long as the workspace uses a lockfile.
+    """
+    ignored_dirs = read_bazelignore(workspace)
+    fingerprint = hashlib.sha256()
+    for root, dirs, files in os.walk(workspace):
+        dirs[:] = sorted(d for d in dirs if not d.startswith((".", "bazel-")) and Path(root) / d not in ignored_dirs)
+        for file in sorted(files):
+            if file in BAZEL_FILE_NAMES or file.endswith(".bzl"):
+                path = Path(root) / file
+                stat = path.stat()
+                fingerprint.update(f"{path.relative_to(workspace)}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+    return fingerprint.hexdigest()
+
+
+class QueryCache:
+    """
+    Persistent cache for the output of successful Bazel queries, allowing to skip repeating queries when running
+    apply_fixes multiple times on an unchanged workspace.
+
+    Entries are keyed by the query command and a fingerprint of the workspace files influencing the build graph. Thus,
+    editing a BUILD file invalidates all entries instead of risking outdated results. The fingerprint is computed once
+    per cache instance, which is fine since apply_fixes edits BUILD files only after all queries have been executed.
+
+    Entries which have not been used for 'max_age_seconds' are dropped. If the cache exceeds 'max_size_bytes', the
+    least recently used entries are dropped. Eviction happens when creating the cache.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        workspace: Path,
+        max_size_bytes: int = DEFAULT_MAX_SIZE_BYTES,
+        max_age_seconds: int = DEFAULT_MAX_AGE_SECONDS,
+    ) -> None:
+        self._directory = directory
+        self._workspace = workspace
+        self._max_size_bytes = max_size_bytes
+        self._max_age_seconds = max_age_seconds
+        self._fingerprint: str | None = None
+
+        self._evict()
+
+    def make_key(self, cmd: list[str]) -> str:
+        if self._fingerprint is None:
+            self._fingerprint = compute_workspace_fingerprint(self._workspace)
+        return hashlib.sha256(json.dumps([self._fingerprint, *cmd]).encode()).hexdigest()
+
+    def load(self, key: str) -> CompletedProcess | None:
+        entry = self._get_entry(key)
+        try:
+            content = json.loads(entry.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return None
+
+        # Refresh the last usage of the entry for the eviction
+        entry.touch()
+        return CompletedProcess(args=content["args"], returncode=0, stdout=content["stdout"], stderr=content["stderr"])
+
+    def store(self, key: str, process: CompletedProcess) -> None:
+        self._directory.mkdir(parents=True, exist_ok=True)
+        entry = self._get_entry(key)
+        # Write the entry atomically to never observe partially written entries
+        tmp_entry = entry.with_suffix(f".{os.getpid()}.tmp")
+        tmp_entry.write_text(
+            json.dumps({"args": process.args, "stdout": process.stdout, "stderr": process.stderr}), encoding="utf-8"
+        )
+        tmp_entry.replace(entry)
+
+    def _get_entry(self, key: str) -> Path:
+        return self._directory / f"{key}.json"
+
+    def _evict(self) -> None:
+        if not self._directory.is_dir():
+            return
+
+        now = time.time()
+        entries = []
+        for entry in self._directory.glob("*.json"):
+            stat = entry.stat()
+            if now - stat.st_mtime > self._max_age_seconds:
+                log.debug(f"Dropping outdated query cache entry '{entry}'")
+                entry.unlink(missing_ok=True)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, entry))
+
+        cache_size = 0
+        for _, size, entry in sorted(entries, reverse=True):
+            cache_size += size
+            if cache_size > self._max_size_bytes:
+                log.debug(f"Dropping query cache entry '{entry}' to limit the cache size")
+                entry.unlink(missing_ok=True)
@@ -1,22 +1,75 @@
-import json
 import logging
+from array import array
+from collections import deque
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
 from dataclasses import dataclass
 from itertools import chain
+from threading import Lock
 
-from dwyu.apply_fixes.bazel_query import BazelQuery
+from dwyu.apply_fixes.bazel_query import BazelQuery, iter_jsonproto_results, iter_streamed_jsonproto
+from dwyu.apply_fixes.utils import normalize_label, to_apparent_label
+from dwyu.apply_fixes.visibility import VisibilityChecker
 
 log = logging.getLogger()
 
+# Maximum amount of targets for which we query the transitive dependencies in a single batched query
+BATCHED_QUERY_CHUNK_SIZE = 1000
 
-@dataclass
+# The universe scope of cqueries is passed on the command line, which is limited to 32767 characters on Windows. We
+# limit the universe scope to leave room for the Bazel binary and the remaining arguments.
+MAX_UNIVERSE_SCOPE_LENGTH = 16000
+
+# The only rule attributes we evaluate for matching header files to dependencies
+QUERIED_RULE_ATTRIBUTES = ["hdrs", "include_prefix", "name", "strip_include_prefix", "visibility"]
+
+
+# Directory in which Bazel creates the virtual header files of targets using 'include_prefix' or 'strip_include_prefix'
+VIRTUAL_INCLUDES_DIR = "_virtual_includes/"
+
+
+@dataclass(slots=True)
+class VirtualIncludes:
+    """
+    Information required to reconstruct the virtual header paths of a target using 'include_prefix' and/or
+    'strip_include_prefix', see 'virtualize_headers()'.
+    """
+
+    header_labels: list[str]
+    target_name: str
+    added_prefix: str
+    stripped_prefix: str
+
+
+@dataclass(slots=True)
 class Dependency:
     target: str
     # Assuming no include path manipulation, the target provides these headers
     headers: list[str]
+    # Explicitly specified visibility of the target. None if the target relies on the package default visibility.
+    visibility: list[str] | None = None
+    # Only set if the target provides its headers additionally in a virtual location
+    virtual_includes: VirtualIncludes | None = None
 
     def __repr__(self) -> str:
         return f"Dependency(target={self.target}, headers={self.headers})"
 
+    def get_virtual_headers(self) -> list[str]:
+        """
+        The virtual header paths are only reconstructed on demand, as they are only relevant if the included header
+        file is located in a virtual include directory.
+        """
+        if self.virtual_includes is None:
+            return []
+        pkg = self.target.split(":", maxsplit=1)[0].rsplit("//", maxsplit=1)[1]
+        return virtualize_headers(
+            header_labels=self.virtual_includes.header_labels,
+            target_name=self.virtual_includes.target_name,
+            added_prefix=self.virtual_includes.added_prefix,
+            stripped_prefix=self.virtual_includes.stripped_prefix,
+            include_root_hash=make_include_root_hash(pkg=pkg, target_name=self.virtual_includes.target_name),
+        )
+
 
 def target_to_path(dep: str) -> str:
     return dep.replace(":", "/").rsplit("//", 1)[1]
@@ -32,6 +85,29 @@ def get_string_attribute(attrs: list[dict[str, str]], attribute: str) -> str:
     return ""
 
 
+def get_explicit_visibility(attrs: list[dict]) -> list[str] | None:
+    """
+    Work on the list of attributes of a target as it is returned by a Bazel query
+    """
+    for attr in attrs:
+        if attr["name"] == "visibility" and attr.get("explicitlySpecified"):
+            # Bazel omits empty lists in the query output
+            return attr.get("stringListValue", [])
+    return None
+
+
+def make_lean_proto_args(with_rule_inputs: bool) -> list[str]:
+    """
+    By default, the proto based query outputs contain every attribute of every rule, including default values, and
+    all rule inputs and outputs. Restricting the output to the data we evaluate reduces the output size by an order of
+    magnitude. We only evaluate explicitly specified attributes, thus we can omit default values.
+    """
+    args = [f"--proto:output_rule_attrs={','.join(QUERIED_RULE_ATTRIBUTES)}", "--noproto:default_values"]
+    if not with_rule_inputs:
+        args.append("--noproto:rule_inputs_and_outputs")
+    return args
+
+
 def starlark_hash_as_hex_string(string: str) -> str:
     """
     Starlark hash function: https://bazel.build/rules/lib/globals/all#hash
@@ -48,6 +124,14 @@ def starlark_hash_as_hex_string(string: str) -> str:
     return f"{hash_value:x}"
 
 
+def make_include_root_hash(pkg: str, target_name: str) -> str:
+    """
+    All headers of a target share the same shortened virtual include root. Computing the Starlark hash in Python is
+    slow, thus callers compute it only once per target and not for each header.
+    """
+    return starlark_hash_as_hex_string(pkg + "/" + target_name)
+
+
 def strip_include_prefix_from_header(stripped_prefix: str, pkg: str, file: str) -> str | None:
     """
     Remove a 'strip_include_prefix' value from a header path and return the remaining part which is appended to the
@@ -81,7 +165,7 @@ def strip_include_prefix_from_header(stripped_prefix: str, pkg: str, file: str)
 
 
 def virtualize_headers(
-    header_labels: list[str], target_name: str, added_prefix: str, stripped_prefix: str
+    header_labels: list[str], target_name: str, added_prefix: str, stripped_prefix: str, include_root_hash: str
 ) -> list[str]:
     """
     cc_library targets using 'include_prefix' and/or 'strip_include_prefix' create new header files in a virtual
@@ -101,6 +185,7 @@ def virtualize_headers(
     There can be another version of the virtual header file. When toolchain feature 'shorten_virtual_includes' is used
     (e.g. with rules_cc >= 0.1.3 automatically on Windows), the file path is:
     bazel-out/k8-fastbuild/bin/_virtual_includes/<hash_for_pkg_path_and_target_name>/<prefix>/<file_name_minus_stripped_part>
+    The hash is the same for all headers of the target, see 'make_include_root_hash()'.
     """
     hdrs = []
     for label in header_labels:
@@ -119,13 +204,69 @@ def virtualize_headers(
             )
             continue
         prefix = f"{added_prefix}/" if added_prefix else ""
-        include_root_hash = starlark_hash_as_hex_string(pkg + "/" + target_name)
 
         hdrs.append(f"{pkg_part}_virtual_includes/{target_name}/{prefix}{file}")
         hdrs.append(f"_virtual_includes/{include_root_hash}/{prefix}{file}")
     return hdrs
 
 
+def parse_dependency(queried_target: dict) -> Dependency | None:
+    """
+    Extract the information required for matching header files from a single target as it is returned by a Bazel
+    (c)query. Returns None for targets which are not cc_* rules or which do not provide any header files.
+    """
+    if queried_target["type"] != "RULE" or not queried_target["rule"]["ruleClass"].startswith("cc_"):
+        return None
+
+    attributes = queried_target["rule"]["attribute"]
+    for attr in attributes:
+        if attr["name"] == "hdrs" and attr["explicitlySpecified"] and "stringListValue" in attr:
+            # One can always use the raw header paths, thus unconditionally evaluate them
+            hdrs = [target_to_path(hdr) for hdr in attr["stringListValue"]]
+
+            added_prefix = get_string_attribute(attributes, "include_prefix")
+            stripped_prefix = get_string_attribute(attributes, "strip_include_prefix")
+            virtual_includes = (
+                VirtualIncludes(
+                    header_labels=attr["stringListValue"],
+                    target_name=get_string_attribute(attributes, "name"),
+                    added_prefix=added_prefix,
+                    stripped_prefix=stripped_prefix,
+                )
+                if added_prefix or stripped_prefix
+                else None
+            )
+            return Dependency(
+                target=queried_target["rule"]["name"],
+                headers=hdrs,
+                visibility=get_explicit_visibility(attributes),
+                virtual_includes=virtual_includes,
+            )
+
+    return None
+
+
+@contextmanager
+def query_targets(
+    bazel_query: BazelQuery, query: str, with_rule_inputs: bool, use_query_file: bool = False
+) -> Iterator[Iterator[dict]]:
+    """
+    Provide the queried targets while they arrive. Independent of the used query output, the targets have the
+    structure of the targets in the 'streamed_jsonproto' output.
+    """
+    args = ["--noimplicit_deps", *make_lean_proto_args(with_rule_inputs=with_rule_inputs)]
+    if bazel_query.uses_cquery:
+        with bazel_query.stream(
+            query=query, args=["--output=jsonproto", *args], use_query_file=use_query_file
+        ) as query_output:
+            yield (result["target"] for result in iter_jsonproto_results(query_output))
+    else:
+        with bazel_query.stream(
+            query=query, args=["--output=streamed_jsonproto", *args], use_query_file=use_query_file
+        ) as query_output:
+            yield iter_streamed_jsonproto(query_output)
+
+
 def get_dependencies(bazel_query: BazelQuery, target: str) -> list[Dependency]:
     """
     Extract dependencies from a given target together with further information about those dependencies.
@@ -133,91 +274,549 @@ def get_dependencies(bazel_query: BazelQuery, target: str) -> list[Dependency]:
 
     # We ignore implementation_deps as they are only able to provide headers to the target under inspection as
     # direct dependency. We are searching for transitive dependencies providing headers to the target under inspection.
-    output = "jsonproto" if bazel_query.uses_cquery else "streamed_jsonproto"
-    process = bazel_query.execute(
-        query=f'kind("rule", deps({target}) except deps({target}, 1))', args=[f"--output={output}", "--noimplicit_deps"]
-    )
+    with query_targets(
+        bazel_query=bazel_query,
+        query=f'kind("rule", deps({target}) except deps({target}, 1))',
+        with_rule_inputs=False,
+    ) as queried_targets:
+        # Filter the records while they arrive to keep only the compact information about relevant dependencies
+        return [dep for x in queried_targets if (dep := parse_dependency(x)) is not None]
 
-    if not process.stdout:
-        # Targets without any dependency return nothing to stdout
-        return []
 
-    if bazel_query.uses_cquery:
-        full_query = json.loads(process.stdout)
-        queried_targets = [result["target"] for result in full_query["results"]]
-    else:
-        queried_targets = [json.loads(target) for target in process.stdout.strip().split("\n")]
+class InternTable:
+    """
+    Map strings to consecutive integer ids, storing each unique string only once.
+    """
+
+    __slots__ = ("_ids", "_values")
 
-    deps = []
-    for x in queried_targets:
-        if x["type"] == "RULE" and x["rule"]["ruleClass"].startswith("cc_"):
-            for attr in x["rule"]["attribute"]:
-                if attr["name"] == "hdrs" and attr["explicitlySpecified"] and "stringListValue" in attr:
-                    # One can always use the raw header paths, thus unconditionally evaluate them
-                    hdrs = [target_to_path(hdr) for hdr in attr["stringListValue"]]
+    def __init__(self) -> None:
+        self._ids: dict[str, int] = {}
+        self._values: list[str] = []
 
-                    added_prefix = get_string_attribute(x["rule"]["attribute"], "include_prefix")
-                    stripped_prefix = get_string_attribute(x["rule"]["attribute"], "strip_include_prefix")
-                    if added_prefix or stripped_prefix:
-                        virtual_hdrs = virtualize_headers(
-                            header_labels=attr["stringListValue"],
-                            target_name=get_string_attribute(x["rule"]["attribute"], "name"),
-                            added_prefix=added_prefix,
-                            stripped_prefix=stripped_prefix,
-                        )
-                        hdrs.extend(virtual_hdrs)
-                    deps.append(Dependency(target=x["rule"]["name"], headers=hdrs))
-                    break
+    def __len__(self) -> int:
+        return len(self._values)
 
-    return deps
+    def __getitem__(self, string_id: int) -> str:
+        return self._values[string_id]
 
+    def intern(self, value: str) -> int:
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = len(self._values)
+            self._ids[value] = string_id
+            self._values.append(value)
+        return string_id
 
-def is_visible(bazel_query: BazelQuery, target: str, dep: str) -> bool:
+    def get_id(self, value: str) -> int | None:
+        return self._ids.get(value)
+
+
+class CompressedRows:
     """
-    We can find dependencies, which are actually not usable. For example, the cc_library providing the required
-    header file might be private and only some alias target pointing to it might be visible for the target
-    consuming the header file.
+    Integer lists for consecutive ids in compressed sparse row (CSR) layout. Instead of one Python list per id, all
+    values are stored in a single flat array and the row of each id is located via an offset array.
     """
-    process = bazel_query.execute(query=f"visible({target}, {dep})", args=[], enforce_query=True)
-    return process.stdout != ""
 
+    __slots__ = ("_offsets", "_values")
+
+    def __init__(self, rows: dict[int, array], amount_rows: int) -> None:
+        self._offsets = array("Q", [0])
+        self._values = array("I")
+        for row_id in range(amount_rows):
+            if (row := rows.get(row_id)) is not None:
+                self._values.extend(row)
+            self._offsets.append(len(self._values))
+
+    def __getitem__(self, row_id: int) -> array:
+        return self._values[self._offsets[row_id] : self._offsets[row_id + 1]]
 
-def is_matching_header(desired_header: str, provided_header: str) -> bool:
+
+class DependencyGraph:
     """
-    If the desired header is generated code, it has a path similar to 'bazel-out/k8-fastbuild/bin/foo/bar.h', but the
-    target providing it reports 'foo/bar.h'
-    If the desired header is from external code, it has a path similar to 'external/some_repo/foo/bar.h', but the
-    target providing it reports 'foo/bar.h'
+    Dependency graph of the rules in the union of the transitive closures of multiple targets.
+
+    Instead of executing a dedicated Bazel query per target, we query the graph for many targets at once and compute
+    the transitive dependencies of each individual target locally.
+
+    In large workspaces the graph contains hundreds of thousands of rules, whose labels and header paths appear many
+    times. Thus, labels and header paths are interned and referenced via integer ids. The rule inputs and the headers
+    of the rules are stored in compact arrays. Memory consumption is proportional to the amount of unique labels,
+    header paths and edges. The Dependency objects we report are created on demand and not kept by the graph.
+
+    All rules have to be added before computing dependencies. The first computation compacts the graph and further
+    rules cannot be added afterwards.
     """
-    if "/bin/" in desired_header:
-        desired_header = desired_header.split("/bin/", maxsplit=1)[1]
-    if desired_header.startswith("external/"):
-        desired_header = desired_header.split("/", maxsplit=2)[2]
-    return desired_header == provided_header
 
+    def __init__(self) -> None:
+        self._labels = InternTable()
+        self._header_paths = InternTable()
+        # Rule inputs and headers collected while adding rules. Both are compacted when computing dependencies.
+        self._pending_rule_inputs: dict[int, array] = {}
+        self._pending_headers: dict[int, array] = {}
+        # Explicitly specified visibility and virtual includes are rare, thus there is no need to store them compactly
+        self._visibility: dict[int, list[str]] = {}
+        self._virtual_includes: dict[int, VirtualIncludes] = {}
+        self._rule_inputs: CompressedRows | None = None
+        self._headers: CompressedRows | None = None
+        # Flags per label id
+        self._is_rule = bytearray()
+        self._provides_headers = bytearray()
+        self._lock = Lock()
+        self.header_providers = HeaderProviders()
+
+    def add_target(self, queried_target: dict) -> None:
+        if queried_target["type"] != "RULE":
+            return
+        rule = queried_target["rule"]
+        self.add_rule(
+            name=rule["name"], rule_inputs=rule.get("ruleInput", []), dependency=parse_dependency(queried_target)
+        )
 
-def match_deps_to_header(
-    bazel_query: BazelQuery, target: str, header: str, target_deps: list[Dependency]
-) -> str | None:
+    def add_rule(self, name: str, rule_inputs: list[str], dependency: Dependency | None) -> None:
+        """
+        Add a rule for which we already know its inputs and the dependency information it provides. Adding the same
+        rule multiple times, e.g. from overlapping queries, replaces the previous information.
+        """
+        if self._rule_inputs is not None:
+            raise RuntimeError("Rules cannot be added to the dependency graph after computing dependencies")
+
+        rule_id = self._labels.intern(name)
+        self._pending_rule_inputs[rule_id] = array("I", [self._labels.intern(rule_input) for rule_input in rule_inputs])
+        if dependency is not None:
+            self._pending_headers[rule_id] = array("I", [self._header_paths.intern(hdr) for hdr in dependency.headers])
+            if dependency.visibility is not None:
+                self._visibility[rule_id] = dependency.visibility
+            if dependency.virtual_includes is not None:
+                self._virtual_includes[rule_id] = dependency.virtual_includes
+        else:
+            self._pending_headers.pop(rule_id, None)
+            self._visibility.pop(rule_id, None)
+            self._virtual_includes.pop(rule_id, None)
+
+    def get_dependencies(self, target: str) -> list[Dependency] | None:
+        """
+        Provide the same result as 'get_dependencies()' by computing 'deps(<target>) except deps(<target>, 1)' locally.
+        Return None if the target is not part of the graph.
+        """
+        with self._lock:
+            if self._rule_inputs is None:
+                self._compact()
+
+        target_id = self._labels.get_id(normalize_label(target))
+        if target_id is None or not self._is_rule[target_id]:
+            return None
+
+        direct_deps = self._rule_inputs[target_id]
+        visited = {target_id, *direct_deps}
+        queue = deque(direct_deps)
+        transitive_deps = []
+        while queue:
+            for dep in self._rule_inputs[queue.popleft()]:
+                if dep not in visited:
+                    visited.add(dep)
+                    transitive_deps.append(dep)
+                    queue.append(dep)
+
+        return [
+            self._make_dependency(dep)
+            for dep in sorted(transitive_deps, key=self._labels.__getitem__)
+            if self._provides_headers[dep]
+        ]
+
+    def _compact(self) -> None:
+        amount_labels = len(self._labels)
+        self._is_rule = bytearray(amount_labels)
+        for rule_id in self._pending_rule_inputs:
+            self._is_rule[rule_id] = 1
+        self._provides_headers = bytearray(amount_labels)
+        for rule_id in self._pending_headers:
+            self._provides_headers[rule_id] = 1
+
+        self._rule_inputs = CompressedRows(rows=self._pending_rule_inputs, amount_rows=amount_labels)
+        self._headers = CompressedRows(rows=self._pending_headers, amount_rows=amount_labels)
+        self._pending_rule_inputs = {}
+        self._pending_headers = {}
+
+    def _make_dependency(self, rule_id: int) -> Dependency:
+        return Dependency(
+            target=self._labels[rule_id],
+            headers=[self._header_paths[hdr] for hdr in self._headers[rule_id]],
+            visibility=self._visibility.get(rule_id),
+            virtual_includes=self._virtual_includes.get(rule_id),
+        )
+
+
+def query_dependency_graph(bazel_query: BazelQuery, targets: list[str]) -> DependencyGraph:
     """
-    From the preprocessing step we know the whole path of the desired header file in the Bazel sandbox structure.
-    We can simply compare the sandbox paths of the header files provided by the dependencies with the path of the
-    invalid include to find a matching dependency.
+    Query the dependency graph for all given targets at once. Only very large amounts of targets are split into a few
+    chunked queries. The queries are passed via a file to Bazel to prevent hitting command line length limits.
     """
+    graph = DependencyGraph()
+    for start in range(0, len(targets), BATCHED_QUERY_CHUNK_SIZE):
+        chunk = " ".join(f'"{target}"' for target in targets[start : start + BATCHED_QUERY_CHUNK_SIZE])
+        with query_targets(
+            bazel_query=bazel_query,
+            query=f'kind("rule", deps(set({chunk})))',
+            with_rule_inputs=True,
+            use_query_file=True,
+        ) as queried_targets:
+            for queried_target in queried_targets:
+                graph.add_target(queried_target)
+    return graph
+
+
+class ConfiguredDependencyGraph:
+    """
+    Dependency graphs of configured targets as reported by 'bazel cquery'. The same label can be part of multiple
+    configurations with different dependencies. Thus, each target is looked up in the graph of the configuration in
+    which it has been analyzed.
 
-    deps_providing_header = [
-        dep.target
-        for dep in target_deps
-        if any(is_matching_header(desired_header=header, provided_header=hdr) for hdr in dep.headers)
-    ]
-    visible_deps_providing_header = [
-        dep for dep in deps_providing_header if is_visible(bazel_query=bazel_query, target=target, dep=dep)
+    We expect a dependency to provide the same headers in all configurations. Thus, the header providers memo is
+    shared by all graphs.
+    """
+
+    def __init__(self) -> None:
+        self._graphs: dict[str, DependencyGraph] = {}
+        self.header_providers = HeaderProviders()
+
+    def add_graph(self, targets: list[str], graph: DependencyGraph) -> None:
+        for target in targets:
+            self._graphs[normalize_label(target)] = graph
+
+    def get_dependencies(self, target: str) -> list[Dependency] | None:
+        graph = self._graphs.get(normalize_label(target))
+        return graph.get_dependencies(target) if graph else None
+
+
+def get_configured_rule_inputs(rule: dict, checksum: str, configuration_id: int = 0) -> list[str]:
+    """
+    Only 'configuredRuleInput' tells in which configuration an input is used. We ignore inputs of other configurations,
+    e.g. tools built for the execution platform, as they cannot provide headers to the target under inspection. Inputs
+    without a configuration, e.g. source files, are used in every configuration.
+    """
+    if "configuredRuleInput" not in rule:
+        return rule.get("ruleInput", [])
+    if checksum:
+        return [
+            rule_input["label"]
+            for rule_input in rule["configuredRuleInput"]
+            if rule_input.get("configurationChecksum", checksum) == checksum
+        ]
+    return [
+        rule_input["label"]
+        for rule_input in rule["configuredRuleInput"]
+        if rule_input.get("configurationId", configuration_id) == configuration_id
     ]
 
+
+def get_configuration_mnemonic(configurations: list[dict], checksum: str, configuration_id: int) -> str | None:
+    """
+    The cquery results reference their configuration via 'configurationId' and the deprecated 'configuration.checksum'.
+    Details like the mnemonic are only listed in the top level 'configurations' table of the 'jsonproto' output. We
+    prefer the checksum, as the 'jsonproto' output omits an id of value 0.
+    """
+    for config in configurations:
+        matches = config.get("checksum") == checksum if checksum else config.get("id", 0) == configuration_id
+        if matches:
+            return config.get("mnemonic")
+    return None
+
+
+def query_graph_in_configuration(
+    bazel_query: BazelQuery, targets: list[str], configuration: str | None
+) -> DependencyGraph | None:
+    """
+    Use the targets as universe scope to configure them as top level targets, like they are configured when executing
+    DWYU on them. We keep the graph of the configuration matching the output directory of the DWYU reports. If the
+    cquery configures the targets differently, e.g. since it is not executed with the same '--bazel-args' as DWYU, we
+    fall back to the configuration of the top level targets.
+    """
+    target_labels = {normalize_label(target) for target in targets}
+    # Graphs and top level configurations are keyed by the configuration checksum and id
+    graphs: dict[tuple[str, int], DependencyGraph] = {}
+    top_level_configurations: dict[tuple[str, int], None] = {}
+    configurations: list[dict] = []
+    targets_set = " ".join(f'"{target}"' for target in targets)
+    with bazel_query.stream(
+        query=f'kind("rule", deps(set({targets_set})))',
+        args=[
+            "--output=jsonproto",
+            f"--universe_scope={','.join(targets)}",
+            "--noimplicit_deps",
+            *make_lean_proto_args(with_rule_inputs=True),
+        ],
+        use_query_file=True,
+    ) as query_output:
+        for result in iter_jsonproto_results(query_output, configurations=configurations):
+            queried_target = result["target"]
+            if queried_target["type"] != "RULE":
+                continue
+            rule = queried_target["rule"]
+            key = (result.get("configuration", {}).get("checksum", ""), result.get("configurationId", 0))
+            graphs.setdefault(key, DependencyGraph()).add_rule(
+                name=rule["name"],
+                rule_inputs=get_configured_rule_inputs(rule=rule, checksum=key[0], configuration_id=key[1]),
+                dependency=parse_dependency(queried_target),
+            )
+            if normalize_label(rule["name"]) in target_labels:
+                top_level_configurations[key] = None
+
+    for key in top_level_configurations:
+        mnemonic = get_configuration_mnemonic(configurations=configurations, checksum=key[0], configuration_id=key[1])
+        if mnemonic == configuration:
+            return graphs[key]
+    if top_level_configurations:
+        log.debug(f"The cquery did not configure the targets in configuration '{configuration}'")
+        return graphs[next(iter(top_level_configurations))]
+    return None
+
+
+def chunk_universe_scope(targets: list[str]) -> Iterator[list[str]]:
+    """
+    Split the targets into chunks of at most BATCHED_QUERY_CHUNK_SIZE targets, whose comma separated universe scope is
+    not longer than MAX_UNIVERSE_SCOPE_LENGTH. A single target exceeding the limit on its own forms its own chunk.
+    """
+    chunk: list[str] = []
+    scope_length = 0
+    for target in targets:
+        if chunk and (
+            len(chunk) == BATCHED_QUERY_CHUNK_SIZE or scope_length + 1 + len(target) > MAX_UNIVERSE_SCOPE_LENGTH
+        ):
+            yield chunk
+            chunk = []
+        scope_length = scope_length + 1 + len(target) if chunk else len(target)
+        chunk.append(target)
+    if chunk:
+        yield chunk
+
+
+def query_configured_dependency_graph(
+    bazel_query: BazelQuery, targets_per_configuration: dict[str | None, list[str]]
+) -> ConfiguredDependencyGraph:
+    """
+    Query the configured dependency graph with a single cquery per configuration in which DWYU analyzed the targets.
+    Only very large amounts of targets are split into a few chunked queries, as the universe scope has to be passed
+    on the command line.
+    """
+    configured_graph = ConfiguredDependencyGraph()
+    for configuration, targets in targets_per_configuration.items():
+        for chunk in chunk_universe_scope(targets):
+            graph = query_graph_in_configuration(bazel_query=bazel_query, targets=chunk, configuration=configuration)
+            if graph is not None:
+                configured_graph.add_graph(targets=chunk, graph=graph)
+    return configured_graph
+
+
+class ProcessedDepsIndex:
+    """
+    Dependency information derived from the files the DWYU aspect created while analyzing targets. This allows
+    searching for missing dependencies without querying Bazel.
+
+    For each analyzed target, the aspect processes the header files of all its direct dependencies. Combining this
+    information from all analyzed targets yields the transitive dependencies of a target. This works only if all
+    dependencies in the transitive closure have been analyzed as well, e.g. by executing DWYU recursively.
+
+    The aspect reports external dependencies with their canonical repository name. As the labels end up in BUILD files,
+    they are converted to the apparent repository names of the main repository.
+    """
+
+    def __init__(self, apparent_repo_names: dict[str, str] | None = None) -> None:
+        self._apparent_repo_names = apparent_repo_names or {}
+        self._direct_deps: dict[str, list[str]] = {}
+        self._headers: dict[str, list[str]] = {}
+        self.header_providers = HeaderProviders()
+
+    def add_analyzed_target(self, target: str) -> None:
+        self._direct_deps.setdefault(self._to_label(target), [])
+
+    def add_processed_dep(self, target: str, processed_dep: dict) -> None:
+        """
+        Register the content of a '<target_name>_processed_dep_<hash>.json' file created for the analyzed target.
+        """
+        dep = self._to_label(processed_dep["target"])
+        self._direct_deps.setdefault(self._to_label(target), []).append(dep)
+        if dep not in self._headers:
+            self._headers[dep] = [normalize_header(hdr) for hdr in processed_dep["header_files"]]
+
+    def get_dependencies(self, target: str) -> list[Dependency] | None:
+        """
+        Provide the same result as 'get_dependencies()' based on the processed dependencies. Return None if the target
+        or any of its transitive dependencies has not been analyzed, as we do not know the complete closure then.
+        """
+        target = self._to_label(target)
+        if target not in self._direct_deps:
+            return None
+
+        direct_deps = self._direct_deps[target]
+        visited = {target, *direct_deps}
+        queue = deque(direct_deps)
+        transitive_deps = set()
+        while queue:
+            dep = queue.popleft()
+            if dep not in self._direct_deps:
+                return None
+            for dep_of_dep in self._direct_deps[dep]:
+                if dep_of_dep not in visited:
+                    visited.add(dep_of_dep)
+                    transitive_deps.add(dep_of_dep)
+                    queue.append(dep_of_dep)
+
+        # The header paths of the processed dependencies are the actual files, including virtual header files created
+        # due to 'include_prefix' and 'strip_include_prefix'. Thus, there is no need to reconstruct those.
+        return [
+            Dependency(target=dep, headers=self._headers[dep]) for dep in sorted(transitive_deps) if self._headers[dep]
+        ]
+
+    def _to_label(self, label: str) -> str:
+        return to_apparent_label(label=label, apparent_repo_names=self._apparent_repo_names)
+
+
+def normalize_header(header: str) -> str:
+    """
+    If the header is generated code, it has a path similar to 'bazel-out/k8-fastbuild/bin/foo/bar.h', but the target
+    providing it reports 'foo/bar.h'
+    If the header is from external code, it has a path similar to 'external/some_repo/foo/bar.h', but the target
+    providing it reports 'foo/bar.h'
+    """
+    if "/bin/" in header:
+        header = header.split("/bin/", maxsplit=1)[1]
+    if header.startswith("external/"):
+        header = header.split("/", maxsplit=2)[2]
+    return header
+
+
+class HeaderProviders:
+    """
+    Memo of the dependencies providing a normalized header path, shared by all searches using the same source of
+    dependency information.
+
+    Many targets miss the same headers and share large parts of their transitive dependencies. Thus, we index the
+    headers of each dependency only once per run instead of building a header index for each target. Lookups are
+    restricted to the transitive dependencies of the target under inspection, which are indexed before the lookup.
+    Thus, a header without any provider is answered by the memo as well, without inspecting any dependency again.
+
+    We expect a dependency to provide the same headers independent of the target for which we encounter it.
+    """
+
+    def __init__(self) -> None:
+        self._providers: dict[str, set[str]] = {}
+        self._indexed: set[str] = set()
+        self._indexed_virtual: set[str] = set()
+        self._lock = Lock()
+
+    def find_providers(
+        self, target_deps: list[Dependency], headers: Iterable[str], with_virtual_headers: bool
+    ) -> dict[str, list[str]]:
+        """
+        Map each normalized header to the given dependencies providing it. The reconstructed '_virtual_includes' paths
+        are only considered if requested.
+        """
+        with self._lock:
+            for dep in target_deps:
+                if dep.target not in self._indexed:
+                    self._indexed.add(dep.target)
+                    self._add_provider(dep=dep.target, headers=dep.headers)
+                if with_virtual_headers and dep.target not in self._indexed_virtual:
+                    self._indexed_virtual.add(dep.target)
+                    self._add_provider(dep=dep.target, headers=dep.get_virtual_headers())
+
+            closure = {dep.target for dep in target_deps}
+            return {header: sorted(self._providers.get(header, set()) & closure) for header in headers}
+
+    def _add_provider(self, dep: str, headers: list[str]) -> None:
+        for hdr in headers:
+            self._providers.setdefault(hdr, set()).add(dep)
+
+
+class UnresolvedHeaders:
+    """
+    Many targets can miss the same header. Instead of warning for each target about a header for which we cannot
+    select a dependency, we collect those headers and report them once per header at the end of the run.
+    """
+
+    def __init__(self) -> None:
+        self._not_found: dict[str, list[str]] = {}
+        self._ambiguous: dict[str, list[str]] = {}
+        self._ambiguous_candidates: dict[str, set[str]] = {}
+        self._lock = Lock()
+
+    def add_not_found(self, header: str, target: str) -> None:
+        with self._lock:
+            self._not_found.setdefault(normalize_header(header), []).append(target)
+
+    def add_ambiguous(self, header: str, target: str, candidates: list[str]) -> None:
+        with self._lock:
+            self._ambiguous.setdefault(normalize_header(header), []).append(target)
+            self._ambiguous_candidates.setdefault(normalize_header(header), set()).update(candidates)
+
+    @property
+    def targets(self) -> set[str]:
+        """
+        Targets for which at least one header could not be resolved to a dependency.
+        """
+        with self._lock:
+            return set(chain(*self._not_found.values(), *self._ambiguous.values()))
+
+    def log_summary(self) -> None:
+        """
+        Report each header in a single line naming the first target requiring it in the same way as the warnings per
+        target and the amount of further targets requiring it. The further targets are only listed in verbose mode.
+        """
+        for header, targets in sorted(self._ambiguous.items()):
+            first_target, *other_targets = sorted(set(targets))
+            log.warning(
+                f"Found multiple targets providing the header file '{header}' required by target '{first_target}'."
+                f"{self._format_other_targets(other_targets)} Cannot determine correct dependency."
+                f" Discovered potential dependencies are: {sorted(self._ambiguous_candidates[header])}."
+            )
+            self._log_other_targets(header=header, targets=other_targets)
+        for header, targets in sorted(self._not_found.items()):
+            first_target, *other_targets = sorted(set(targets))
+            log.warning(
+                f"Could not find a dependency providing providing the header file '{header}' for target "
+                f"'{first_target}'.{self._format_other_targets(other_targets)}"
+            )
+            self._log_other_targets(header=header, targets=other_targets)
+        if self._not_found:
+            log.warning(
+                """
+  Is a header file maybe wrongly part of the 'srcs' attribute instead of 'hdrs' in the library which should provide the header?
+  Or is an include resolved through the toolchain instead of through a dependency?
+                """.strip("\n")
+            )
+
+    @staticmethod
+    def _format_other_targets(targets: list[str]) -> str:
+        if not targets:
+            return ""
+        return f" The header is required as well by {len(targets)} further target(s)."
+
+    @staticmethod
+    def _log_other_targets(header: str, targets: list[str]) -> None:
+        if targets:
+            log.debug(f"Further targets requiring the header file '{header}': {targets}")
+
+
+def select_dependency_for_header(
+    target: str,
+    header: str,
+    visible_deps_providing_header: list[str],
+    unresolved_headers: UnresolvedHeaders | None = None,
+) -> str | None:
+    """
+    From the preprocessing step we know the whole path of the desired header file in the Bazel sandbox structure.
+    We can simply look up the normalized sandbox path of the invalid include in the header paths provided by the
+    dependencies to find the matching dependencies. We can only choose a dependency if this is unambiguous.
+    If we cannot choose a dependency, we warn immediately unless a collector for a summary is provided.
+    """
     if len(visible_deps_providing_header) == 1:
         return visible_deps_providing_header[0]
 
     if len(visible_deps_providing_header) > 1:
+        if unresolved_headers is not None:
+            unresolved_headers.add_ambiguous(header=header, target=target, candidates=visible_deps_providing_header)
+            return None
         log.warning(
             f"""
 Found multiple targets providing the header file '{header}' required by target '{target}'.
@@ -227,6 +826,9 @@ Found multiple targets providing the header file '{header}' required by target '
         )
         return None
 
+    if unresolved_headers is not None:
+        unresolved_headers.add_not_found(header=header, target=target)
+        return None
     log.warning(
         f"""
 Could not find a dependency providing providing the header file '{header}' for target '{target}'.
@@ -238,20 +840,67 @@ Could not find a dependency providing providing the header file '{header}' for t
 
 
 def search_missing_deps(
-    bazel_query: BazelQuery, target: str, headers_without_direct_dep: dict[str, list[str]]
+    bazel_query: BazelQuery,
+    target: str,
+    headers_without_direct_dep: dict[str, list[str]],
+    dependency_graph: DependencyGraph | ConfiguredDependencyGraph | None = None,
+    visibility: VisibilityChecker | None = None,
+    processed_deps: ProcessedDepsIndex | None = None,
+    header_providers: HeaderProviders | None = None,
+    unresolved_headers: UnresolvedHeaders | None = None,
 ) -> list[str]:
     """
     Search for targets providing header files matching the include statements in the transitive dependencies of the
     target under inspection.
+    If the processed dependencies of the DWYU aspect cover the target, they are used instead of querying Bazel.
+    Otherwise, if a batched dependency graph is available, it is used instead of querying the dependencies of the
+    target.
+    Providing a visibility checker allows reusing already known visibility information from previous searches.
+    Providing a header providers memo allows reusing the header index for dependencies queried in previous searches.
+    Providing a collector for unresolved headers replaces the warnings per target with a summary.
     """
     if not headers_without_direct_dep:
         return []
 
-    target_deps = get_dependencies(bazel_query=bazel_query, target=target)
+    # Each source of dependency information has its own memo, as they describe the headers of a dependency differently
+    if processed_deps and (target_deps := processed_deps.get_dependencies(target)) is not None:
+        header_providers = processed_deps.header_providers
+    elif dependency_graph and (target_deps := dependency_graph.get_dependencies(target)) is not None:
+        header_providers = dependency_graph.header_providers
+    else:
+        target_deps = get_dependencies(bazel_query=bazel_query, target=target)
+        header_providers = header_providers or HeaderProviders()
+
     header_files_without_direct_dep = list(chain(*headers_without_direct_dep.values()))
+    normalized_headers = {header: normalize_header(header) for header in header_files_without_direct_dep}
+    # Reconstructing the virtual header paths is only worth it, if a header is actually located in a virtual location
+    providers = header_providers.find_providers(
+        target_deps=target_deps,
+        headers=set(normalized_headers.values()),
+        with_virtual_headers=any(VIRTUAL_INCLUDES_DIR in header for header in normalized_headers.values()),
+    )
+    deps_providing_headers = {
+        header: providers[normalized_headers[header]] for header in header_files_without_direct_dep
+    }
+    candidates = sorted(set(chain(*deps_providing_headers.values())))
+
+    if visibility is None:
+        visibility = VisibilityChecker(bazel_query)
+    for dep in target_deps:
+        if dep.visibility is not None:
+            visibility.register_declared_visibility(dep=dep.target, visibility=dep.visibility)
+    visible_deps = set(visibility.filter_visible(target=target, candidates=candidates)) if candidates else set()
+
     return [
         dep
         for header in header_files_without_direct_dep
-        if (dep := match_deps_to_header(bazel_query=bazel_query, target=target, header=header, target_deps=target_deps))
+        if (
+            dep := select_dependency_for_header(
+                target=target,
+                header=header,
+                visible_deps_providing_header=[d for d in deps_providing_headers[header] if d in visible_deps],
+                unresolved_headers=unresolved_headers,
+            )
+        )
         is not None
     ]
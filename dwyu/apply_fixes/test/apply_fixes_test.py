@@ -1,11 +1,26 @@
 import argparse
+import json
+import subprocess
 import unittest
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from unittest.mock import MagicMock, patch
 
 from python.runfiles import Runfiles
 
-from dwyu.apply_fixes.apply_fixes import check_bazel_available, get_buildozer_binary, get_workspace
+from dwyu.apply_fixes.apply_fixes import (
+    AppliedFixesRecorder,
+    RequestedFixes,
+    StreamedFixes,
+    check_bazel_available,
+    get_buildozer_binary,
+    get_workspace,
+    load_report,
+    reports_arrive_while_building,
+    select_reports_to_fix,
+)
+from dwyu.apply_fixes.buildozer_executor import BuildozerExecutor
+from dwyu.apply_fixes.journal import ReportJournal
 
 
 class TestCheckBazelAvailable(unittest.TestCase):
@@ -89,5 +104,261 @@ class TestGetWorkspace(unittest.TestCase):
         self.assertIsNone(result)
 
 
+class TestLoadReport(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.report = Path(tmp_dir.name) / "foo_dwyu_report.json"
+
+    def test_skip_parsing_report_without_findings(self) -> None:
+        self.report.write_text('{"analyzed_target":"//foo:bar","is_ok":true,"unused_deps":[]}')
+
+        with patch("dwyu.apply_fixes.apply_fixes.json.loads") as json_loads:
+            result = load_report(self.report)
+
+        json_loads.assert_not_called()
+        self.assertEqual(result, {"analyzed_target": "//foo:bar", "is_ok": True})
+
+    def test_parse_report_with_findings(self) -> None:
+        self.report.write_text('{"analyzed_target":"//foo:bar","is_ok":false,"unused_deps":["//foo:baz"]}')
+
+        result = load_report(self.report)
+
+        self.assertEqual(result, {"analyzed_target": "//foo:bar", "is_ok": False, "unused_deps": ["//foo:baz"]})
+
+    def test_parse_report_not_matching_compact_layout(self) -> None:
+        self.report.write_text('{\n  "analyzed_target": "//foo:bar",\n  "is_ok": true\n}')
+
+        result = load_report(self.report)
+
+        self.assertEqual(result, {"analyzed_target": "//foo:bar", "is_ok": True})
+
+
+class TestReportsArriveWhileBuilding(unittest.TestCase):
+    @staticmethod
+    def make_args(**kwargs: object) -> argparse.Namespace:
+        args = {"dwyu_manifest": None, "build_event_json_file": None, "dwyu_log_file": None, "dwyu_targets": None}
+        return argparse.Namespace(**{**args, **kwargs})
+
+    def test_build_event_file(self) -> None:
+        self.assertTrue(reports_arrive_while_building(self.make_args(build_event_json_file=Path("events.json"))))
+
+    def test_log_from_stdin(self) -> None:
+        self.assertTrue(reports_arrive_while_building(self.make_args(dwyu_log_file=Path("-"))))
+
+    def test_finished_log_file(self) -> None:
+        self.assertFalse(reports_arrive_while_building(self.make_args(dwyu_log_file=Path("dwyu.log"))))
+
+    def test_log_from_stdin_with_queried_targets(self) -> None:
+        self.assertFalse(reports_arrive_while_building(self.make_args(dwyu_log_file=Path("-"), dwyu_targets=["//..."])))
+
+    def test_manifest_takes_precedence(self) -> None:
+        self.assertFalse(
+            reports_arrive_while_building(
+                self.make_args(build_event_json_file=Path("events.json"), dwyu_manifest=[Path("manifest")])
+            )
+        )
+
+
+class TestRequestedFixes(unittest.TestCase):
+    def test_without_dep_findings(self) -> None:
+        requested_fixes = RequestedFixes(
+            argparse.Namespace(
+                fix_unused_deps=False, fix_deps_which_should_be_private=False, fix_missing_deps=False, fix_all=True
+            )
+        )
+
+        remaining = requested_fixes.without_dep_findings()
+
+        self.assertTrue(requested_fixes.fixes_dep_findings)
+        self.assertFalse(remaining.fixes_dep_findings)
+        self.assertTrue(remaining.add_missing_deps)
+
+    def test_kinds(self) -> None:
+        requested_fixes = RequestedFixes(
+            argparse.Namespace(
+                fix_unused_deps=True, fix_deps_which_should_be_private=False, fix_missing_deps=True, fix_all=False
+            )
+        )
+
+        self.assertEqual(requested_fixes.kinds, ["fix_unused", "fix_missing"])
+
+
+class TestSelectReportsToFix(unittest.TestCase):
+    def setUp(self) -> None:
+        self.reports = {
+            Path("clean"): {"analyzed_target": "//:clean", "is_ok": True},
+            Path("processed"): {"analyzed_target": "//:processed", "is_ok": False},
+            Path("unprocessed"): {"analyzed_target": "//:unprocessed", "is_ok": False},
+        }
+
+    def test_skip_reports_without_findings(self) -> None:
+        result = select_reports_to_fix(reports=self.reports, journal=None)
+
+        self.assertEqual(list(result), [Path("processed"), Path("unprocessed")])
+
+    def test_skip_reports_recorded_in_journal(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            journal = ReportJournal(Path(tmp_dir) / "journal.jsonl", ["fix_unused"])
+            journal.record([(Path("processed"), self.reports[Path("processed")], 1)])
+
+            result = select_reports_to_fix(reports=self.reports, journal=journal)
+
+        self.assertEqual(list(result), [Path("unprocessed")])
+
+    def test_process_reports_again_after_changing_fix_options(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            journal_file = Path(tmp_dir) / "journal.jsonl"
+            ReportJournal(journal_file, ["fix_unused"]).record(
+                [(Path("processed"), self.reports[Path("processed")], 1)]
+            )
+
+            result = select_reports_to_fix(reports=self.reports, journal=ReportJournal(journal_file, ["fix_missing"]))
+
+        self.assertEqual(list(result), [Path("processed"), Path("unprocessed")])
+
+
+class TestAppliedFixesRecorder(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.workspace = Path(tmp_dir.name)
+        for package in ("foo", "bar"):
+            (self.workspace / package).mkdir()
+            (self.workspace / package / "BUILD").touch()
+        self.journal_file = self.workspace / "journal.jsonl"
+        self.buildozer = BuildozerExecutor(
+            binary="buildozer", buildozer_args=[], workspace=self.workspace, dry=False, jobs=2
+        )
+        self.reports = {
+            Path("foo"): {"analyzed_target": "//foo:foo", "is_ok": False},
+            Path("bar"): {"analyzed_target": "//bar:bar", "is_ok": False},
+            Path("baz"): {"analyzed_target": "//foo:baz", "is_ok": False},
+        }
+
+    def test_next_execution_skips_reports_processed_before_interruption(self) -> None:
+        def run(cmd: list[str], **_: object) -> subprocess.CompletedProcess:
+            if "//foo:foo" in Path(cmd[-1]).read_text(encoding="utf-8"):
+                raise KeyboardInterrupt
+            stdout = "//bar:bar [//:c] (missing)\n//bar:bar [] (missing)\n"
+            return subprocess.CompletedProcess(args=cmd, returncode=0, stdout=stdout, stderr="fixed bar/BUILD\n")
+
+        self.buildozer.execute(task="remove deps //:a", target="//foo:foo")
+        self.buildozer.execute(task="add deps //:b", target="//foo:foo")
+        self.buildozer.execute(task="remove deps //:c", target="//bar:bar")
+        recorder = AppliedFixesRecorder(
+            journal=ReportJournal(self.journal_file, ["fix_unused"]), reports=self.reports, buildozer=self.buildozer
+        )
+        with patch("subprocess.run", MagicMock(side_effect=run)), self.assertRaises(KeyboardInterrupt):
+            self.buildozer.flush(on_targets_flushed=recorder.record_flushed_targets)
+
+        result = select_reports_to_fix(reports=self.reports, journal=ReportJournal(self.journal_file, ["fix_unused"]))
+
+        self.assertEqual(list(result), [Path("foo"), Path("baz")])
+
+    def test_do_not_record_reports_of_failed_targets(self) -> None:
+        journal = ReportJournal(self.journal_file, ["fix_unused"])
+        recorder = AppliedFixesRecorder(journal=journal, reports=self.reports, buildozer=self.buildozer)
+
+        recorder.record_flushed_targets({"//foo:foo": [0, 2], "//bar:bar": [0, 3]})
+
+        self.assertFalse(journal.is_processed(report=Path("foo"), content=self.reports[Path("foo")]))
+        self.assertTrue(journal.is_processed(report=Path("bar"), content=self.reports[Path("bar")]))
+        self.assertFalse(journal.is_processed(report=Path("baz"), content=self.reports[Path("baz")]))
+
+    def test_combine_results_of_previous_flushes(self) -> None:
+        journal = ReportJournal(self.journal_file, ["fix_unused"])
+        recorder = AppliedFixesRecorder(
+            journal=journal,
+            reports=self.reports,
+            buildozer=self.buildozer,
+            previous_results={"//foo:foo": [2], "//bar:bar": [0], "//foo:baz": [0]},
+        )
+
+        recorder.record_flushed_targets({"//foo:foo": [0], "//bar:bar": [0]})
+        recorder.record_remaining()
+
+        self.assertFalse(journal.is_processed(report=Path("foo"), content=self.reports[Path("foo")]))
+        self.assertTrue(journal.is_processed(report=Path("bar"), content=self.reports[Path("bar")]))
+        self.assertTrue(journal.is_processed(report=Path("baz"), content=self.reports[Path("baz")]))
+        fixes = {
+            entry["report"]: entry["fixes"] for entry in map(json.loads, self.journal_file.read_text().splitlines())
+        }
+        self.assertEqual(fixes, {"bar": 2, "baz": 1})
+
+    def test_record_remaining_reports_without_commands(self) -> None:
+        journal = ReportJournal(self.journal_file, ["fix_unused"])
+        recorder = AppliedFixesRecorder(journal=journal, reports=self.reports, buildozer=self.buildozer)
+
+        recorder.record_flushed_targets({"//foo:foo": [2]})
+        recorder.record_remaining()
+
+        self.assertFalse(journal.is_processed(report=Path("foo"), content=self.reports[Path("foo")]))
+        self.assertTrue(journal.is_processed(report=Path("bar"), content=self.reports[Path("bar")]))
+        self.assertTrue(journal.is_processed(report=Path("baz"), content=self.reports[Path("baz")]))
+
+
+class TestStreamedFixes(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.workspace = Path(tmp_dir.name)
+        (self.workspace / "foo").mkdir()
+        (self.workspace / "foo" / "BUILD").touch()
+        self.buildozer = BuildozerExecutor(
+            binary="buildozer", buildozer_args=[], workspace=self.workspace, dry=False, jobs=1
+        )
+        self.requested_fixes = RequestedFixes(
+            argparse.Namespace(
+                fix_unused_deps=True, fix_deps_which_should_be_private=False, fix_missing_deps=True, fix_all=False
+            )
+        )
+
+    @staticmethod
+    def make_report(target: str, unused_deps: list[str]) -> dict:
+        return {
+            "analyzed_target": target,
+            "is_ok": False,
+            "unused_deps": unused_deps,
+            "unused_implementation_deps": [],
+            "deps_which_should_be_private": [],
+        }
+
+    @staticmethod
+    def run_buildozer(cmd: list[str], **_: object) -> subprocess.CompletedProcess:
+        stdout = "".join(
+            f"{target} [//:dep] (missing)\n{target} [] (missing)\n"
+            for target in ("//foo:a", "//foo:b")
+            if target in Path(cmd[-1]).read_text(encoding="utf-8")
+        )
+        return subprocess.CompletedProcess(args=cmd, returncode=0, stdout=stdout, stderr="fixed foo/BUILD\n")
+
+    @patch("dwyu.apply_fixes.apply_fixes.STREAMED_FIXES_BATCH_SIZE", 2)
+    def test_execute_fixes_in_batches(self) -> None:
+        unit = StreamedFixes(buildozer=self.buildozer, requested_fixes=self.requested_fixes, journal=None)
+
+        with patch("subprocess.run", MagicMock(side_effect=self.run_buildozer)) as run_mock:
+            unit.add_report(Path("a"), self.make_report(target="//foo:a", unused_deps=["//:dep"]))
+            run_mock.assert_not_called()
+            unit.add_report(Path("b"), self.make_report(target="//foo:b", unused_deps=["//:dep"]))
+            run_mock.assert_called_once()
+
+        self.assertEqual(unit.results, {"//foo:a": [0], "//foo:b": [0]})
+
+    @patch("dwyu.apply_fixes.apply_fixes.STREAMED_FIXES_BATCH_SIZE", 1)
+    def test_skip_reports_without_findings_and_processed_reports(self) -> None:
+        journal = ReportJournal(self.workspace / "journal.jsonl", ["fix_unused"])
+        processed_report = self.make_report(target="//foo:a", unused_deps=["//:dep"])
+        journal.record([(Path("a"), processed_report, 1)])
+        unit = StreamedFixes(buildozer=self.buildozer, requested_fixes=self.requested_fixes, journal=journal)
+
+        with patch("subprocess.run") as run_mock:
+            unit.add_report(Path("a"), processed_report)
+            unit.add_report(Path("clean"), {"analyzed_target": "//foo:clean", "is_ok": True})
+
+        run_mock.assert_not_called()
+        self.assertEqual(unit.results, {})
+
+
 if __name__ == "__main__":
     unittest.main()
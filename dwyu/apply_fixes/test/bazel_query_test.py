@@ -1,8 +1,13 @@
+import sys
 import unittest
+from io import StringIO
 from pathlib import Path
+from subprocess import CalledProcessError, CompletedProcess
+from tempfile import TemporaryDirectory
 from unittest.mock import MagicMock, patch
 
-from dwyu.apply_fixes.bazel_query import BazelQuery
+from dwyu.apply_fixes.bazel_query import BazelQuery, iter_jsonproto_results, iter_streamed_jsonproto
+from dwyu.apply_fixes.query_cache import QueryCache
 
 
 class TestBazelQuery(unittest.TestCase):
@@ -34,6 +39,86 @@ class TestBazelQuery(unittest.TestCase):
             cmd=["bazel", "cquery", "deps(//foo:bar)"], cwd=Path("foo/bar")
         )
 
+    @patch("dwyu.apply_fixes.bazel_query.execute_and_capture")
+    def test_execute_query_via_query_file(self, execute_and_capture_mock: MagicMock) -> None:
+        query_file_content = []
+
+        def capture_query_file(cmd: list[str], cwd: Path) -> None:  # noqa: ARG001
+            query_file = Path(cmd[-1].removeprefix("--query_file="))
+            query_file_content.append(query_file.read_text())
+
+        execute_and_capture_mock.side_effect = capture_query_file
+        unit = BazelQuery(workspace=Path("foo/bar"), use_cquery=False, query_args=["--foo"], startup_args=[])
+        unit.execute(query="deps(//foo:bar)", args=["--bar"], use_query_file=True)
+
+        cmd = execute_and_capture_mock.call_args.kwargs["cmd"]
+        self.assertEqual(cmd[:4], ["bazel", "query", "--foo", "--bar"])
+        self.assertTrue(cmd[4].startswith("--query_file="))
+        self.assertEqual(query_file_content, ["deps(//foo:bar)"])
+
+    @patch("dwyu.apply_fixes.bazel_query.execute_and_capture")
+    def test_execute_query_with_cache(self, execute_and_capture_mock: MagicMock) -> None:
+        execute_and_capture_mock.return_value = CompletedProcess(args=[], returncode=0, stdout="//foo:bar", stderr="")
+        with TemporaryDirectory() as tmp_dir:
+            cache = QueryCache(directory=Path(tmp_dir) / "cache", workspace=Path(tmp_dir))
+            unit = BazelQuery(workspace=Path(tmp_dir), use_cquery=False, query_args=[], startup_args=[], cache=cache)
+
+            first = unit.execute(query="deps(//foo:bar)", args=[], use_query_file=True)
+            second = unit.execute(query="deps(//foo:bar)", args=[], use_query_file=True)
+            unit.execute(query="deps(//foo:baz)", args=[], use_query_file=True)
+
+        self.assertEqual(execute_and_capture_mock.call_count, 2)
+        self.assertEqual(first.stdout, "//foo:bar")
+        self.assertEqual(second.stdout, "//foo:bar")
+
+    @patch.object(BazelQuery, "_make_cmd", return_value=[sys.executable, "-c", "print('foo'); print('bar')"])
+    def test_stream_query_output(self, _: MagicMock) -> None:
+        unit = BazelQuery(workspace=Path(), use_cquery=False, query_args=[], startup_args=[])
+        with unit.stream(query="deps(//foo:bar)", args=[]) as output:
+            lines = list(output)
+
+        self.assertEqual(lines, ["foo\n", "bar\n"])
+
+    @patch.object(BazelQuery, "_make_cmd", return_value=[sys.executable, "-c", "print('foo'); exit(7)"])
+    def test_stream_failing_query(self, _: MagicMock) -> None:
+        unit = BazelQuery(workspace=Path(), use_cquery=False, query_args=[], startup_args=[])
+        with self.assertRaises(CalledProcessError) as error, unit.stream(query="deps(//foo:bar)", args=[]) as output:
+            output.read()
+
+        self.assertEqual(error.exception.returncode, 7)
+
+    @patch.object(BazelQuery, "_make_cmd", return_value=[sys.executable, "-c", "print('foo\\n' * 100000)"])
+    def test_stream_without_consuming_output(self, _: MagicMock) -> None:
+        unit = BazelQuery(workspace=Path(), use_cquery=False, query_args=[], startup_args=[])
+        with unit.stream(query="deps(//foo:bar)", args=[]) as output:
+            self.assertEqual(output.readline(), "foo\n")
+
+    @patch("dwyu.apply_fixes.bazel_query.execute_and_capture")
+    def test_get_apparent_repo_names(self, execute_and_capture_mock: MagicMock) -> None:
+        execute_and_capture_mock.return_value = CompletedProcess(
+            args=[],
+            returncode=0,
+            stdout='{"":"","my_module":"","rules_foo":"rules_foo+","foo":"rules_foo+","bar":"ext+_repo_rules+bar"}\n',
+            stderr="",
+        )
+        unit = BazelQuery(workspace=Path("foo"), use_cquery=False, query_args=[], startup_args=["--riff"])
+
+        self.assertEqual(unit.get_apparent_repo_names(), {"rules_foo+": "foo", "ext+_repo_rules+bar": "bar"})
+        self.assertEqual(unit.get_repo_mapping()["rules_foo"], "rules_foo+")
+        execute_and_capture_mock.assert_called_once_with(
+            cmd=["bazel", "--riff", "mod", "dump_repo_mapping", ""], cwd=Path("foo")
+        )
+
+    @patch(
+        "dwyu.apply_fixes.bazel_query.execute_and_capture",
+        side_effect=CalledProcessError(returncode=2, cmd=[], stderr="Bzlmod is disabled"),
+    )
+    def test_get_apparent_repo_names_without_bzlmod(self, _: MagicMock) -> None:
+        unit = BazelQuery(workspace=Path("foo"), use_cquery=False, query_args=[], startup_args=[])
+
+        with self.assertLogs(level="WARNING"):
+            self.assertEqual(unit.get_apparent_repo_names(), {})
+
     def test_uses_cquery_property_is_true(self) -> None:
         unit = BazelQuery(workspace=Path("foo/bar"), use_cquery=True, query_args=[], startup_args=[])
         self.assertTrue(unit.uses_cquery)
@@ -43,5 +128,62 @@ class TestBazelQuery(unittest.TestCase):
         self.assertFalse(unit.uses_cquery)
 
 
+class TestIterStreamedJsonproto(unittest.TestCase):
+    def test_decode_records(self) -> None:
+        output = StringIO('{"name": "foo"}\n\n{"name": "bar"}\n')
+        self.assertEqual(list(iter_streamed_jsonproto(output)), [{"name": "foo"}, {"name": "bar"}])
+
+
+class TestIterJsonprotoResults(unittest.TestCase):
+    def test_empty_output(self) -> None:
+        self.assertEqual(list(iter_jsonproto_results(StringIO(""))), [])
+
+    def test_no_results(self) -> None:
+        self.assertEqual(list(iter_jsonproto_results(StringIO('{\n  "results": []\n}'))), [])
+
+    def test_decode_results(self) -> None:
+        output = StringIO(
+            '{\n  "results": [{\n    "target": {"name": "foo"}\n  }, {\n    "target": {"name": "b]r"}\n  }]\n}'
+        )
+        self.assertEqual(
+            list(iter_jsonproto_results(output)), [{"target": {"name": "foo"}}, {"target": {"name": "b]r"}}]
+        )
+
+    @patch("dwyu.apply_fixes.bazel_query.STREAM_CHUNK_SIZE", 3)
+    def test_decode_results_split_across_chunks(self) -> None:
+        output = StringIO('{"results": [{"target": {"name": "foo"}}, {"target": {"name": "bar"}}]}')
+        self.assertEqual(
+            list(iter_jsonproto_results(output)), [{"target": {"name": "foo"}}, {"target": {"name": "bar"}}]
+        )
+
+    @patch("dwyu.apply_fixes.bazel_query.STREAM_CHUNK_SIZE", 3)
+    def test_decode_configurations_following_results(self) -> None:
+        output = StringIO(
+            '{\n  "results": [{"target": {"name": "foo"}, "configurationId": 1}],\n'
+            '  "configurations": [{"checksum": "abc", "mnemonic": "k8-fastbuild", "id": 1}]\n}'
+        )
+        configurations: list[dict] = []
+
+        results = list(iter_jsonproto_results(output, configurations=configurations))
+
+        self.assertEqual(results, [{"target": {"name": "foo"}, "configurationId": 1}])
+        self.assertEqual(configurations, [{"checksum": "abc", "mnemonic": "k8-fastbuild", "id": 1}])
+
+    def test_no_configurations(self) -> None:
+        configurations: list[dict] = []
+
+        list(iter_jsonproto_results(StringIO('{"results": []}'), configurations=configurations))
+
+        self.assertEqual(configurations, [])
+
+    def test_incomplete_configurations(self) -> None:
+        with self.assertRaises(ValueError):
+            list(iter_jsonproto_results(StringIO('{"results": [], "configurations": [{'), configurations=[]))
+
+    def test_incomplete_output(self) -> None:
+        with self.assertRaises(ValueError):
+            list(iter_jsonproto_results(StringIO('{"results": [{"target": {"name": "foo"}}, {"target": ')))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,177 @@
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Thread
+
+from dwyu.apply_fixes.build_events import file_uri_to_path, iter_build_events, iter_reports_from_build_events
+
+REPORT_SUFFIX = "_dwyu_report.json"
+
+
+def make_named_set(set_id: str, files: list[str], file_sets: list[str] | None = None) -> dict:
+    return {
+        "id": {"namedSet": {"id": set_id}},
+        "namedSetOfFiles": {
+            "files": [
+                {"name": file, "uri": f"file:///bin/{file}", "pathPrefix": ["bazel-out", "cfg", "bin"]}
+                for file in files
+            ],
+            "fileSets": [{"id": file_set} for file_set in file_sets or []],
+        },
+    }
+
+
+def make_target_completed(label: str, output_groups: dict[str, list[str]]) -> dict:
+    return {
+        "id": {"targetCompleted": {"label": label, "aspect": "//dwyu:aspect.bzl%dwyu"}},
+        "completed": {
+            "success": True,
+            "outputGroup": [
+                {"name": name, "fileSets": [{"id": file_set} for file_set in file_sets]}
+                for name, file_sets in output_groups.items()
+            ],
+        },
+    }
+
+
+def make_action_completed(label: str, primary_output: str, success: bool = False) -> dict:
+    return {
+        "id": {"actionCompleted": {"primaryOutput": f"bazel-out/cfg/bin/{primary_output}", "label": label}},
+        "action": {
+            "success": success,
+            "label": label,
+            "type": "DwyuAnalyzeTarget",
+            "exitCode": 0 if success else 1,
+            "primaryOutput": {
+                "name": primary_output,
+                "uri": f"file:///bin/{primary_output}",
+                "pathPrefix": ["bazel-out", "cfg", "bin"],
+            },
+        },
+    }
+
+
+def make_failed_target(label: str) -> dict:
+    return {
+        "id": {"targetCompleted": {"label": label, "aspect": "//dwyu:aspect.bzl%dwyu"}},
+        "completed": {"success": False, "failureDetail": {"message": "DWYU found invalid includes"}},
+    }
+
+
+class TestIterBuildEvents(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.build_event_file = Path(tmp_dir.name) / "bep.json"
+
+    def test_read_until_last_message(self) -> None:
+        self.build_event_file.write_text(
+            '{"id":{"started":{}}}\n\n{"id":{"buildFinished":{}}}\n{"id":{},"lastMessage":true}\n{"id":{"unexpected":{}}}\n'
+        )
+
+        events = list(iter_build_events(self.build_event_file))
+
+        self.assertEqual(
+            events, [{"id": {"started": {}}}, {"id": {"buildFinished": {}}}, {"id": {}, "lastMessage": True}]
+        )
+
+    def test_follow_file_written_by_running_build(self) -> None:
+        self.build_event_file.write_text('{"id":{"started":{}}}\n{"id":{"progress"')
+
+        def finish_build() -> None:
+            with self.build_event_file.open("a") as events:
+                events.write(':{}}}\n{"id":{},"lastMessage":true}\n')
+
+        events = iter_build_events(self.build_event_file, poll_interval=0.01)
+        self.assertEqual(next(events), {"id": {"started": {}}})
+        writer = Thread(target=finish_build)
+        writer.start()
+        remaining_events = list(events)
+        writer.join()
+
+        self.assertEqual(remaining_events, [{"id": {"progress": {}}}, {"id": {}, "lastMessage": True}])
+
+    def test_abort_if_last_message_is_missing(self) -> None:
+        self.build_event_file.write_text('{"id":{"started":{}}}\n')
+
+        with self.assertRaisesRegex(RuntimeError, "ended without the last build event"):
+            list(iter_build_events(self.build_event_file, poll_interval=0.01, idle_timeout=0.05))
+
+    def test_abort_if_file_does_not_exist(self) -> None:
+        with self.assertRaisesRegex(FileNotFoundError, "does not exist"):
+            list(iter_build_events(self.build_event_file, poll_interval=0.01, idle_timeout=0.05))
+
+
+class TestIterReportsFromBuildEvents(unittest.TestCase):
+    def test_no_reports(self) -> None:
+        self.assertEqual(list(iter_reports_from_build_events(events=iter([]), report_suffix=REPORT_SUFFIX)), [])
+
+    def test_yield_each_report_of_dwyu_output_group_once(self) -> None:
+        events = [
+            make_named_set("0", ["dep_dwyu_report.json"]),
+            make_named_set("1", ["other_output.txt"]),
+            make_target_completed("//:dep", {"dwyu": ["0"], "other": ["1"]}),
+            make_named_set("2", ["foo_dwyu_report.json", "foo_processed_dep_1a.json"], file_sets=["0"]),
+            make_named_set("3", ["bar_dwyu_report.json"], file_sets=["0"]),
+            make_target_completed("//:foo", {"dwyu": ["2"]}),
+            make_target_completed("//:bar", {"dwyu": ["3"]}),
+        ]
+
+        reports = iter_reports_from_build_events(events=iter(events), report_suffix=REPORT_SUFFIX)
+
+        self.assertEqual(
+            list(reports),
+            [Path("/bin/dep_dwyu_report.json"), Path("/bin/foo_dwyu_report.json"), Path("/bin/bar_dwyu_report.json")],
+        )
+
+    def test_yield_reports_as_soon_as_target_is_completed(self) -> None:
+        events = iter(
+            [
+                make_named_set("0", ["foo_dwyu_report.json"]),
+                make_target_completed("//:foo", {"dwyu": ["0"]}),
+                {"id": {"progress": {}}},
+            ]
+        )
+
+        reports = iter_reports_from_build_events(events=events, report_suffix=REPORT_SUFFIX)
+
+        self.assertEqual(next(reports), Path("/bin/foo_dwyu_report.json"))
+        self.assertEqual(next(events), {"id": {"progress": {}}})
+
+    def test_yield_reports_of_failed_targets(self) -> None:
+        events = [
+            make_named_set("0", ["dep_dwyu_report.json"]),
+            make_target_completed("//:dep", {"dwyu": ["0"]}),
+            make_action_completed("//:foo", "foo_dwyu_report.json"),
+            make_action_completed("//:foo", "foo_other_output.o"),
+            make_failed_target("//:foo"),
+        ]
+
+        reports = iter_reports_from_build_events(events=iter(events), report_suffix=REPORT_SUFFIX)
+
+        self.assertEqual(list(reports), [Path("/bin/dep_dwyu_report.json"), Path("/bin/foo_dwyu_report.json")])
+
+    def test_yield_report_published_by_action_and_target_only_once(self) -> None:
+        # Happens with '--build_event_publish_all_actions'
+        events = [
+            make_action_completed("//:foo", "foo_dwyu_report.json", success=True),
+            make_named_set("0", ["foo_dwyu_report.json"]),
+            make_target_completed("//:foo", {"dwyu": ["0"]}),
+        ]
+
+        reports = iter_reports_from_build_events(events=iter(events), report_suffix=REPORT_SUFFIX)
+
+        self.assertEqual(list(reports), [Path("/bin/foo_dwyu_report.json")])
+
+
+class TestFileUriToPath(unittest.TestCase):
+    def test_local_file(self) -> None:
+        self.assertEqual(file_uri_to_path("file:///some/path%20with%20space.json"), Path("/some/path with space.json"))
+
+    def test_remote_file(self) -> None:
+        with self.assertRaisesRegex(RuntimeError, "not available in the local file system"):
+            file_uri_to_path("bytestream://remote.cache/blobs/1234/42")
+
+
+if __name__ == "__main__":
+    unittest.main()
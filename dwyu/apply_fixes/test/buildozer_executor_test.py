@@ -1,5 +1,7 @@
+import subprocess
 import unittest
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from unittest.mock import MagicMock, patch
 
 from dwyu.apply_fixes.buildozer_executor import BuildozerExecutor
@@ -29,5 +31,230 @@ class TestBuildozerExecutor(unittest.TestCase):
         )
 
 
+PRINT = "print label deps implementation_deps"
+
+
+class TestBuildozerExecutorFlush(unittest.TestCase):
+    def setUp(self) -> None:
+        self.commands_files: list[str] = []
+
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.workspace = Path(tmp_dir.name)
+        (self.workspace / "BUILD").touch()
+        for package, build_file in (("foo", "BUILD.bazel"), ("bar", "BUILD"), ("baz", "BUILD")):
+            (self.workspace / package).mkdir()
+            (self.workspace / package / build_file).touch()
+
+    def make_process(self, returncode: int, stdout: str = "", stderr: str = "") -> MagicMock:
+        def run(cmd: list[str], **_: object) -> subprocess.CompletedProcess:
+            self.assertEqual(cmd[:-1], ["buildozer", "-k", "-f"])
+            self.commands_files.append(Path(cmd[-1]).read_text(encoding="utf-8"))
+            return subprocess.CompletedProcess(args=cmd, returncode=returncode, stdout=stdout, stderr=stderr)
+
+        return MagicMock(side_effect=run)
+
+    def test_flush_without_commands_does_nothing(self) -> None:
+        unit = BuildozerExecutor(binary="buildozer", buildozer_args=[], workspace=self.workspace, dry=False)
+        with patch("subprocess.run") as run_mock:
+            unit.flush()
+        run_mock.assert_not_called()
+
+    def test_execute_queues_commands_until_flush(self) -> None:
+        unit = BuildozerExecutor(binary="buildozer", buildozer_args=[], workspace=self.workspace, dry=False)
+        run_mock = self.make_process(
+            returncode=0,
+            stdout="//foo:bar [//:a] (missing)\n//foo:bar [//:c] (missing)\n//foo:baz [] (missing)\n//foo:baz [//:b] (missing)\n",
+            stderr="fixed foo/BUILD.bazel\n",
+        )
+
+        with patch("subprocess.run", run_mock):
+            unit.execute(task="remove deps //:a", target="//foo:bar")
+            unit.execute(task="add deps //:b", target="//foo:baz")
+            unit.execute(task="add deps //:c", target="//foo:bar")
+            run_mock.assert_not_called()
+            unit.flush()
+
+        self.assertEqual(
+            self.commands_files,
+            [f"{PRINT}|remove deps //:a|add deps //:c|{PRINT}|//foo:bar\n{PRINT}|add deps //:b|{PRINT}|//foo:baz\n"],
+        )
+        self.assertEqual(
+            unit.summary.successful_fixes,
+            [
+                ["buildozer", "remove deps //:a", "//foo:bar"],
+                ["buildozer", "add deps //:c", "//foo:bar"],
+                ["buildozer", "add deps //:b", "//foo:baz"],
+            ],
+        )
+
+    def test_flush_attributes_results_to_targets(self) -> None:
+        unit = BuildozerExecutor(binary="buildozer", buildozer_args=[], workspace=self.workspace, dry=False)
+        stdout = (
+            "//foo:changed [] (missing)\n"
+            "//foo:changed [//:a] (missing)\n"
+            "//baz:unchanged [//:y] (missing)\n"
+            "//baz:unchanged [//:y] (missing)\n"
+        )
+        stderr = (
+            "fixed foo/BUILD.bazel\n"
+            "error while executing commands [print label deps implementation_deps] on target //bar:fail: "
+            "rule 'fail' not found\n"
+        )
+        run_mock = self.make_process(returncode=2, stdout=stdout, stderr=stderr)
+
+        with patch("subprocess.run", run_mock):
+            unit.execute(task="add deps //:a", target="//foo:changed")
+            unit.execute(task="add deps //:x", target="//bar:fail")
+            unit.execute(task="add deps //:y", target="//baz:unchanged")
+            unit.flush()
+
+        self.assertEqual(len(self.commands_files), 1)
+        self.assertEqual(unit.summary.successful_fixes, [["buildozer", "add deps //:a", "//foo:changed"]])
+        self.assertEqual(unit.summary.failed_fixes, [["buildozer", "add deps //:x", "//bar:fail"]])
+        self.assertEqual(unit.summary.fixes_without_effect, [["buildozer", "add deps //:y", "//baz:unchanged"]])
+
+    def test_flush_distinguishes_targets_of_the_same_build_file(self) -> None:
+        unit = BuildozerExecutor(binary="buildozer", buildozer_args=[], workspace=self.workspace, dry=False)
+        stdout = "//foo:a [] (missing)\n//foo:a [] [//:a]\n//foo [//:b] (missing)\n//foo [//:b] (missing)\n"
+        run_mock = self.make_process(returncode=0, stdout=stdout, stderr="fixed foo/BUILD.bazel\n")
+
+        with patch("subprocess.run", run_mock):
+            unit.execute(task="add implementation_deps //:a", target="//foo:a")
+            unit.execute(task="add deps //:b", target="//foo:foo")
+            unit.flush()
+
+        self.assertEqual(unit.summary.successful_fixes, [["buildozer", "add implementation_deps //:a", "//foo:a"]])
+        self.assertEqual(unit.summary.fixes_without_effect, [["buildozer", "add deps //:b", "//foo:foo"]])
+
+    def test_flush_compares_values_spanning_multiple_lines(self) -> None:
+        unit = BuildozerExecutor(binary="buildozer", buildozer_args=[], workspace=self.workspace, dry=True)
+        stdout = (
+            'cc_library(\n    name = "a",\n)\n'
+            '//foo:a [//:x] + select({\n    "//conditions:default": [//:y],\n}) (missing)\n'
+            '//foo:a [//:x] + select({\n    "//conditions:default": [],\n}) (missing)\n'
+        )
+        run_mock = MagicMock(return_value=subprocess.CompletedProcess(args=[], returncode=0, stdout=stdout, stderr=""))
+
+        with patch("subprocess.run", run_mock):
+            unit.execute(task="remove deps //:y", target="//foo:a")
+            unit.flush()
+
+        self.assertEqual(unit.summary.successful_fixes, [["buildozer", "-stdout", "remove deps //:y", "//foo:a"]])
+
+    def test_flush_attributes_result_of_target_to_all_its_commands(self) -> None:
+        unit = BuildozerExecutor(binary="buildozer", buildozer_args=[], workspace=self.workspace, dry=False)
+        run_mock = self.make_process(
+            returncode=2,
+            stdout="//foo:a [//:b] (missing)\n//foo:a [//:a //:b] (missing)\n",
+            stderr="error while executing commands [remove deps //:c] on target //foo:a: no such dep\n",
+        )
+
+        with patch("subprocess.run", run_mock):
+            unit.execute(task="add deps //:a", target="//foo:a")
+            unit.execute(task="remove deps //:c", target="//foo:a")
+            unit.flush()
+
+        self.assertEqual(
+            unit.summary.failed_fixes,
+            [["buildozer", "add deps //:a", "//foo:a"], ["buildozer", "remove deps //:c", "//foo:a"]],
+        )
+
+    def test_flush_reports_targets_of_each_executed_partition(self) -> None:
+        unit = BuildozerExecutor(binary="buildozer", buildozer_args=[], workspace=self.workspace, dry=False)
+        run_mock = self.make_process(returncode=3)
+        flushed_targets = []
+
+        with patch("subprocess.run", run_mock):
+            unit.execute(task="add deps //:a", target="//foo:a")
+            unit.execute(task="add deps //:b", target="//foo:b")
+            unit.execute(task="remove deps //:c", target="//foo:b")
+            unit.execute(task="add deps //:d", target="//bar:d")
+            unit.flush(on_targets_flushed=flushed_targets.append)
+
+        self.assertEqual(flushed_targets, [{"//bar:d": [3], "//foo:a": [3], "//foo:b": [3, 3]}])
+
+    def test_flush_attributes_unknown_errors_to_targets_without_output(self) -> None:
+        unit = BuildozerExecutor(binary="buildozer", buildozer_args=[], workspace=self.workspace, dry=False)
+        run_mock = self.make_process(
+            returncode=2,
+            stdout="//:changed [] (missing)\n//:changed [//:a] (missing)\n",
+            stderr="fixed BUILD\nsome/BUILD: file not found or not readable\n",
+        )
+
+        with patch("subprocess.run", run_mock):
+            unit.execute(task="add deps //:a", target="//:changed")
+            unit.execute(task="add deps //:b", target="//some:fail")
+            unit.flush()
+
+        self.assertEqual(unit.summary.successful_fixes, [["buildozer", "add deps //:a", "//:changed"]])
+        self.assertEqual(unit.summary.failed_fixes, [["buildozer", "add deps //:b", "//some:fail"]])
+
+    def test_flush_distributes_packages_over_parallel_processes(self) -> None:
+        unit = BuildozerExecutor(binary="buildozer", buildozer_args=[], workspace=self.workspace, dry=False, jobs=2)
+        commands_files = []
+
+        def run(cmd: list[str], **_: object) -> subprocess.CompletedProcess:
+            commands_files.append(Path(cmd[-1]).read_text(encoding="utf-8"))
+            return subprocess.CompletedProcess(args=cmd, returncode=3, stdout="", stderr="")
+
+        with patch("subprocess.run", MagicMock(side_effect=run)):
+            unit.execute(task="add deps //:a", target="//foo:a")
+            unit.execute(task="add deps //:b", target="//bar:b")
+            unit.execute(task="add deps //:c", target="//foo:c")
+            unit.execute(task="add deps //:d", target="//baz:d")
+            unit.flush()
+
+        self.assertCountEqual(
+            commands_files,
+            [
+                (
+                    f"{PRINT}|add deps //:b|{PRINT}|//bar:b\n"
+                    f"{PRINT}|add deps //:a|{PRINT}|//foo:a\n"
+                    f"{PRINT}|add deps //:c|{PRINT}|//foo:c\n"
+                ),
+                f"{PRINT}|add deps //:d|{PRINT}|//baz:d\n",
+            ],
+        )
+        self.assertEqual(
+            unit.summary.fixes_without_effect,
+            [
+                ["buildozer", "add deps //:b", "//bar:b"],
+                ["buildozer", "add deps //:d", "//baz:d"],
+                ["buildozer", "add deps //:a", "//foo:a"],
+                ["buildozer", "add deps //:c", "//foo:c"],
+            ],
+        )
+
+    def test_resolve_build_file_via_symlinked_workspace(self) -> None:
+        link = self.workspace / "link"
+        link.symlink_to(self.workspace / "foo", target_is_directory=True)
+        unit = BuildozerExecutor(binary="buildozer", buildozer_args=[], workspace=link / "..", dry=False)
+
+        self.assertEqual(
+            unit._resolve_build_file("//bar:a"),  # noqa: SLF001
+            (self.workspace / "bar" / "BUILD").resolve(),
+        )
+
+    def test_resolve_build_file(self) -> None:
+        unit = BuildozerExecutor(binary="buildozer", buildozer_args=[], workspace=self.workspace, dry=False)
+        (self.workspace / "foo" / "BUILD").touch()
+
+        workspace = self.workspace.resolve()
+        self.assertEqual(unit._resolve_build_file("//:a"), workspace / "BUILD")  # noqa: SLF001
+        self.assertEqual(unit._resolve_build_file("//foo:a"), workspace / "foo" / "BUILD.bazel")  # noqa: SLF001
+        self.assertEqual(unit._resolve_build_file("//bar:a"), workspace / "bar" / "BUILD")  # noqa: SLF001
+        self.assertEqual(unit._resolve_build_file("//missing:a"), workspace / "missing" / "BUILD")  # noqa: SLF001
+
+    def test_flush_raises_on_unexpected_return_code(self) -> None:
+        unit = BuildozerExecutor(binary="buildozer", buildozer_args=[], workspace=self.workspace, dry=False)
+        run_mock = self.make_process(returncode=1, stderr="usage")
+
+        with patch("subprocess.run", run_mock):
+            unit.execute(task="add deps //:a", target="//foo:bar")
+            with self.assertRaises(RuntimeError):
+                unit.flush()
+
+
 if __name__ == "__main__":
     unittest.main()
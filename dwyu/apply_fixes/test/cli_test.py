@@ -37,6 +37,35 @@ class TestCli(unittest.TestCase):
 
         self.assertTrue(args.fix_missing_deps)
 
+    @patch("sys.argv", ["prog", "--fix-all", "--dwyu-targets=//..."])
+    def test_dwyu_targets_require_dwyu_aspect(self) -> None:
+        with self.assertLogs(level="FATAL") as captured_logs, self.assertRaises(SystemExit) as exit_ctx:
+            cli()
+
+        self.assertEqual(exit_ctx.exception.code, 1)
+        self.assertEqual(
+            captured_logs.output,
+            ["CRITICAL:root:Options '--dwyu-targets' and '--dwyu-aspect' have to be used together"],
+        )
+
+    @patch("sys.argv", ["prog", "--fix-all", "--dwyu-targets=//...", "--dwyu-aspect=//:aspect.bzl%dwyu"])
+    def test_dwyu_targets_with_dwyu_aspect_are_accepted(self) -> None:
+        args = cli()
+
+        self.assertEqual(args.dwyu_targets, "//...")
+        self.assertEqual(args.dwyu_aspect, "//:aspect.bzl%dwyu")
+
+    @patch("sys.argv", ["prog", "--fix-all", "--graph-snapshot=snapshot.json", "--use-cquery"])
+    def test_graph_snapshot_cannot_be_combined_with_cquery(self) -> None:
+        with self.assertLogs(level="FATAL") as captured_logs, self.assertRaises(SystemExit) as exit_ctx:
+            cli()
+
+        self.assertEqual(exit_ctx.exception.code, 1)
+        self.assertEqual(
+            captured_logs.output,
+            ["CRITICAL:root:Option '--graph-snapshot' cannot be combined with '--use-cquery'"],
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,11 +1,24 @@
 import argparse
 import unittest
+from io import StringIO
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from unittest.mock import MagicMock, patch
 
 from python.runfiles import Runfiles
 
-from dwyu.apply_fixes.get_dwyu_reports import gather_reports, get_reports_search_dir, parse_dwyu_execution_log
+from dwyu.apply_fixes.get_dwyu_reports import (
+    gather_processed_dep_files,
+    gather_reports,
+    gather_reports_from_log_stream,
+    get_report_configuration,
+    get_reports_search_dir,
+    locate_in_search_path,
+    parse_dwyu_execution_log,
+    query_reports,
+    read_manifests,
+    search_reports,
+)
 
 
 class TestGatherReports(unittest.TestCase):
@@ -54,6 +67,117 @@ class TestGatherReports(unittest.TestCase):
             gather_reports(args, search_path=Path("/search"))
 
 
+class TestSearchReports(unittest.TestCase):
+    def test_skip_directories_which_cannot_contain_reports(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            search_path = Path(tmp_dir)
+            for file in [
+                "foo_dwyu_report.json",
+                "foo.h",
+                "sub/sub/bar_dwyu_report.json",
+                "external/repo/baz_dwyu_report.json",
+                "_objs/foo/ignored_dwyu_report.json",
+                "_virtual_includes/foo/ignored_dwyu_report.json",
+                "_solib_k8/ignored_dwyu_report.json",
+                "tool.runfiles/_main/ignored_dwyu_report.json",
+            ]:
+                (search_path / file).parent.mkdir(parents=True, exist_ok=True)
+                (search_path / file).write_text("{}")
+
+            reports = search_reports(search_path, threads=2)
+
+            self.assertEqual(
+                sorted(reports),
+                [
+                    search_path / "external/repo/baz_dwyu_report.json",
+                    search_path / "foo_dwyu_report.json",
+                    search_path / "sub/sub/bar_dwyu_report.json",
+                ],
+            )
+
+    def test_search_path_does_not_exist(self) -> None:
+        self.assertEqual(list(search_reports(Path("/no/such/directory"))), [])
+
+
+class TestGatherReportsFromLogStream(unittest.TestCase):
+    def test_provide_reports_while_reading_log(self) -> None:
+        log = StringIO(
+            """
+Some unrelated stuff
+DWYU Report: bazel-out/opt/bin/some/target_dwyu_report.json
+DWYU Report: no_bin_separator_dwyu_report.json
+""".lstrip()
+        )
+
+        reports = gather_reports_from_log_stream(log=log, search_path=Path("/search"))
+
+        self.assertEqual(next(reports), Path("/search/some/target_dwyu_report.json"))
+        with self.assertRaisesRegex(RuntimeError, "Unexpected report path format"):
+            next(reports)
+
+
+class TestLocateInSearchPath(unittest.TestCase):
+    def test_locate_in_custom_search_path(self) -> None:
+        self.assertEqual(
+            locate_in_search_path(report="bazel-out/opt/bin/foo/a_dwyu_report.json", search_path=Path("/search")),
+            Path("/search/foo/a_dwyu_report.json"),
+        )
+
+    def test_locate_in_output_directory_of_report_configuration(self) -> None:
+        self.assertEqual(
+            locate_in_search_path(
+                report="bazel-out/k8-opt/bin/foo/a_dwyu_report.json",
+                search_path=Path("/execroot/_main/bazel-out/k8-fastbuild/bin"),
+            ),
+            Path("/execroot/_main/bazel-out/k8-opt/bin/foo/a_dwyu_report.json"),
+        )
+
+
+class TestGetReportConfiguration(unittest.TestCase):
+    def test_configuration_from_output_directory(self) -> None:
+        self.assertEqual(
+            get_report_configuration(Path("/execroot/_main/bazel-out/k8-opt-ST-1a2b/bin/foo/bin/a_dwyu_report.json")),
+            "k8-opt-ST-1a2b",
+        )
+
+    def test_unknown_configuration(self) -> None:
+        self.assertIsNone(get_report_configuration(Path("/search/foo/a_dwyu_report.json")))
+
+
+class TestGatherProcessedDepFiles(unittest.TestCase):
+    def test_gather_processed_dep_files_next_to_reports(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            search_path = Path(tmp_dir)
+            (search_path / "sub").mkdir()
+            for file in [
+                "foo_dwyu_report.json",
+                "foo_processed_dep_1a.json",
+                "foo_processed_dep_2b.json",
+                "foo_processed_target_under_inspection.json",
+                "foo_bar_processed_dep_3c.json",
+                "sub/baz_dwyu_report.json",
+                "sub/baz_processed_dep_4d.json",
+                "sub/unrelated_processed_dep_5e.json",
+            ]:
+                (search_path / file).write_text("{}")
+
+            processed_dep_files = gather_processed_dep_files(
+                {
+                    search_path / "foo_dwyu_report.json": "//:foo",
+                    search_path / "sub" / "baz_dwyu_report.json": "//:sub/baz",
+                }
+            )
+
+        self.assertEqual(
+            sorted(processed_dep_files),
+            [
+                ("//:foo", search_path / "foo_processed_dep_1a.json"),
+                ("//:foo", search_path / "foo_processed_dep_2b.json"),
+                ("//:sub/baz", search_path / "sub" / "baz_processed_dep_4d.json"),
+            ],
+        )
+
+
 class TestParseDwyuExecutionLog(unittest.TestCase):
     def test_parse_dwyu_execution_log(self) -> None:
         test_log = Path("test_log.txt")
@@ -79,6 +203,71 @@ DWYU Report: bazel-out/opt/bin/root_target_dwyu_report.json
         self.assertEqual(logs, [])
 
 
+class TestReadManifests(unittest.TestCase):
+    def test_read_reports_from_manifests(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            manifest_a = Path(tmp_dir) / "a_dwyu_manifest.jsonl"
+            manifest_a.write_text(
+                '{"report": "bazel-out/opt/bin/foo/a_dwyu_report.json", "analyzed_target": "//foo:a"}\n'
+                '{"report": "bazel-out/opt/bin/foo/b_dwyu_report.json", "analyzed_target": "//foo:b"}\n'
+            )
+            manifest_b = Path(tmp_dir) / "b_dwyu_manifest.jsonl"
+            manifest_b.write_text(
+                '{"report": "bazel-out/opt/bin/foo/b_dwyu_report.json", "analyzed_target": "//foo:b"}\n'
+            )
+
+            reports = read_manifests(manifests=[manifest_a, manifest_b], search_path=Path("/search"))
+
+        self.assertEqual(
+            reports,
+            {
+                Path("/search/foo/a_dwyu_report.json"): {"analyzed_target": "//foo:a"},
+                Path("/search/foo/b_dwyu_report.json"): {"analyzed_target": "//foo:b"},
+            },
+        )
+
+    def test_manifest_does_not_exist(self) -> None:
+        with self.assertRaisesRegex(FileNotFoundError, "no_such_manifest.jsonl"):
+            read_manifests(manifests=[Path("no_such_manifest.jsonl")], search_path=Path("/search"))
+
+
+class TestQueryReports(unittest.TestCase):
+    @patch("dwyu.apply_fixes.get_dwyu_reports.execute_and_capture")
+    def test_query_reports_of_targets(self, mock_execute: MagicMock) -> None:
+        mock_execute.return_value.stdout = """
+bazel-out/opt/bin/foo/foo_dwyu_report.json
+bazel-out/opt/bin/foo/bar/bar_dwyu_report.json
+bazel-out/opt/bin/foo/unrelated.txt
+"""
+        args = argparse.Namespace(
+            bazel_startup_args="--startup",
+            bazel_args="--config=foo",
+            dwyu_aspect="//:aspect.bzl%dwyu",
+            dwyu_targets="//foo/... -//foo:ignored",
+        )
+
+        reports = query_reports(args, workspace_root=Path("/workspace"), search_path=Path("/search"))
+
+        self.assertEqual(
+            reports, [Path("/search/foo/foo_dwyu_report.json"), Path("/search/foo/bar/bar_dwyu_report.json")]
+        )
+        mock_execute.assert_called_once_with(
+            cmd=[
+                "bazel",
+                "--startup",
+                "cquery",
+                "--config=foo",
+                "--aspects=//:aspect.bzl%dwyu",
+                "--output_groups=dwyu",
+                "--output=files",
+                "--",
+                "//foo/...",
+                "-//foo:ignored",
+            ],
+            cwd=Path("/workspace"),
+        )
+
+
 class TestGetReportsSearchDir(unittest.TestCase):
     def test_search_path_from_args(self) -> None:
         runfiles = Runfiles.Create()
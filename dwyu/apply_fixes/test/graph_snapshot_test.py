@@ -0,0 +1,100 @@
+import json
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from dwyu.apply_fixes.graph_snapshot import build_graph_snapshot, load_graph_snapshot
+from dwyu.apply_fixes.search_missing_deps import Dependency, VirtualIncludes
+from dwyu.apply_fixes.visibility import PackageGroup
+
+QUERY_DUMP = [
+    {
+        "type": "RULE",
+        "rule": {
+            "name": "//:target",
+            "ruleClass": "cc_library",
+            "attribute": [],
+            "ruleInput": ["//:target.cpp", "//:alias"],
+        },
+    },
+    {"type": "RULE", "rule": {"name": "//:alias", "ruleClass": "alias", "ruleInput": ["//:direct"]}},
+    {
+        "type": "RULE",
+        "rule": {
+            "name": "//:direct",
+            "ruleClass": "cc_library",
+            "attribute": [{"name": "hdrs", "stringListValue": ["//:direct.h"], "explicitlySpecified": True}],
+            "ruleInput": ["//:direct.h", "//lib:transitive"],
+        },
+    },
+    {
+        "type": "RULE",
+        "rule": {
+            "name": "//lib:transitive",
+            "ruleClass": "cc_library",
+            "attribute": [
+                {"name": "hdrs", "stringListValue": ["//lib:transitive.h"], "explicitlySpecified": True},
+                {"name": "visibility", "stringListValue": ["//groups:a"], "explicitlySpecified": True},
+                {"name": "include_prefix", "stringValue": "prefix", "explicitlySpecified": True},
+                {"name": "name", "stringValue": "transitive", "explicitlySpecified": True},
+            ],
+        },
+    },
+    {"type": "SOURCE_FILE", "sourceFile": {"name": "//:direct.h"}},
+    {"type": "PACKAGE_GROUP", "packageGroup": {"name": "//groups:a", "containedPackage": ["//foo/..."]}},
+]
+
+
+class TestGraphSnapshot(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = Path(tmp_dir.name)
+        self.dump = self.tmp_dir / "dump.jsonl"
+        self.dump.write_text("".join(json.dumps(target) + "\n" for target in QUERY_DUMP))
+        self.snapshot = self.tmp_dir / "snapshot" / "graph.json"
+
+    def test_build_and_load_snapshot(self) -> None:
+        amount_rules = build_graph_snapshot(dump=self.dump, snapshot=self.snapshot)
+        graph, package_groups = load_graph_snapshot(self.snapshot)
+
+        self.assertEqual(amount_rules, 4)
+        self.assertEqual(
+            graph.get_dependencies("@@//:target"),
+            [
+                Dependency(target="//:direct", headers=["direct.h"]),
+                Dependency(
+                    target="//lib:transitive",
+                    headers=["lib/transitive.h"],
+                    visibility=["//groups:a"],
+                    virtual_includes=VirtualIncludes(
+                        header_labels=["//lib:transitive.h"],
+                        target_name="transitive",
+                        added_prefix="prefix",
+                        stripped_prefix="",
+                    ),
+                ),
+            ],
+        )
+        self.assertEqual(graph.get_dependencies("//:alias")[0].visibility, ["//groups:a"])
+        self.assertEqual(
+            graph.get_dependencies("//:alias")[0].get_virtual_headers(),
+            ["lib/_virtual_includes/transitive/prefix/transitive.h", "_virtual_includes/fe8847ef/prefix/transitive.h"],
+        )
+        self.assertIsNone(graph.get_dependencies("//:unknown"))
+        self.assertEqual(package_groups, {"//groups:a": PackageGroup(packages=["//foo/..."])})
+
+    def test_load_missing_snapshot(self) -> None:
+        with self.assertRaisesRegex(FileNotFoundError, "does not exist"):
+            load_graph_snapshot(self.snapshot)
+
+    def test_load_snapshot_with_unsupported_version(self) -> None:
+        self.snapshot.parent.mkdir()
+        self.snapshot.write_text(json.dumps({"version": 0}))
+
+        with self.assertRaisesRegex(RuntimeError, "unsupported format version"):
+            load_graph_snapshot(self.snapshot)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import json
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from dwyu.apply_fixes.journal import ReportJournal, compute_report_digest
+
+REPORT = Path("/bin/foo_dwyu_report.json")
+CONTENT = {"analyzed_target": "//foo:foo", "unused_deps": ["//bar:bar"]}
+FIX_KINDS = ["fix_unused"]
+
+
+class TestComputeReportDigest(unittest.TestCase):
+    def test_digest_is_independent_of_key_order(self) -> None:
+        self.assertEqual(
+            compute_report_digest({"a": 1, "b": [2]}, FIX_KINDS),
+            compute_report_digest({"b": [2], "a": 1}, FIX_KINDS),
+        )
+
+    def test_digest_changes_with_content(self) -> None:
+        self.assertNotEqual(compute_report_digest({"a": [1]}, FIX_KINDS), compute_report_digest({"a": [2]}, FIX_KINDS))
+
+    def test_digest_changes_with_fix_kinds(self) -> None:
+        self.assertNotEqual(
+            compute_report_digest({"a": [1]}, ["fix_unused"]),
+            compute_report_digest({"a": [1]}, ["fix_missing", "fix_unused"]),
+        )
+
+    def test_digest_is_independent_of_fix_kinds_order(self) -> None:
+        self.assertEqual(
+            compute_report_digest({"a": [1]}, ["fix_unused", "fix_missing"]),
+            compute_report_digest({"a": [1]}, ["fix_missing", "fix_unused"]),
+        )
+
+
+class TestReportJournal(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.journal_file = Path(tmp_dir.name) / "sub" / "journal.jsonl"
+
+    def test_nothing_processed_without_journal_file(self) -> None:
+        journal = ReportJournal(self.journal_file, FIX_KINDS)
+
+        self.assertFalse(journal.is_processed(report=REPORT, content=CONTENT))
+
+    def test_recorded_reports_are_processed_in_later_executions(self) -> None:
+        ReportJournal(self.journal_file, FIX_KINDS).record([(REPORT, CONTENT, 2)])
+
+        journal = ReportJournal(self.journal_file, FIX_KINDS)
+
+        self.assertTrue(journal.is_processed(report=REPORT, content=CONTENT))
+        self.assertFalse(journal.is_processed(report=Path("/bin/other_dwyu_report.json"), content=CONTENT))
+        self.assertEqual(
+            json.loads(self.journal_file.read_text()),
+            {
+                "report": str(REPORT),
+                "fix_kinds": FIX_KINDS,
+                "sha256": compute_report_digest(CONTENT, FIX_KINDS),
+                "target": "//foo:foo",
+                "fixes": 2,
+            },
+        )
+
+    def test_changed_report_is_not_processed(self) -> None:
+        ReportJournal(self.journal_file, FIX_KINDS).record([(REPORT, CONTENT, 1)])
+
+        journal = ReportJournal(self.journal_file, FIX_KINDS)
+
+        self.assertFalse(journal.is_processed(report=REPORT, content={**CONTENT, "unused_deps": []}))
+
+    def test_report_is_processed_again_with_other_fix_kinds(self) -> None:
+        ReportJournal(self.journal_file, ["fix_unused"]).record([(REPORT, CONTENT, 1)])
+
+        self.assertFalse(
+            ReportJournal(self.journal_file, ["fix_missing", "fix_unused"]).is_processed(report=REPORT, content=CONTENT)
+        )
+        self.assertFalse(ReportJournal(self.journal_file, ["fix_private"]).is_processed(report=REPORT, content=CONTENT))
+        self.assertTrue(ReportJournal(self.journal_file, ["fix_unused"]).is_processed(report=REPORT, content=CONTENT))
+
+    def test_entries_for_different_fix_kinds_coexist(self) -> None:
+        ReportJournal(self.journal_file, ["fix_unused"]).record([(REPORT, CONTENT, 1)])
+        ReportJournal(self.journal_file, ["fix_missing"]).record([(REPORT, CONTENT, 0)])
+
+        self.assertTrue(ReportJournal(self.journal_file, ["fix_unused"]).is_processed(report=REPORT, content=CONTENT))
+        self.assertTrue(ReportJournal(self.journal_file, ["fix_missing"]).is_processed(report=REPORT, content=CONTENT))
+
+    def test_ignore_entries_without_fix_kinds(self) -> None:
+        self.journal_file.parent.mkdir(parents=True)
+        digest = compute_report_digest(CONTENT, FIX_KINDS)
+        self.journal_file.write_text(json.dumps({"report": str(REPORT), "sha256": digest, "fixes": 1}) + "\n")
+
+        self.assertFalse(ReportJournal(self.journal_file, FIX_KINDS).is_processed(report=REPORT, content=CONTENT))
+
+    def test_latest_entry_of_report_wins(self) -> None:
+        changed_content = {**CONTENT, "unused_deps": []}
+        ReportJournal(self.journal_file, FIX_KINDS).record([(REPORT, CONTENT, 1)])
+        ReportJournal(self.journal_file, FIX_KINDS).record([(REPORT, changed_content, 0)])
+
+        journal = ReportJournal(self.journal_file, FIX_KINDS)
+
+        self.assertFalse(journal.is_processed(report=REPORT, content=CONTENT))
+        self.assertTrue(journal.is_processed(report=REPORT, content=changed_content))
+
+    def test_ignore_incomplete_entry_of_aborted_execution(self) -> None:
+        other_report = Path("/bin/other_dwyu_report.json")
+        ReportJournal(self.journal_file, FIX_KINDS).record([(REPORT, CONTENT, 1)])
+        with self.journal_file.open("a") as journal_file:
+            journal_file.write('{"report": "/bin/other_dwy')
+
+        ReportJournal(self.journal_file, FIX_KINDS).record([(other_report, CONTENT, 1)])
+        journal = ReportJournal(self.journal_file, FIX_KINDS)
+
+        self.assertTrue(journal.is_processed(report=REPORT, content=CONTENT))
+        self.assertTrue(journal.is_processed(report=other_report, content=CONTENT))
+        self.assertEqual(len(self.journal_file.read_text().splitlines()), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
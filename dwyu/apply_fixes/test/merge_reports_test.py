@@ -0,0 +1,105 @@
+import unittest
+from pathlib import Path
+
+from dwyu.apply_fixes.merge_reports import (
+    MERGE_INTERSECTION,
+    MERGE_UNION,
+    merge_findings,
+    merge_include_findings,
+    merge_reports_per_target,
+)
+
+
+def make_report(target: str, **findings: list | dict) -> dict:
+    report = {
+        "analyzed_target": target,
+        "public_includes_without_dep": {},
+        "private_includes_without_dep": {},
+        "unused_deps": [],
+        "unused_implementation_deps": [],
+        "deps_which_should_be_private": [],
+        "use_implementation_deps": False,
+    }
+    report.update(findings)
+    report["is_ok"] = not any(findings.values())
+    return report
+
+
+class TestMergeFindings(unittest.TestCase):
+    def test_union(self) -> None:
+        self.assertEqual(merge_findings(findings=[["a", "b"], ["c", "a"]], strategy=MERGE_UNION), ["a", "b", "c"])
+
+    def test_intersection(self) -> None:
+        self.assertEqual(
+            merge_findings(findings=[["a", "b", "c"], ["c", "a"], ["a", "c", "d"]], strategy=MERGE_INTERSECTION),
+            ["a", "c"],
+        )
+
+
+class TestMergeIncludeFindings(unittest.TestCase):
+    def test_union_ignores_configuration_of_generated_files(self) -> None:
+        result = merge_include_findings(
+            findings=[
+                {"bazel-out/cfg_a/bin/foo/gen.cc": ["bazel-out/cfg_a/bin/bar/gen.h"], "foo/foo.cc": ["bar/bar.h"]},
+                {"bazel-out/cfg_b/bin/foo/gen.cc": ["bazel-out/cfg_b/bin/bar/gen.h"], "foo/foo.cc": ["baz/baz.h"]},
+            ],
+            strategy=MERGE_UNION,
+        )
+
+        self.assertEqual(
+            result,
+            {
+                "bazel-out/cfg_a/bin/foo/gen.cc": ["bazel-out/cfg_a/bin/bar/gen.h"],
+                "foo/foo.cc": ["bar/bar.h", "baz/baz.h"],
+            },
+        )
+
+    def test_intersection(self) -> None:
+        result = merge_include_findings(
+            findings=[
+                {"foo/foo.cc": ["bar/bar.h", "baz/baz.h"], "foo/foo.h": ["bar/bar.h"]},
+                {"foo/foo.cc": ["baz/baz.h"]},
+            ],
+            strategy=MERGE_INTERSECTION,
+        )
+
+        self.assertEqual(result, {"foo/foo.cc": ["baz/baz.h"]})
+
+
+class TestMergeReportsPerTarget(unittest.TestCase):
+    def test_keep_single_reports_unchanged(self) -> None:
+        reports = {
+            Path("foo"): make_report("//:foo", unused_deps=["//:bar"]),
+            Path("bar"): make_report("//:bar"),
+        }
+
+        self.assertEqual(merge_reports_per_target(reports=reports, strategy=MERGE_UNION), reports)
+
+    def test_union_of_reports_for_same_target(self) -> None:
+        reports = {
+            Path("cfg_a/foo"): {"analyzed_target": "//:foo", "is_ok": True},
+            Path("cfg_b/foo"): make_report("//:foo", unused_deps=["//:bar"], use_implementation_deps=True),
+            Path("cfg_c/foo"): make_report("//:foo", unused_deps=["//:baz", "//:bar"]),
+        }
+
+        result = merge_reports_per_target(reports=reports, strategy=MERGE_UNION)
+
+        self.assertEqual(list(result), [Path("cfg_a/foo")])
+        self.assertEqual(
+            result[Path("cfg_a/foo")],
+            make_report("//:foo", unused_deps=["//:bar", "//:baz"], use_implementation_deps=True),
+        )
+
+    def test_intersection_with_report_without_findings(self) -> None:
+        reports = {
+            Path("cfg_a/foo"): make_report("//:foo", unused_deps=["//:bar"]),
+            Path("cfg_b/foo"): {"analyzed_target": "//:foo", "is_ok": True},
+        }
+
+        result = merge_reports_per_target(reports=reports, strategy=MERGE_INTERSECTION)
+
+        self.assertEqual(result, {Path("cfg_a/foo"): make_report("//:foo")})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import os
+import time
+import unittest
+from pathlib import Path
+from subprocess import CompletedProcess
+from tempfile import TemporaryDirectory
+
+from dwyu.apply_fixes.query_cache import QueryCache, compute_workspace_fingerprint, read_bazelignore
+
+
+class TestComputeWorkspaceFingerprint(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.workspace = Path(tmp_dir.name)
+        (self.workspace / "foo").mkdir()
+        (self.workspace / "foo" / "BUILD").write_text("cc_library(name = 'foo')")
+        (self.workspace / "foo" / "foo.h").write_text("")
+
+    def test_fingerprint_is_stable(self) -> None:
+        self.assertEqual(compute_workspace_fingerprint(self.workspace), compute_workspace_fingerprint(self.workspace))
+
+    def test_fingerprint_changes_on_editing_build_files(self) -> None:
+        fingerprint = compute_workspace_fingerprint(self.workspace)
+        (self.workspace / "foo" / "BUILD").write_text("cc_library(name = 'foo', deps = [':bar'])")
+
+        self.assertNotEqual(compute_workspace_fingerprint(self.workspace), fingerprint)
+
+    def test_fingerprint_changes_on_adding_bzl_files(self) -> None:
+        fingerprint = compute_workspace_fingerprint(self.workspace)
+        (self.workspace / "foo" / "macro.bzl").write_text("")
+
+        self.assertNotEqual(compute_workspace_fingerprint(self.workspace), fingerprint)
+
+    def test_fingerprint_ignores_unrelated_files(self) -> None:
+        fingerprint = compute_workspace_fingerprint(self.workspace)
+        (self.workspace / "foo" / "foo.h").write_text("#include <vector>")
+        (self.workspace / "bazel-out").mkdir()
+        (self.workspace / "bazel-out" / "BUILD").write_text("")
+        (self.workspace / ".git").mkdir()
+        (self.workspace / ".git" / "BUILD").write_text("")
+
+        self.assertEqual(compute_workspace_fingerprint(self.workspace), fingerprint)
+
+    def test_fingerprint_ignores_directories_from_bazelignore(self) -> None:
+        (self.workspace / ".bazelignore").write_text("# Comment\nnode_modules\nthird_party/vendored/\n")
+        fingerprint = compute_workspace_fingerprint(self.workspace)
+        (self.workspace / "node_modules" / "pkg").mkdir(parents=True)
+        (self.workspace / "node_modules" / "pkg" / "BUILD").write_text("")
+        (self.workspace / "third_party" / "vendored").mkdir(parents=True)
+        (self.workspace / "third_party" / "vendored" / "BUILD").write_text("")
+
+        self.assertEqual(compute_workspace_fingerprint(self.workspace), fingerprint)
+
+    def test_fingerprint_changes_on_editing_bazelignore(self) -> None:
+        (self.workspace / "node_modules").mkdir()
+        (self.workspace / "node_modules" / "BUILD").write_text("")
+        fingerprint = compute_workspace_fingerprint(self.workspace)
+        (self.workspace / ".bazelignore").write_text("node_modules\n")
+
+        self.assertNotEqual(compute_workspace_fingerprint(self.workspace), fingerprint)
+
+
+class TestReadBazelignore(unittest.TestCase):
+    def test_no_bazelignore(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            self.assertEqual(read_bazelignore(Path(tmp_dir)), set())
+
+    def test_read_bazelignore(self) -> None:
+        with TemporaryDirectory() as tmp_dir:
+            workspace = Path(tmp_dir)
+            (workspace / ".bazelignore").write_text("# Comment\n\n  foo  \nbar/baz/\n")
+
+            self.assertEqual(read_bazelignore(workspace), {workspace / "foo", workspace / "bar" / "baz"})
+
+
+class TestQueryCache(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.workspace = Path(tmp_dir.name) / "workspace"
+        self.workspace.mkdir()
+        (self.workspace / "BUILD").write_text("")
+        self.cache_dir = Path(tmp_dir.name) / "cache"
+
+    def test_load_unknown_key(self) -> None:
+        unit = QueryCache(directory=self.cache_dir, workspace=self.workspace)
+        self.assertIsNone(unit.load(unit.make_key(["bazel", "query", "//foo"])))
+
+    def test_store_and_load(self) -> None:
+        unit = QueryCache(directory=self.cache_dir, workspace=self.workspace)
+        key = unit.make_key(["bazel", "query", "//foo"])
+        unit.store(key=key, process=CompletedProcess(args=["bazel"], returncode=0, stdout="//foo:foo\n", stderr="log"))
+
+        # A new instance ensures the data is loaded from disk
+        cached = QueryCache(directory=self.cache_dir, workspace=self.workspace).load(key)
+
+        self.assertEqual(cached.returncode, 0)
+        self.assertEqual(cached.stdout, "//foo:foo\n")
+        self.assertEqual(cached.stderr, "log")
+
+    def test_key_depends_on_command(self) -> None:
+        unit = QueryCache(directory=self.cache_dir, workspace=self.workspace)
+        self.assertNotEqual(unit.make_key(["bazel", "query", "//foo"]), unit.make_key(["bazel", "cquery", "//foo"]))
+
+    def test_key_depends_on_workspace(self) -> None:
+        key = QueryCache(directory=self.cache_dir, workspace=self.workspace).make_key(["bazel", "query", "//foo"])
+        (self.workspace / "BUILD").write_text("cc_library(name = 'foo')")
+
+        self.assertNotEqual(
+            QueryCache(directory=self.cache_dir, workspace=self.workspace).make_key(["bazel", "query", "//foo"]), key
+        )
+
+    def test_evict_outdated_entries(self) -> None:
+        self.cache_dir.mkdir()
+        old_entry = self.cache_dir / "old.json"
+        old_entry.write_text("{}")
+        outdated = time.time() - 100
+        os.utime(old_entry, (outdated, outdated))
+        new_entry = self.cache_dir / "new.json"
+        new_entry.write_text("{}")
+
+        QueryCache(directory=self.cache_dir, workspace=self.workspace, max_age_seconds=50)
+
+        self.assertFalse(old_entry.exists())
+        self.assertTrue(new_entry.exists())
+
+    def test_evict_least_recently_used_entries_exceeding_size(self) -> None:
+        self.cache_dir.mkdir()
+        for idx, name in enumerate(["a", "b", "c"]):
+            entry = self.cache_dir / f"{name}.json"
+            entry.write_text("x" * 10)
+            last_usage = time.time() - 10 + idx
+            os.utime(entry, (last_usage, last_usage))
+
+        QueryCache(directory=self.cache_dir, workspace=self.workspace, max_size_bytes=25)
+
+        self.assertEqual(sorted(p.name for p in self.cache_dir.iterdir()), ["b.json", "c.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
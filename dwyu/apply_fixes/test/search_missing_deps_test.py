@@ -1,14 +1,34 @@
+import json
 import unittest
-from subprocess import CompletedProcess
+from array import array
+from collections.abc import Iterator
+from contextlib import contextmanager
+from io import StringIO
+from pathlib import Path
 from unittest.mock import MagicMock, patch
 
+from python.runfiles import Runfiles
+
 from dwyu.apply_fixes.search_missing_deps import (
+    CompressedRows,
     Dependency,
+    DependencyGraph,
+    HeaderProviders,
+    InternTable,
+    ProcessedDepsIndex,
+    UnresolvedHeaders,
+    VirtualIncludes,
+    get_configured_rule_inputs,
     get_dependencies,
+    make_include_root_hash,
+    normalize_header,
+    query_configured_dependency_graph,
+    query_dependency_graph,
     search_missing_deps,
     target_to_path,
     virtualize_headers,
 )
+from dwyu.apply_fixes.visibility import VisibilityChecker
 
 
 def make_virtual_headers_query_result(target: str, hdrs: str, added_prefix: str = "", stripped_prefix: str = "") -> str:
@@ -33,6 +53,27 @@ def make_virtual_headers_query_result(target: str, hdrs: str, added_prefix: str
     return rule_part + attr_name + attr_hdrs + attr_add + attr_strip + "]}}"
 
 
+@contextmanager
+def query_output(stdout: str) -> Iterator[StringIO]:
+    yield StringIO(stdout)
+
+
+def all_candidates_visible(target: str, candidates: list[str]) -> list[str]:  # noqa: ARG001
+    return candidates
+
+
+def make_graph_node(target: str, rule_inputs: list[str], hdrs: list[str] | None = None) -> dict:
+    attributes = []
+    if hdrs is not None:
+        attributes.append(
+            {"name": "hdrs", "type": "LABEL_LIST", "stringListValue": hdrs, "explicitlySpecified": True},
+        )
+    return {
+        "type": "RULE",
+        "rule": {"name": target, "ruleClass": "cc_library", "attribute": attributes, "ruleInput": rule_inputs},
+    }
+
+
 class TestApplyFixesHelper(unittest.TestCase):
     def test_target_to_path(self) -> None:
         self.assertEqual(target_to_path("//:foo"), "foo")
@@ -45,11 +86,8 @@ class TestGetDependencies(unittest.TestCase):
         execute_query_mock.configure_mock(
             uses_cquery=False,
             **{
-                "execute.return_value": CompletedProcess(
-                    args=[],
-                    returncode=0,
-                    stderr="",
-                    stdout="",
+                "stream.return_value": query_output(
+                    "",
                 ),
             },
         )
@@ -57,16 +95,33 @@ class TestGetDependencies(unittest.TestCase):
 
         self.assertEqual(deps, [])
 
+    def test_query_only_required_data(self) -> None:
+        execute_query_mock = MagicMock()
+        execute_query_mock.configure_mock(
+            uses_cquery=True,
+            **{"stream.return_value": query_output("")},
+        )
+        get_dependencies(bazel_query=execute_query_mock, target="//:foo")
+
+        execute_query_mock.stream.assert_called_once_with(
+            query='kind("rule", deps(//:foo) except deps(//:foo, 1))',
+            args=[
+                "--output=jsonproto",
+                "--noimplicit_deps",
+                "--proto:output_rule_attrs=hdrs,include_prefix,name,strip_include_prefix,visibility",
+                "--noproto:default_values",
+                "--noproto:rule_inputs_and_outputs",
+            ],
+            use_query_file=False,
+        )
+
     def test_parse_query_output(self) -> None:
         execute_query_mock = MagicMock()
         execute_query_mock.configure_mock(
             uses_cquery=False,
             **{
-                "execute.return_value": CompletedProcess(
-                    args=[],
-                    returncode=0,
-                    stderr="",
-                    stdout="""
+                "stream.return_value": query_output(
+                    """
 {"type":"RULE","rule":{"name":"//foo:bar","ruleClass":"cc_library","attribute":[{"name":"unrelated"},{"name":"hdrs","type":"LABEL_LIST","stringListValue":["//foo:riff.h", "//foo:raff.h"],"explicitlySpecified":true,"nodep":false}]}}
 {"type":"RULE","rule":{"name":"//:foobar","ruleClass":"cc_library","attribute":[{"name":"unrelated"},{"name":"hdrs","type":"LABEL_LIST","stringListValue":["//:foobar.h"],"explicitlySpecified":true,"nodep":false}]}}
 {"type":"RULE","rule":{"name":"//:buzz","ruleClass":"unrelated_rule"}}
@@ -83,16 +138,31 @@ class TestGetDependencies(unittest.TestCase):
         self.assertEqual(deps[1].target, "//:foobar")
         self.assertEqual(deps[1].headers, ["foobar.h"])
 
+    def test_parse_explicit_visibility(self) -> None:
+        execute_query_mock = MagicMock()
+        execute_query_mock.configure_mock(
+            uses_cquery=False,
+            **{
+                "stream.return_value": query_output(
+                    """
+{"type":"RULE","rule":{"name":"//:explicit","ruleClass":"cc_library","attribute":[{"name":"hdrs","stringListValue":["//:a.h"],"explicitlySpecified":true},{"name":"visibility","stringListValue":["//visibility:public"],"explicitlySpecified":true}]}}
+{"type":"RULE","rule":{"name":"//:empty","ruleClass":"cc_library","attribute":[{"name":"hdrs","stringListValue":["//:b.h"],"explicitlySpecified":true},{"name":"visibility","explicitlySpecified":true}]}}
+{"type":"RULE","rule":{"name":"//:default","ruleClass":"cc_library","attribute":[{"name":"hdrs","stringListValue":["//:c.h"],"explicitlySpecified":true},{"name":"visibility","stringListValue":["//visibility:public"]}]}}
+""".strip(),
+                ),
+            },
+        )
+        deps = get_dependencies(bazel_query=execute_query_mock, target="")
+
+        self.assertEqual([dep.visibility for dep in deps], [["//visibility:public"], [], None])
+
     def test_parse_cquery_output(self) -> None:
         execute_query_mock = MagicMock()
         execute_query_mock.configure_mock(
             uses_cquery=True,
             **{
-                "execute.return_value": CompletedProcess(
-                    args=[],
-                    returncode=0,
-                    stderr="",
-                    stdout="""
+                "stream.return_value": query_output(
+                    """
 {
   "results": [
     {"target": {"type":"RULE","rule":{"name":"//foo:bar","ruleClass":"cc_library","attribute":[{"name":"unrelated"},{"name":"hdrs","type":"LABEL_LIST","stringListValue":["//foo:riff.h", "//foo:raff.h"],"explicitlySpecified":true,"nodep":false}]}}},
@@ -151,11 +221,8 @@ class TestGetDependencies(unittest.TestCase):
         execute_query_mock.configure_mock(
             uses_cquery=False,
             **{
-                "execute.return_value": CompletedProcess(
-                    args=[],
-                    returncode=0,
-                    stderr="",
-                    stdout=f"{strip_target}\n{adding_target}\n{adding_and_strip_target}",
+                "stream.return_value": query_output(
+                    f"{strip_target}\n{adding_target}\n{adding_and_strip_target}",
                 ),
             },
         )
@@ -163,28 +230,28 @@ class TestGetDependencies(unittest.TestCase):
 
         self.assertEqual(len(deps), 3)
         self.assertEqual(deps[0].target, "//:stripped_prefix")
+        self.assertEqual(deps[0].headers, ["foo/bar/stripped.h"])
         self.assertEqual(
-            deps[0].headers,
+            deps[0].get_virtual_headers(),
             [
-                "foo/bar/stripped.h",
                 "_virtual_includes/stripped_prefix/bar/stripped.h",
                 "_virtual_includes/fc3740cb/bar/stripped.h",
             ],
         )
         self.assertEqual(deps[1].target, "//foo:adding_prefix")
+        self.assertEqual(deps[1].headers, ["foo/adding.h"])
         self.assertEqual(
-            deps[1].headers,
+            deps[1].get_virtual_headers(),
             [
-                "foo/adding.h",
                 "foo/_virtual_includes/adding_prefix/bar/adding.h",
                 "_virtual_includes/44d7767/bar/adding.h",
             ],
         )
         self.assertEqual(deps[2].target, "//foo:adding_and_stripping_prefix")
+        self.assertEqual(deps[2].headers, ["foo/sub/adding_and_stripping.h"])
         self.assertEqual(
-            deps[2].headers,
+            deps[2].get_virtual_headers(),
             [
-                "foo/sub/adding_and_stripping.h",
                 "foo/_virtual_includes/adding_and_stripping_prefix/bar/adding_and_stripping.h",
                 "_virtual_includes/c98ec564/bar/adding_and_stripping.h",
             ],
@@ -202,17 +269,17 @@ class TestGetDependencies(unittest.TestCase):
         execute_query_mock.configure_mock(
             uses_cquery=False,
             **{
-                "execute.return_value": CompletedProcess(args=[], returncode=0, stderr="", stdout=arena_target),
+                "stream.return_value": query_output(arena_target),
             },
         )
         deps = get_dependencies(bazel_query=execute_query_mock, target="")
 
         self.assertEqual(len(deps), 1)
         self.assertEqual(deps[0].target, "@protobuf//src/google/protobuf:arena")
+        self.assertEqual(deps[0].headers, ["src/google/protobuf/arena.h"])
         self.assertEqual(
-            deps[0].headers,
+            deps[0].get_virtual_headers(),
             [
-                "src/google/protobuf/arena.h",
                 "src/google/protobuf/_virtual_includes/arena/google/protobuf/arena.h",
                 "_virtual_includes/ae60082e/google/protobuf/arena.h",
             ],
@@ -230,20 +297,555 @@ class TestGetDependencies(unittest.TestCase):
         execute_query_mock.configure_mock(
             uses_cquery=False,
             **{
-                "execute.return_value": CompletedProcess(args=[], returncode=0, stderr="", stdout=target),
+                "stream.return_value": query_output(target),
             },
         )
+        deps = get_dependencies(bazel_query=execute_query_mock, target="")
         with self.assertLogs() as cm:
-            deps = get_dependencies(bazel_query=execute_query_mock, target="")
+            virtual_headers = deps[0].get_virtual_headers()
 
         self.assertEqual(len(deps), 1)
         self.assertEqual(deps[0].target, "@repo//pkg:lib")
         self.assertEqual(deps[0].headers, ["pkg/foo.h"])
+        self.assertEqual(virtual_headers, [])
         self.assertTrue(
             any("Could not strip 'strip_include_prefix' value '/does/not/match'" in msg for msg in cm.output)
         )
 
 
+class TestHeaderIndex(unittest.TestCase):
+    def test_normalize_header(self) -> None:
+        self.assertEqual(normalize_header("foo/bar.h"), "foo/bar.h")
+        self.assertEqual(normalize_header("bazel-out/k8-fastbuild/bin/foo/bar.h"), "foo/bar.h")
+        self.assertEqual(normalize_header("external/some_repo/foo/bar.h"), "foo/bar.h")
+        self.assertEqual(
+            normalize_header("bazel-out/k8-fastbuild/bin/external/some_repo/foo/_virtual_includes/lib/bar.h"),
+            "foo/_virtual_includes/lib/bar.h",
+        )
+
+    def test_find_header_providers(self) -> None:
+        providers = HeaderProviders().find_providers(
+            target_deps=[
+                Dependency(target="//:lib_a", headers=["a.h", "shared.h", "_virtual_includes/lib_a/a.h"]),
+                Dependency(target="//:lib_b", headers=["b.h", "shared.h", "b.h"]),
+            ],
+            headers=["a.h", "shared.h", "_virtual_includes/lib_a/a.h", "b.h", "unknown.h"],
+            with_virtual_headers=False,
+        )
+
+        self.assertEqual(
+            providers,
+            {
+                "a.h": ["//:lib_a"],
+                "shared.h": ["//:lib_a", "//:lib_b"],
+                "_virtual_includes/lib_a/a.h": ["//:lib_a"],
+                "b.h": ["//:lib_b"],
+                "unknown.h": [],
+            },
+        )
+
+    def test_header_providers_are_restricted_to_given_deps(self) -> None:
+        unit = HeaderProviders()
+        lib_a = Dependency(target="//:lib_a", headers=["shared.h"])
+        lib_b = Dependency(target="//:lib_b", headers=["shared.h"])
+
+        self.assertEqual(
+            unit.find_providers(target_deps=[lib_a, lib_b], headers=["shared.h"], with_virtual_headers=False),
+            {"shared.h": ["//:lib_a", "//:lib_b"]},
+        )
+        self.assertEqual(
+            unit.find_providers(target_deps=[lib_b], headers=["shared.h"], with_virtual_headers=False),
+            {"shared.h": ["//:lib_b"]},
+        )
+
+    def test_index_headers_of_dependency_only_once(self) -> None:
+        unit = HeaderProviders()
+        dep = MagicMock(target="//:lib", headers=["foo.h"])
+        dep.get_virtual_headers.return_value = ["_virtual_includes/lib/foo.h"]
+
+        unit.find_providers(target_deps=[dep], headers=["foo.h"], with_virtual_headers=False)
+        unit.find_providers(target_deps=[dep], headers=["foo.h"], with_virtual_headers=True)
+        providers = unit.find_providers(
+            target_deps=[dep], headers=["_virtual_includes/lib/foo.h"], with_virtual_headers=True
+        )
+
+        self.assertEqual(providers, {"_virtual_includes/lib/foo.h": ["//:lib"]})
+        dep.get_virtual_headers.assert_called_once()
+
+    def test_missing_header_depends_on_closure(self) -> None:
+        unit = HeaderProviders()
+        lib_a = Dependency(target="//:lib_a", headers=["a.h"])
+        lib_b = Dependency(target="//:lib_b", headers=["b.h"])
+
+        self.assertEqual(
+            unit.find_providers(target_deps=[lib_a], headers=["b.h"], with_virtual_headers=False), {"b.h": []}
+        )
+        self.assertEqual(
+            unit.find_providers(target_deps=[lib_a, lib_b], headers=["b.h"], with_virtual_headers=False),
+            {"b.h": ["//:lib_b"]},
+        )
+
+
+class TestUnresolvedHeaders(unittest.TestCase):
+    def test_nothing_to_report(self) -> None:
+        with self.assertNoLogs():
+            UnresolvedHeaders().log_summary()
+
+    def test_report_each_header_once(self) -> None:
+        unit = UnresolvedHeaders()
+        unit.add_not_found(header="bazel-out/k8-fastbuild/bin/foo.h", target="//:b")
+        unit.add_not_found(header="foo.h", target="//:a")
+        unit.add_ambiguous(header="bar.h", target="//:c", candidates=["//:lib_b"])
+        unit.add_ambiguous(header="bar.h", target="//:d", candidates=["//:lib_a", "//:lib_b"])
+
+        with self.assertLogs() as cm:
+            unit.log_summary()
+
+        self.assertEqual(len(cm.output), 3)
+        self.assertTrue("header file 'bar.h' required by target '//:c'." in cm.output[0])
+        self.assertTrue("required as well by 1 further target(s)." in cm.output[0])
+        self.assertTrue("Discovered potential dependencies are: ['//:lib_a', '//:lib_b']" in cm.output[0])
+        self.assertTrue("header file 'foo.h' for target '//:a'." in cm.output[1])
+        self.assertTrue("required as well by 1 further target(s)." in cm.output[1])
+        self.assertTrue("'srcs' attribute instead of 'hdrs'" in cm.output[2])
+        self.assertTrue(all("\n" not in msg for msg in cm.output[:2]))
+
+    def test_targets_with_unresolved_headers(self) -> None:
+        unit = UnresolvedHeaders()
+        unit.add_not_found(header="foo.h", target="//:a")
+        unit.add_not_found(header="bar.h", target="//:a")
+        unit.add_ambiguous(header="baz.h", target="//:b", candidates=["//:lib_a", "//:lib_b"])
+
+        self.assertEqual(unit.targets, {"//:a", "//:b"})
+
+    def test_list_further_targets_only_in_verbose_mode(self) -> None:
+        unit = UnresolvedHeaders()
+        unit.add_not_found(header="foo.h", target="//:a")
+        unit.add_not_found(header="foo.h", target="//:b")
+        unit.add_not_found(header="foo.h", target="//:c")
+
+        with self.assertLogs(level="DEBUG") as cm:
+            unit.log_summary()
+
+        self.assertTrue("['//:b', '//:c']" not in cm.output[0])
+        self.assertEqual(cm.output[1], "DEBUG:root:Further targets requiring the header file 'foo.h': ['//:b', '//:c']")
+
+    def test_report_single_target_like_warning_per_target(self) -> None:
+        unit = UnresolvedHeaders()
+        unit.add_not_found(header="foo.h", target="@@//:a")
+
+        with self.assertLogs() as cm:
+            unit.log_summary()
+
+        self.assertEqual(
+            cm.output[0],
+            "WARNING:root:Could not find a dependency providing providing the header file 'foo.h' for target '@@//:a'.",
+        )
+
+
+class TestInternTable(unittest.TestCase):
+    def test_round_trip(self) -> None:
+        unit = InternTable()
+
+        foo_id = unit.intern("foo")
+        bar_id = unit.intern("bar")
+
+        self.assertEqual((foo_id, bar_id), (0, 1))
+        self.assertEqual(unit[foo_id], "foo")
+        self.assertEqual(unit[bar_id], "bar")
+        self.assertEqual(unit.get_id("bar"), bar_id)
+
+    def test_store_each_value_only_once(self) -> None:
+        unit = InternTable()
+
+        self.assertEqual(unit.intern("foo"), unit.intern("foo"))
+        self.assertEqual(len(unit), 1)
+
+    def test_unknown_value(self) -> None:
+        unit = InternTable()
+        unit.intern("foo")
+
+        self.assertIsNone(unit.get_id("bar"))
+
+
+class TestCompressedRows(unittest.TestCase):
+    def test_lookup_rows(self) -> None:
+        unit = CompressedRows(rows={0: array("I", [3, 1]), 2: array("I", []), 3: array("I", [7])}, amount_rows=5)
+
+        self.assertEqual(list(unit[0]), [3, 1])
+        self.assertEqual(list(unit[1]), [])
+        self.assertEqual(list(unit[2]), [])
+        self.assertEqual(list(unit[3]), [7])
+        self.assertEqual(list(unit[4]), [])
+
+    def test_no_rows(self) -> None:
+        unit = CompressedRows(rows={}, amount_rows=2)
+
+        self.assertEqual(list(unit[0]), [])
+        self.assertEqual(list(unit[1]), [])
+
+
+class TestDependencyGraph(unittest.TestCase):
+    def make_graph(self) -> DependencyGraph:
+        graph = DependencyGraph()
+        graph.add_target(make_graph_node("//:target", rule_inputs=["//:target.cpp", "//:direct"]))
+        graph.add_target(make_graph_node("//:direct", rule_inputs=["//:transitive", "//:other"], hdrs=["//:direct.h"]))
+        graph.add_target(make_graph_node("//:transitive", rule_inputs=["//:leaf"], hdrs=["//:transitive.h"]))
+        graph.add_target(make_graph_node("//:other", rule_inputs=["//:leaf"], hdrs=["//:other.h"]))
+        graph.add_target(make_graph_node("//:leaf", rule_inputs=[], hdrs=["//:leaf.h"]))
+        graph.add_target({"type": "RULE", "rule": {"name": "//:unrelated", "ruleClass": "unrelated_rule"}})
+        return graph
+
+    def test_unknown_target(self) -> None:
+        self.assertIsNone(self.make_graph().get_dependencies("//:unknown"))
+
+    def test_transitive_deps_exclude_direct_deps(self) -> None:
+        deps = self.make_graph().get_dependencies("//:target")
+
+        self.assertEqual(
+            deps,
+            [
+                Dependency(target="//:leaf", headers=["leaf.h"]),
+                Dependency(target="//:other", headers=["other.h"]),
+                Dependency(target="//:transitive", headers=["transitive.h"]),
+            ],
+        )
+
+    def test_target_in_canonical_form(self) -> None:
+        deps = self.make_graph().get_dependencies("@@//:direct")
+
+        self.assertEqual(deps, [Dependency(target="//:leaf", headers=["leaf.h"])])
+
+    def test_target_without_transitive_deps(self) -> None:
+        self.assertEqual(self.make_graph().get_dependencies("//:leaf"), [])
+
+    def test_direct_dep_which_is_also_transitive_dep_is_ignored(self) -> None:
+        graph = DependencyGraph()
+        graph.add_target(make_graph_node("//:target", rule_inputs=["//:a", "//:b"]))
+        graph.add_target(make_graph_node("//:a", rule_inputs=["//:b"], hdrs=["//:a.h"]))
+        graph.add_target(make_graph_node("//:b", rule_inputs=[], hdrs=["//:b.h"]))
+
+        self.assertEqual(graph.get_dependencies("//:target"), [])
+
+    def test_add_rule_after_computing_dependencies_fails(self) -> None:
+        graph = self.make_graph()
+        graph.get_dependencies("//:target")
+
+        with self.assertRaises(RuntimeError):
+            graph.add_rule(name="//:late", rule_inputs=[], dependency=None)
+
+
+def make_processed_dep(target: str, header_files: list[str]) -> dict:
+    return {"target": target, "header_files": header_files}
+
+
+class TestProcessedDepsIndex(unittest.TestCase):
+    def make_index(self) -> ProcessedDepsIndex:
+        index = ProcessedDepsIndex()
+        for target in ["@@//:target", "@@//:direct", "@@//:transitive", "@@//:leaf"]:
+            index.add_analyzed_target(target)
+        index.add_processed_dep("@@//:target", make_processed_dep("@@//:direct", ["direct.h"]))
+        index.add_processed_dep("@@//:direct", make_processed_dep("@@//:transitive", ["transitive.h"]))
+        index.add_processed_dep(
+            "@@//:direct", make_processed_dep("@@//:generated", ["bazel-out/k8-fastbuild/bin/generated.h"])
+        )
+        index.add_processed_dep(
+            "@@//:transitive",
+            make_processed_dep("@@//:leaf", ["bazel-out/k8-fastbuild/bin/_virtual_includes/leaf/l.h"]),
+        )
+        return index
+
+    def test_unknown_target(self) -> None:
+        self.assertIsNone(self.make_index().get_dependencies("//:unknown"))
+
+    def test_transitive_deps_exclude_direct_deps(self) -> None:
+        index = self.make_index()
+        index.add_analyzed_target("@@//:generated")
+
+        self.assertEqual(
+            index.get_dependencies("//:target"),
+            [
+                Dependency(target="//:generated", headers=["generated.h"]),
+                Dependency(target="//:leaf", headers=["_virtual_includes/leaf/l.h"]),
+                Dependency(target="//:transitive", headers=["transitive.h"]),
+            ],
+        )
+
+    def test_incomplete_transitive_deps(self) -> None:
+        # '//:generated' has not been analyzed, thus we do not know its dependencies
+        self.assertIsNone(self.make_index().get_dependencies("//:target"))
+
+    def test_target_without_transitive_deps(self) -> None:
+        self.assertEqual(self.make_index().get_dependencies("@@//:transitive"), [])
+
+    def test_skip_deps_without_header_files(self) -> None:
+        index = ProcessedDepsIndex()
+        for target in ["//:target", "//:direct", "//:no_headers"]:
+            index.add_analyzed_target(target)
+        index.add_processed_dep("//:target", make_processed_dep("//:direct", ["direct.h"]))
+        index.add_processed_dep("//:direct", make_processed_dep("//:no_headers", []))
+
+        self.assertEqual(index.get_dependencies("//:target"), [])
+
+    def test_external_deps_use_apparent_repo_names(self) -> None:
+        index = ProcessedDepsIndex(apparent_repo_names={"rules_foo+": "rules_foo"})
+        for target in ["@@//:target", "@@//:direct", "@@rules_foo+//foo:foo", "@@other+//bar:bar"]:
+            index.add_analyzed_target(target)
+        index.add_processed_dep("@@//:target", make_processed_dep("@@//:direct", ["direct.h"]))
+        index.add_processed_dep(
+            "@@//:direct", make_processed_dep("@@rules_foo+//foo:foo", ["external/rules_foo+/foo/foo.h"])
+        )
+        index.add_processed_dep(
+            "@@rules_foo+//foo:foo", make_processed_dep("@@other+//bar:bar", ["external/other+/bar/bar.h"])
+        )
+
+        self.assertEqual(
+            index.get_dependencies("//:target"),
+            [
+                Dependency(target="@@other+//bar:bar", headers=["bar/bar.h"]),
+                Dependency(target="@rules_foo//foo:foo", headers=["foo/foo.h"]),
+            ],
+        )
+
+
+class TestQueryDependencyGraph(unittest.TestCase):
+    def test_query_graph_for_all_targets_at_once(self) -> None:
+        execute_query_mock = MagicMock(uses_cquery=False)
+        execute_query_mock.stream.return_value = query_output(
+            """
+{"type":"RULE","rule":{"name":"//:a","ruleClass":"cc_library","attribute":[],"ruleInput":["//:b"]}}
+{"type":"RULE","rule":{"name":"//:b","ruleClass":"cc_library","attribute":[],"ruleInput":["//:c"]}}
+{"type":"RULE","rule":{"name":"//:c","ruleClass":"cc_library","attribute":[{"name":"hdrs","stringListValue":["//:c.h"],"explicitlySpecified":true}]}}
+""".lstrip(),
+        )
+
+        graph = query_dependency_graph(bazel_query=execute_query_mock, targets=["@@//:a", "@@//:b"])
+
+        execute_query_mock.stream.assert_called_once_with(
+            query='kind("rule", deps(set("@@//:a" "@@//:b")))',
+            args=[
+                "--output=streamed_jsonproto",
+                "--noimplicit_deps",
+                "--proto:output_rule_attrs=hdrs,include_prefix,name,strip_include_prefix,visibility",
+                "--noproto:default_values",
+            ],
+            use_query_file=True,
+        )
+        self.assertEqual(graph.get_dependencies("@@//:a"), [Dependency(target="//:c", headers=["c.h"])])
+        self.assertEqual(graph.get_dependencies("@@//:b"), [])
+
+    @patch("dwyu.apply_fixes.search_missing_deps.BATCHED_QUERY_CHUNK_SIZE", 2)
+    def test_split_large_amount_of_targets_into_chunks(self) -> None:
+        execute_query_mock = MagicMock(uses_cquery=False)
+        execute_query_mock.stream.side_effect = lambda **_: query_output("")
+
+        query_dependency_graph(bazel_query=execute_query_mock, targets=["//:a", "//:b", "//:c"])
+
+        self.assertEqual(execute_query_mock.stream.call_count, 2)
+        self.assertEqual(
+            execute_query_mock.stream.call_args_list[0].kwargs["query"], 'kind("rule", deps(set("//:a" "//:b")))'
+        )
+        self.assertEqual(execute_query_mock.stream.call_args_list[1].kwargs["query"], 'kind("rule", deps(set("//:c")))')
+
+
+def make_configured_graph_node(target: str, rule_inputs: list[tuple[str, str]], checksum: str) -> dict:
+    node = make_graph_node(target=target, rule_inputs=[], hdrs=[f"{target}.h"])
+    node["rule"]["configuredRuleInput"] = [
+        {"label": label, "configurationChecksum": input_checksum} for label, input_checksum in rule_inputs
+    ]
+    return {"target": node, "configuration": {"checksum": checksum}}
+
+
+def make_cquery_output(results: list[dict], mnemonics: dict[str, str] | None = None) -> str:
+    configurations = [{"checksum": checksum, "mnemonic": mnemonic} for checksum, mnemonic in (mnemonics or {}).items()]
+    return json.dumps({"results": results, "configurations": configurations})
+
+
+class TestGetConfiguredRuleInputs(unittest.TestCase):
+    def test_ignore_inputs_of_other_configurations(self) -> None:
+        rule = {
+            "ruleInput": ["//:a", "//:b", "//:c"],
+            "configuredRuleInput": [
+                {"label": "//:a", "configurationChecksum": "target"},
+                {"label": "//:b", "configurationChecksum": "exec"},
+                {"label": "//:c"},
+            ],
+        }
+
+        self.assertEqual(get_configured_rule_inputs(rule=rule, checksum="target"), ["//:a", "//:c"])
+
+    def test_ignore_inputs_of_other_configurations_by_id(self) -> None:
+        rule = {
+            "ruleInput": ["//:a", "//:b", "//:c"],
+            "configuredRuleInput": [
+                {"label": "//:a", "configurationId": 1},
+                {"label": "//:b", "configurationId": 2},
+                {"label": "//:c"},
+            ],
+        }
+
+        self.assertEqual(get_configured_rule_inputs(rule=rule, checksum="", configuration_id=1), ["//:a", "//:c"])
+
+    def test_fall_back_to_unconfigured_rule_inputs(self) -> None:
+        self.assertEqual(get_configured_rule_inputs(rule={"ruleInput": ["//:a"]}, checksum="target"), ["//:a"])
+
+
+class TestQueryConfiguredDependencyGraph(unittest.TestCase):
+    def test_query_graph_once_per_configuration(self) -> None:
+        outputs = {
+            "k8-fastbuild": make_cquery_output(
+                [
+                    make_configured_graph_node("//:a", [("//:b", "fast")], checksum="fast"),
+                    make_configured_graph_node("//:b", [("//:c", "fast")], checksum="fast"),
+                    make_configured_graph_node("//:c", [("//:tool", "exec")], checksum="fast"),
+                    make_configured_graph_node("//:tool", [], checksum="exec"),
+                ],
+                mnemonics={"fast": "k8-fastbuild", "exec": "k8-opt-exec"},
+            ),
+            "k8-opt": make_cquery_output(
+                [
+                    make_configured_graph_node("//:x", [("//:y", "opt")], checksum="opt"),
+                    make_configured_graph_node("//:y", [("//:z", "opt")], checksum="opt"),
+                    make_configured_graph_node("//:z", [], checksum="opt"),
+                ],
+                mnemonics={"opt": "k8-opt"},
+            ),
+        }
+        execute_query_mock = MagicMock(uses_cquery=True)
+        execute_query_mock.stream.side_effect = lambda **kwargs: query_output(
+            outputs["k8-opt" if "//:x" in kwargs["query"] else "k8-fastbuild"]
+        )
+
+        graph = query_configured_dependency_graph(
+            bazel_query=execute_query_mock,
+            targets_per_configuration={"k8-fastbuild": ["//:a", "//:b"], "k8-opt": ["//:x"]},
+        )
+
+        self.assertEqual(execute_query_mock.stream.call_count, 2)
+        execute_query_mock.stream.assert_any_call(
+            query='kind("rule", deps(set("//:a" "//:b")))',
+            args=[
+                "--output=jsonproto",
+                "--universe_scope=//:a,//:b",
+                "--noimplicit_deps",
+                "--proto:output_rule_attrs=hdrs,include_prefix,name,strip_include_prefix,visibility",
+                "--noproto:default_values",
+            ],
+            use_query_file=True,
+        )
+        self.assertEqual(graph.get_dependencies("//:a"), [Dependency(target="//:c", headers=["c.h"])])
+        self.assertEqual(graph.get_dependencies("//:x"), [Dependency(target="//:z", headers=["z.h"])])
+        self.assertIsNone(graph.get_dependencies("//:y"))
+
+    def test_prefer_configuration_matching_report_location(self) -> None:
+        execute_query_mock = MagicMock(uses_cquery=True)
+        execute_query_mock.stream.return_value = query_output(
+            make_cquery_output(
+                [
+                    make_configured_graph_node("//:a", [("//:b", "fast")], checksum="fast"),
+                    make_configured_graph_node("//:b", [("//:c", "fast")], checksum="fast"),
+                    make_configured_graph_node("//:c", [], checksum="fast"),
+                    make_configured_graph_node("//:a", [("//:b", "opt")], checksum="opt"),
+                    make_configured_graph_node("//:b", [], checksum="opt"),
+                ],
+                mnemonics={"fast": "k8-fastbuild", "opt": "k8-opt"},
+            )
+        )
+
+        graph = query_configured_dependency_graph(
+            bazel_query=execute_query_mock, targets_per_configuration={"k8-opt": ["//:a"]}
+        )
+
+        self.assertEqual(graph.get_dependencies("//:a"), [])
+
+    def test_fall_back_to_configuration_of_top_level_targets(self) -> None:
+        execute_query_mock = MagicMock(uses_cquery=True)
+        execute_query_mock.stream.return_value = query_output(
+            make_cquery_output(
+                [
+                    make_configured_graph_node("//:a", [("//:b", "fast")], checksum="fast"),
+                    make_configured_graph_node("//:b", [("//:c", "fast")], checksum="fast"),
+                    make_configured_graph_node("//:c", [], checksum="fast"),
+                ],
+                mnemonics={"fast": "k8-fastbuild"},
+            )
+        )
+
+        graph = query_configured_dependency_graph(
+            bazel_query=execute_query_mock, targets_per_configuration={None: ["//:a"]}
+        )
+
+        self.assertEqual(graph.get_dependencies("//:a"), [Dependency(target="//:c", headers=["c.h"])])
+
+    @patch("dwyu.apply_fixes.search_missing_deps.BATCHED_QUERY_CHUNK_SIZE", 2)
+    def test_split_large_amount_of_targets_into_chunks(self) -> None:
+        execute_query_mock = MagicMock(uses_cquery=True)
+        execute_query_mock.stream.side_effect = lambda **_: query_output(make_cquery_output([]))
+
+        graph = query_configured_dependency_graph(
+            bazel_query=execute_query_mock, targets_per_configuration={"k8-fastbuild": ["//:a", "//:b", "//:c"]}
+        )
+
+        self.assertEqual(execute_query_mock.stream.call_count, 2)
+        self.assertIn("--universe_scope=//:c", execute_query_mock.stream.call_args_list[1].kwargs["args"])
+        self.assertIsNone(graph.get_dependencies("//:a"))
+
+    @patch("dwyu.apply_fixes.search_missing_deps.MAX_UNIVERSE_SCOPE_LENGTH", 15)
+    def test_limit_length_of_universe_scope(self) -> None:
+        execute_query_mock = MagicMock(uses_cquery=True)
+        execute_query_mock.stream.side_effect = lambda **_: query_output(make_cquery_output([]))
+
+        query_configured_dependency_graph(
+            bazel_query=execute_query_mock,
+            targets_per_configuration={"k8-fastbuild": ["//:a", "//:b", "//:c", "//foo:some_long_name", "//:d"]},
+        )
+
+        self.assertEqual(
+            [call.kwargs["args"][1] for call in execute_query_mock.stream.call_args_list],
+            [
+                "--universe_scope=//:a,//:b,//:c",
+                "--universe_scope=//foo:some_long_name",
+                "--universe_scope=//:d",
+            ],
+        )
+
+    def test_resolve_mnemonic_via_configuration_id(self) -> None:
+        output = {
+            "results": [
+                {"target": make_graph_node(target="//:a", rule_inputs=[]), "configurationId": 2},
+                {"target": make_graph_node(target="//:a", rule_inputs=["//:b"]), "configurationId": 1},
+                {"target": make_graph_node(target="//:b", rule_inputs=["//:c"]), "configurationId": 1},
+                {"target": make_graph_node(target="//:c", rule_inputs=[], hdrs=["//:c.h"]), "configurationId": 1},
+            ],
+            "configurations": [{"mnemonic": "k8-opt", "id": 2}, {"mnemonic": "k8-fastbuild", "id": 1}],
+        }
+        execute_query_mock = MagicMock(uses_cquery=True)
+        execute_query_mock.stream.return_value = query_output(json.dumps(output))
+
+        graph = query_configured_dependency_graph(
+            bazel_query=execute_query_mock, targets_per_configuration={"k8-fastbuild": ["//:a"]}
+        )
+
+        self.assertEqual(graph.get_dependencies("//:a"), [Dependency(target="//:c", headers=["c.h"])])
+
+    def test_recorded_cquery_output(self) -> None:
+        runfiles = Runfiles.Create()
+        recorded_output = Path(
+            runfiles.Rlocation("depend_on_what_you_use/dwyu/apply_fixes/test/data/cquery/jsonproto_output.json")
+        )
+        execute_query_mock = MagicMock(uses_cquery=True)
+        execute_query_mock.stream.return_value = query_output(recorded_output.read_text(encoding="utf-8"))
+
+        graph = query_configured_dependency_graph(
+            bazel_query=execute_query_mock, targets_per_configuration={"k8-fastbuild": ["//foo:foo"]}
+        )
+
+        self.assertEqual(
+            graph.get_dependencies("//foo:foo"),
+            [Dependency(target="//baz:baz", headers=["baz/baz.h"], visibility=["//visibility:public"])],
+        )
+
+
 class TestVirtualizeHeaders(unittest.TestCase):
     def test_regression_absolute_strip_include_prefix(self) -> None:
         self.assertEqual(
@@ -252,6 +854,7 @@ class TestVirtualizeHeaders(unittest.TestCase):
                 target_name="arena",
                 added_prefix="",
                 stripped_prefix="/src",
+                include_root_hash="ae60082e",
             ),
             [
                 "src/google/protobuf/_virtual_includes/arena/google/protobuf/arena.h",
@@ -266,6 +869,7 @@ class TestVirtualizeHeaders(unittest.TestCase):
                 target_name="arena",
                 added_prefix="google3",
                 stripped_prefix="/src",
+                include_root_hash="ae60082e",
             ),
             [
                 "src/google/protobuf/_virtual_includes/arena/google3/google/protobuf/arena.h",
@@ -280,6 +884,7 @@ class TestVirtualizeHeaders(unittest.TestCase):
                 target_name="arena",
                 added_prefix="",
                 stripped_prefix="/src/google/protobuf",
+                include_root_hash="ae60082e",
             ),
             [
                 "src/google/protobuf/_virtual_includes/arena/arena.h",
@@ -294,6 +899,7 @@ class TestVirtualizeHeaders(unittest.TestCase):
                 target_name="arena",
                 added_prefix="",
                 stripped_prefix="/",
+                include_root_hash="ae60082e",
             ),
             [
                 "src/google/protobuf/_virtual_includes/arena/src/google/protobuf/arena.h",
@@ -308,6 +914,7 @@ class TestVirtualizeHeaders(unittest.TestCase):
                 target_name="arena",
                 added_prefix="",
                 stripped_prefix="/src/",
+                include_root_hash="ae60082e",
             ),
             [
                 "src/google/protobuf/_virtual_includes/arena/google/protobuf/arena.h",
@@ -322,6 +929,7 @@ class TestVirtualizeHeaders(unittest.TestCase):
                 target_name="lib",
                 added_prefix="",
                 stripped_prefix="sub/",
+                include_root_hash="d758b9bc",
             ),
             [
                 "foo/_virtual_includes/lib/thing.h",
@@ -336,6 +944,7 @@ class TestVirtualizeHeaders(unittest.TestCase):
                 target_name="lib",
                 added_prefix="",
                 stripped_prefix="/does/not/match",
+                include_root_hash="d758b9bc",
             )
 
         self.assertEqual(hdrs, [])
@@ -343,13 +952,34 @@ class TestVirtualizeHeaders(unittest.TestCase):
             any("Could not strip 'strip_include_prefix' value '/does/not/match'" in msg for msg in cm.output)
         )
 
+    def test_include_root_hash_is_computed_once_per_target(self) -> None:
+        dep = Dependency(
+            target="//foo:lib",
+            headers=["foo/a.h", "foo/b.h", "foo/c.h"],
+            virtual_includes=VirtualIncludes(
+                header_labels=["//foo:a.h", "//foo:b.h", "//foo:c.h"],
+                target_name="lib",
+                added_prefix="bar",
+                stripped_prefix="",
+            ),
+        )
+
+        with patch(
+            "dwyu.apply_fixes.search_missing_deps.make_include_root_hash", wraps=make_include_root_hash
+        ) as make_hash:
+            hdrs = dep.get_virtual_headers()
+
+        make_hash.assert_called_once_with(pkg="foo", target_name="lib")
+        self.assertEqual(len(hdrs), 6)
+        self.assertEqual(hdrs[1], f"_virtual_includes/{make_include_root_hash('foo', 'lib')}/bar/a.h")
+
 
 class TestSearchDeps(unittest.TestCase):
     def test_noop_for_empty_input(self) -> None:
         self.assertEqual(search_missing_deps(bazel_query=MagicMock(), target="", headers_without_direct_dep={}), [])
 
     @patch("dwyu.apply_fixes.search_missing_deps.get_dependencies")
-    @patch("dwyu.apply_fixes.search_missing_deps.is_visible", return_value=True)
+    @patch.object(VisibilityChecker, "filter_visible", side_effect=all_candidates_visible)
     def test_find_dependency(self, _: MagicMock, get_deps_mock: MagicMock) -> None:
         get_deps_mock.return_value = [
             Dependency(target="//unrelated:lib", headers=["some_hdr.h"]),
@@ -362,7 +992,7 @@ class TestSearchDeps(unittest.TestCase):
         self.assertEqual(deps, ["//expected:target"])
 
     @patch("dwyu.apply_fixes.search_missing_deps.get_dependencies")
-    @patch("dwyu.apply_fixes.search_missing_deps.is_visible", return_value=True)
+    @patch.object(VisibilityChecker, "filter_visible", side_effect=all_candidates_visible)
     def test_find_dependency_for_generated_code(self, _: MagicMock, get_deps_mock: MagicMock) -> None:
         get_deps_mock.return_value = [
             Dependency(target="//expected:target", headers=["other/path/hdr_a.h", "some/path/hdr_b.h"]),
@@ -376,7 +1006,7 @@ class TestSearchDeps(unittest.TestCase):
         self.assertEqual(deps, ["//expected:target"])
 
     @patch("dwyu.apply_fixes.search_missing_deps.get_dependencies")
-    @patch("dwyu.apply_fixes.search_missing_deps.is_visible", return_value=True)
+    @patch.object(VisibilityChecker, "filter_visible", side_effect=all_candidates_visible)
     def test_find_dependency_for_external_code(self, _: MagicMock, get_deps_mock: MagicMock) -> None:
         get_deps_mock.return_value = [
             Dependency(target="@some_repo//expected:target", headers=["other/path/hdr_a.h", "some/path/hdr_b.h"]),
@@ -390,7 +1020,61 @@ class TestSearchDeps(unittest.TestCase):
         self.assertEqual(deps, ["@some_repo//expected:target"])
 
     @patch("dwyu.apply_fixes.search_missing_deps.get_dependencies")
-    @patch("dwyu.apply_fixes.search_missing_deps.is_visible", return_value=False)
+    @patch.object(VisibilityChecker, "filter_visible", side_effect=all_candidates_visible)
+    def test_find_dependency_for_virtual_include(self, _: MagicMock, get_deps_mock: MagicMock) -> None:
+        get_deps_mock.return_value = [
+            Dependency(target="//unrelated:lib", headers=["some/path/hdr.h"]),
+            Dependency(
+                target="//expected:target", headers=["hdr.h", "expected/_virtual_includes/target/some/path/hdr.h"]
+            ),
+        ]
+        deps = search_missing_deps(
+            bazel_query=MagicMock(),
+            target="foo",
+            headers_without_direct_dep={
+                "some_file.cc": ["bazel-out/k8-fastbuild/bin/expected/_virtual_includes/target/some/path/hdr.h"]
+            },
+        )
+
+        self.assertEqual(deps, ["//expected:target"])
+
+    @patch("dwyu.apply_fixes.search_missing_deps.get_dependencies")
+    @patch.object(VisibilityChecker, "filter_visible", side_effect=all_candidates_visible)
+    def test_reconstruct_virtual_headers_on_demand(self, _: MagicMock, get_deps_mock: MagicMock) -> None:
+        get_deps_mock.return_value = [
+            Dependency(
+                target="//expected:target",
+                headers=["expected/some/path/hdr.h"],
+                virtual_includes=VirtualIncludes(
+                    header_labels=["//expected:some/path/hdr.h"],
+                    target_name="target",
+                    added_prefix="",
+                    stripped_prefix="some",
+                ),
+            ),
+        ]
+
+        with patch("dwyu.apply_fixes.search_missing_deps.virtualize_headers", wraps=virtualize_headers) as virtualize:
+            deps = search_missing_deps(
+                bazel_query=MagicMock(),
+                target="foo",
+                headers_without_direct_dep={"some_file.cc": ["expected/some/path/hdr.h"]},
+            )
+            self.assertEqual(deps, ["//expected:target"])
+            virtualize.assert_not_called()
+
+            deps = search_missing_deps(
+                bazel_query=MagicMock(),
+                target="foo",
+                headers_without_direct_dep={
+                    "some_file.cc": ["bazel-out/k8-fastbuild/bin/expected/_virtual_includes/target/path/hdr.h"]
+                },
+            )
+            self.assertEqual(deps, ["//expected:target"])
+            virtualize.assert_called_once()
+
+    @patch("dwyu.apply_fixes.search_missing_deps.get_dependencies")
+    @patch.object(VisibilityChecker, "filter_visible", return_value=[])
     def test_fail_for_invisible_dependency(self, _: MagicMock, get_deps_mock: MagicMock) -> None:
         get_deps_mock.return_value = [
             Dependency(target="//expected:target", headers=["some/path/hdr.h"]),
@@ -407,7 +1091,7 @@ class TestSearchDeps(unittest.TestCase):
             self.assertEqual(deps, [])
 
     @patch("dwyu.apply_fixes.search_missing_deps.get_dependencies")
-    @patch("dwyu.apply_fixes.search_missing_deps.is_visible", return_value=True)
+    @patch.object(VisibilityChecker, "filter_visible", side_effect=all_candidates_visible)
     def test_fail_on_ambiguous_dependency_resolution_for_header_file(
         self, _: MagicMock, get_deps_mock: MagicMock
     ) -> None:
@@ -427,6 +1111,127 @@ class TestSearchDeps(unittest.TestCase):
             self.assertTrue("Discovered potential dependencies are: ['//:lib_a', '//:lib_b']" in cm.output[0])
             self.assertEqual(deps, [])
 
+    @patch("dwyu.apply_fixes.search_missing_deps.get_dependencies")
+    @patch.object(VisibilityChecker, "filter_visible", side_effect=all_candidates_visible)
+    def test_use_dependency_graph_instead_of_query(self, _: MagicMock, get_deps_mock: MagicMock) -> None:
+        graph = DependencyGraph()
+        graph.add_target(make_graph_node("//:foo", rule_inputs=["//:direct"]))
+        graph.add_target(make_graph_node("//:direct", rule_inputs=["//expected:target"]))
+        graph.add_target(make_graph_node("//expected:target", rule_inputs=[], hdrs=["//expected:hdr.h"]))
+
+        deps = search_missing_deps(
+            bazel_query=MagicMock(),
+            target="@@//:foo",
+            headers_without_direct_dep={"some_file.cc": ["expected/hdr.h"]},
+            dependency_graph=graph,
+        )
+
+        self.assertEqual(deps, ["//expected:target"])
+        get_deps_mock.assert_not_called()
+
+    @patch("dwyu.apply_fixes.search_missing_deps.get_dependencies")
+    @patch.object(VisibilityChecker, "filter_visible", side_effect=all_candidates_visible)
+    def test_fall_back_to_query_for_target_unknown_to_dependency_graph(
+        self, _: MagicMock, get_deps_mock: MagicMock
+    ) -> None:
+        get_deps_mock.return_value = [Dependency(target="//expected:target", headers=["expected/hdr.h"])]
+
+        deps = search_missing_deps(
+            bazel_query=MagicMock(),
+            target="@@//:foo",
+            headers_without_direct_dep={"some_file.cc": ["expected/hdr.h"]},
+            dependency_graph=DependencyGraph(),
+        )
+
+        self.assertEqual(deps, ["//expected:target"])
+        get_deps_mock.assert_called_once()
+
+    @patch("dwyu.apply_fixes.search_missing_deps.get_dependencies")
+    @patch.object(VisibilityChecker, "filter_visible", side_effect=all_candidates_visible)
+    def test_use_processed_deps_instead_of_dependency_graph_and_query(
+        self, _: MagicMock, get_deps_mock: MagicMock
+    ) -> None:
+        index = ProcessedDepsIndex()
+        for target in ["@@//:foo", "@@//:direct", "@@//expected:target"]:
+            index.add_analyzed_target(target)
+        index.add_processed_dep("@@//:foo", make_processed_dep("@@//:direct", ["direct.h"]))
+        index.add_processed_dep("@@//:direct", make_processed_dep("@@//expected:target", ["expected/hdr.h"]))
+        graph = MagicMock()
+
+        deps = search_missing_deps(
+            bazel_query=MagicMock(),
+            target="@@//:foo",
+            headers_without_direct_dep={"some_file.cc": ["expected/hdr.h"]},
+            dependency_graph=graph,
+            processed_deps=index,
+        )
+
+        self.assertEqual(deps, ["//expected:target"])
+        graph.get_dependencies.assert_not_called()
+        get_deps_mock.assert_not_called()
+
+    @patch("dwyu.apply_fixes.search_missing_deps.get_dependencies")
+    @patch.object(VisibilityChecker, "filter_visible", side_effect=all_candidates_visible)
+    def test_fall_back_to_query_for_target_not_covered_by_processed_deps(
+        self, _: MagicMock, get_deps_mock: MagicMock
+    ) -> None:
+        get_deps_mock.return_value = [Dependency(target="//expected:target", headers=["expected/hdr.h"])]
+
+        deps = search_missing_deps(
+            bazel_query=MagicMock(),
+            target="@@//:foo",
+            headers_without_direct_dep={"some_file.cc": ["expected/hdr.h"]},
+            processed_deps=ProcessedDepsIndex(),
+        )
+
+        self.assertEqual(deps, ["//expected:target"])
+        get_deps_mock.assert_called_once()
+
+    @patch("dwyu.apply_fixes.search_missing_deps.get_dependencies")
+    def test_check_visibility_of_all_candidates_at_once(self, get_deps_mock: MagicMock) -> None:
+        get_deps_mock.return_value = [
+            Dependency(target="//:lib_a", headers=["a.h"]),
+            Dependency(target="//:lib_b", headers=["b.h"]),
+            Dependency(target="//:lib_c", headers=["c.h"]),
+            Dependency(target="//:unrelated", headers=["unrelated.h"]),
+        ]
+        visibility = MagicMock()
+        visibility.filter_visible.return_value = ["//:lib_a", "//:lib_c"]
+
+        with self.assertLogs() as cm:
+            deps = search_missing_deps(
+                bazel_query=MagicMock(),
+                target="foo",
+                headers_without_direct_dep={"some_file.cc": ["a.h", "b.h"], "other_file.cc": ["c.h"]},
+                visibility=visibility,
+            )
+
+        self.assertEqual(deps, ["//:lib_a", "//:lib_c"])
+        visibility.register_declared_visibility.assert_not_called()
+        visibility.filter_visible.assert_called_once_with(target="foo", candidates=["//:lib_a", "//:lib_b", "//:lib_c"])
+        self.assertEqual(len(cm.output), 1)
+        self.assertTrue("header file 'b.h' for target 'foo'" in cm.output[0])
+
+    @patch("dwyu.apply_fixes.search_missing_deps.get_dependencies")
+    def test_provide_declared_visibility_to_visibility_checker(self, get_deps_mock: MagicMock) -> None:
+        get_deps_mock.return_value = [
+            Dependency(target="//:lib_a", headers=["a.h"], visibility=["//visibility:public"]),
+            Dependency(target="//:lib_b", headers=["b.h"]),
+        ]
+        visibility = MagicMock()
+        visibility.filter_visible.return_value = ["//:lib_a"]
+
+        search_missing_deps(
+            bazel_query=MagicMock(),
+            target="foo",
+            headers_without_direct_dep={"some_file.cc": ["a.h"]},
+            visibility=visibility,
+        )
+
+        visibility.register_declared_visibility.assert_called_once_with(
+            dep="//:lib_a", visibility=["//visibility:public"]
+        )
+
     @patch("dwyu.apply_fixes.search_missing_deps.get_dependencies")
     def test_fail_on_unresolved_dependency(self, get_deps_mock: MagicMock) -> None:
         get_deps_mock.return_value = [Dependency(target="//unrelated:lib", headers=["some_hdr.h"])]
@@ -441,6 +1246,48 @@ class TestSearchDeps(unittest.TestCase):
             )
             self.assertEqual(deps, [])
 
+    @patch("dwyu.apply_fixes.search_missing_deps.get_dependencies")
+    @patch.object(VisibilityChecker, "filter_visible", side_effect=all_candidates_visible)
+    def test_collect_unresolved_headers_instead_of_warning(self, _: MagicMock, get_deps_mock: MagicMock) -> None:
+        get_deps_mock.return_value = [
+            Dependency(target="//:lib_a", headers=["ambiguous.h"]),
+            Dependency(target="//:lib_b", headers=["ambiguous.h"]),
+        ]
+        unresolved_headers = MagicMock()
+
+        with self.assertNoLogs():
+            deps = search_missing_deps(
+                bazel_query=MagicMock(),
+                target="foo",
+                headers_without_direct_dep={"some_file.cc": ["ambiguous.h", "unknown.h"]},
+                unresolved_headers=unresolved_headers,
+            )
+
+        self.assertEqual(deps, [])
+        unresolved_headers.add_ambiguous.assert_called_once_with(
+            header="ambiguous.h", target="foo", candidates=["//:lib_a", "//:lib_b"]
+        )
+        unresolved_headers.add_not_found.assert_called_once_with(header="unknown.h", target="foo")
+
+    @patch("dwyu.apply_fixes.search_missing_deps.get_dependencies")
+    @patch.object(VisibilityChecker, "filter_visible", side_effect=all_candidates_visible)
+    def test_share_header_providers_between_queried_targets(self, _: MagicMock, get_deps_mock: MagicMock) -> None:
+        lib = MagicMock(target="//:lib", headers=["hdr.h"], visibility=None)
+        get_deps_mock.return_value = [lib]
+        header_providers = HeaderProviders()
+
+        for target in ["//:foo", "//:bar"]:
+            deps = search_missing_deps(
+                bazel_query=MagicMock(),
+                target=target,
+                headers_without_direct_dep={"some_file.cc": ["_virtual_includes/lib/hdr.h"]},
+                header_providers=header_providers,
+                unresolved_headers=MagicMock(),
+            )
+            self.assertEqual(deps, [])
+
+        lib.get_virtual_headers.assert_called_once()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,6 +1,6 @@
 import unittest
 
-from dwyu.apply_fixes.utils import args_string_to_list
+from dwyu.apply_fixes.utils import args_string_to_list, normalize_label, to_apparent_label, to_canonical_label
 
 
 class TestArgsStringToList(unittest.TestCase):
@@ -15,5 +15,40 @@ class TestArgsStringToList(unittest.TestCase):
         self.assertEqual(args_string_to_list("--foo --bar=42 baz 1337"), ["--foo", "--bar=42", "baz", "1337"])
 
 
+class TestNormalizeLabel(unittest.TestCase):
+    def test_normalize_main_repo_labels(self) -> None:
+        self.assertEqual(normalize_label("@@//foo:bar"), "//foo:bar")
+        self.assertEqual(normalize_label("@//foo:bar"), "//foo:bar")
+        self.assertEqual(normalize_label("//foo:bar"), "//foo:bar")
+
+    def test_keep_external_labels(self) -> None:
+        self.assertEqual(normalize_label("@@repo+//foo:bar"), "@@repo+//foo:bar")
+        self.assertEqual(normalize_label("@repo//foo:bar"), "@repo//foo:bar")
+
+
+class TestToApparentLabel(unittest.TestCase):
+    def test_convert_canonical_repo_name(self) -> None:
+        self.assertEqual(to_apparent_label("@@repo+//foo:bar", {"repo+": "repo"}), "@repo//foo:bar")
+        self.assertEqual(to_apparent_label("@@repo+//:bar", {"repo+": "my_repo"}), "@my_repo//:bar")
+
+    def test_keep_labels_without_apparent_repo_name(self) -> None:
+        self.assertEqual(to_apparent_label("@@other+//foo:bar", {"repo+": "repo"}), "@@other+//foo:bar")
+        self.assertEqual(to_apparent_label("@repo//foo:bar", {"repo+": "repo"}), "@repo//foo:bar")
+
+    def test_normalize_main_repo_labels(self) -> None:
+        self.assertEqual(to_apparent_label("@@//foo:bar", {"": "main"}), "//foo:bar")
+
+
+class TestToCanonicalLabel(unittest.TestCase):
+    def test_convert_apparent_repo_name(self) -> None:
+        self.assertEqual(to_canonical_label("@repo//foo:bar", {"repo": "repo+"}), "@@repo+//foo:bar")
+        self.assertEqual(to_canonical_label("@my_module//foo:bar", {"my_module": ""}), "//foo:bar")
+
+    def test_keep_labels_without_canonical_repo_name(self) -> None:
+        self.assertEqual(to_canonical_label("@other//foo:bar", {"repo": "repo+"}), "@other//foo:bar")
+        self.assertEqual(to_canonical_label("@@repo+//foo:bar", {"repo": "repo+"}), "@@repo+//foo:bar")
+        self.assertEqual(to_canonical_label("@@//foo:bar", {"repo": "repo+"}), "//foo:bar")
+
+
 if __name__ == "__main__":
     unittest.main()
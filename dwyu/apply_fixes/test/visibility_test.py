@@ -0,0 +1,223 @@
+import unittest
+from subprocess import CompletedProcess
+from unittest.mock import MagicMock
+
+from dwyu.apply_fixes.visibility import PackageGroup, VisibilityChecker, get_package, match_package_specification
+
+
+def make_bazel_query_mock(stdout: str) -> MagicMock:
+    bazel_query = MagicMock()
+    bazel_query.execute.return_value = CompletedProcess(args=[], returncode=0, stderr="", stdout=stdout)
+    return bazel_query
+
+
+class TestGetPackage(unittest.TestCase):
+    def test_get_package(self) -> None:
+        self.assertEqual(get_package("//foo/bar:baz"), "//foo/bar")
+        self.assertEqual(get_package("@@//foo/bar:baz"), "//foo/bar")
+        self.assertEqual(get_package("@@//:baz"), "//")
+        self.assertEqual(get_package("@repo//foo:baz"), "@repo//foo")
+
+
+class TestMatchPackageSpecification(unittest.TestCase):
+    def test_public_and_private(self) -> None:
+        self.assertTrue(match_package_specification(package="//foo", spec="public"))
+        self.assertFalse(match_package_specification(package="//foo", spec="private"))
+
+    def test_exact_package(self) -> None:
+        self.assertTrue(match_package_specification(package="//foo/bar", spec="//foo/bar"))
+        self.assertFalse(match_package_specification(package="//foo/bar/baz", spec="//foo/bar"))
+        self.assertFalse(match_package_specification(package="//foo/barbar", spec="//foo/bar"))
+
+    def test_recursive_package(self) -> None:
+        self.assertTrue(match_package_specification(package="//foo/bar", spec="//foo/..."))
+        self.assertTrue(match_package_specification(package="//foo", spec="//foo/..."))
+        self.assertFalse(match_package_specification(package="//foobar", spec="//foo/..."))
+        self.assertTrue(match_package_specification(package="//", spec="//..."))
+        self.assertTrue(match_package_specification(package="//foo", spec="//..."))
+
+    def test_unsupported_specifications(self) -> None:
+        self.assertIsNone(match_package_specification(package="//foo", spec="@repo//foo"))
+        self.assertIsNone(match_package_specification(package="@repo//foo", spec="//..."))
+
+
+class TestVisibilityChecker(unittest.TestCase):
+    def test_check_all_candidates_with_single_query(self) -> None:
+        bazel_query = make_bazel_query_mock("//:lib_a\n//:lib_c\n")
+        unit = VisibilityChecker(bazel_query)
+
+        result = unit.filter_visible(target="@@//foo:bar", candidates=["//:lib_c", "//:lib_b", "//:lib_a"])
+
+        self.assertEqual(result, ["//:lib_c", "//:lib_a"])
+        bazel_query.execute.assert_called_once_with(
+            query='visible("@@//foo:bar", set("//:lib_a" "//:lib_b" "//:lib_c"))',
+            args=["--output=label"],
+            enforce_query=True,
+            use_query_file=True,
+        )
+
+    def test_reuse_results_for_targets_from_same_package(self) -> None:
+        bazel_query = make_bazel_query_mock("//:lib_a\n")
+        unit = VisibilityChecker(bazel_query)
+
+        unit.filter_visible(target="@@//foo:bar", candidates=["//:lib_a", "//:lib_b"])
+        result = unit.filter_visible(target="@@//foo:other", candidates=["//:lib_b", "//:lib_a"])
+
+        self.assertEqual(result, ["//:lib_a"])
+        bazel_query.execute.assert_called_once()
+
+    def test_query_only_unknown_candidates(self) -> None:
+        bazel_query = make_bazel_query_mock("//:lib_a\n")
+        unit = VisibilityChecker(bazel_query)
+        unit.filter_visible(target="@@//foo:bar", candidates=["//:lib_a"])
+
+        bazel_query.execute.return_value = CompletedProcess(args=[], returncode=0, stderr="", stdout="")
+        result = unit.filter_visible(target="@@//foo:bar", candidates=["//:lib_a", "//:lib_b"])
+
+        self.assertEqual(result, ["//:lib_a"])
+        self.assertEqual(bazel_query.execute.call_count, 2)
+        self.assertEqual(bazel_query.execute.call_args.kwargs["query"], 'visible("@@//foo:bar", set("//:lib_b"))')
+
+    def test_match_external_candidates_with_apparent_repository_name(self) -> None:
+        bazel_query = make_bazel_query_mock("@@rules_foo+//foo:visible\n//:lib_a\n")
+        bazel_query.get_repo_mapping.return_value = {"": "", "rules_foo": "rules_foo+"}
+        unit = VisibilityChecker(bazel_query)
+
+        result = unit.filter_visible(
+            target="@@//foo:bar", candidates=["@rules_foo//foo:visible", "@rules_foo//foo:invisible", "@@//:lib_a"]
+        )
+
+        self.assertEqual(result, ["@rules_foo//foo:visible", "@@//:lib_a"])
+
+    def test_no_repository_mapping_without_canonical_repository_names(self) -> None:
+        bazel_query = make_bazel_query_mock("@rules_foo//foo:visible\n")
+        unit = VisibilityChecker(bazel_query)
+
+        result = unit.filter_visible(
+            target="@@//foo:bar", candidates=["@rules_foo//foo:visible", "@rules_foo//foo:invisible"]
+        )
+
+        self.assertEqual(result, ["@rules_foo//foo:visible"])
+        bazel_query.get_repo_mapping.assert_not_called()
+
+    def test_do_not_hold_lock_while_querying(self) -> None:
+        bazel_query = MagicMock()
+        unit = VisibilityChecker(bazel_query)
+
+        def execute(**_: object) -> CompletedProcess:
+            self.assertFalse(unit._lock.locked())  # noqa: SLF001
+            return CompletedProcess(args=[], returncode=0, stderr="", stdout="//:lib_a\n")
+
+        bazel_query.execute.side_effect = execute
+
+        self.assertEqual(unit.filter_visible(target="@@//foo:bar", candidates=["//:lib_a"]), ["//:lib_a"])
+
+    def test_different_packages_are_checked_independently(self) -> None:
+        bazel_query = make_bazel_query_mock("//:lib_a\n")
+        unit = VisibilityChecker(bazel_query)
+
+        unit.filter_visible(target="@@//foo:bar", candidates=["//:lib_a"])
+        unit.filter_visible(target="@@//other:bar", candidates=["//:lib_a"])
+
+        self.assertEqual(bazel_query.execute.call_count, 2)
+
+
+class TestOfflineVisibilityEvaluation(unittest.TestCase):
+    def test_same_package_is_always_visible(self) -> None:
+        bazel_query = make_bazel_query_mock("")
+        unit = VisibilityChecker(bazel_query)
+
+        self.assertEqual(unit.filter_visible(target="@@//foo:bar", candidates=["//foo:lib"]), ["//foo:lib"])
+        bazel_query.execute.assert_not_called()
+
+    def test_evaluate_visibility_attribute(self) -> None:
+        bazel_query = make_bazel_query_mock("")
+        unit = VisibilityChecker(bazel_query)
+        unit.register_declared_visibility(dep="//lib:public", visibility=["//visibility:public"])
+        unit.register_declared_visibility(dep="//lib:private", visibility=["//visibility:private"])
+        unit.register_declared_visibility(dep="//lib:empty", visibility=[])
+        unit.register_declared_visibility(dep="//lib:pkg", visibility=["@@//foo:__pkg__"])
+        unit.register_declared_visibility(dep="//lib:other_pkg", visibility=["//foo/bar:__pkg__"])
+        unit.register_declared_visibility(dep="//lib:subpackages", visibility=["//:__subpackages__"])
+        unit.register_declared_visibility(dep="//lib:other_subpackages", visibility=["//fo:__subpackages__"])
+
+        result = unit.filter_visible(
+            target="@@//foo:bar",
+            candidates=[
+                "//lib:public",
+                "//lib:private",
+                "//lib:empty",
+                "//lib:pkg",
+                "//lib:other_pkg",
+                "//lib:subpackages",
+                "//lib:other_subpackages",
+            ],
+        )
+
+        self.assertEqual(result, ["//lib:public", "//lib:pkg", "//lib:subpackages"])
+        bazel_query.execute.assert_not_called()
+
+    def test_evaluate_package_groups_fetched_with_single_query(self) -> None:
+        bazel_query = make_bazel_query_mock(
+            """
+{"type":"PACKAGE_GROUP","packageGroup":{"name":"//groups:a","containedPackage":["//foo/...","-//foo/excluded"]}}
+{"type":"PACKAGE_GROUP","packageGroup":{"name":"//groups:b","containedPackage":["//other"],"includedPackageGroup":["//groups:a"]}}
+""".lstrip()
+        )
+        unit = VisibilityChecker(bazel_query)
+        unit.register_declared_visibility(dep="//lib:a", visibility=["//groups:a"])
+        unit.register_declared_visibility(dep="//lib:b", visibility=["//groups:b"])
+
+        self.assertEqual(
+            unit.filter_visible(target="@@//foo/sub:x", candidates=["//lib:a", "//lib:b"]), ["//lib:a", "//lib:b"]
+        )
+        self.assertEqual(unit.filter_visible(target="@@//foo/excluded:x", candidates=["//lib:a", "//lib:b"]), [])
+        self.assertEqual(unit.filter_visible(target="@@//other:x", candidates=["//lib:a", "//lib:b"]), ["//lib:b"])
+
+        bazel_query.execute.assert_called_once_with(
+            query='set("//groups:a" "//groups:b")',
+            args=["--output=streamed_jsonproto"],
+            enforce_query=True,
+            use_query_file=True,
+        )
+
+    def test_use_registered_package_groups(self) -> None:
+        bazel_query = make_bazel_query_mock("")
+        unit = VisibilityChecker(bazel_query)
+        unit.register_package_group(name="@@//groups:a", package_group=PackageGroup(packages=["//foo/..."]))
+        unit.register_declared_visibility(dep="//lib:a", visibility=["//groups:a"])
+
+        self.assertEqual(unit.filter_visible(target="@@//foo/sub:x", candidates=["//lib:a"]), ["//lib:a"])
+        self.assertEqual(unit.filter_visible(target="@@//other:x", candidates=["//lib:a"]), [])
+        bazel_query.execute.assert_not_called()
+
+    def test_fall_back_to_query_for_unknown_visibility(self) -> None:
+        bazel_query = make_bazel_query_mock("//lib:unknown\n")
+        unit = VisibilityChecker(bazel_query)
+        unit.register_declared_visibility(dep="//lib:public", visibility=["//visibility:public"])
+        unit.register_declared_visibility(dep="//lib:external_group", visibility=["@repo//:group"])
+
+        result = unit.filter_visible(
+            target="@@//foo:bar", candidates=["//lib:public", "//lib:unknown", "//lib:external_group"]
+        )
+
+        self.assertEqual(result, ["//lib:public", "//lib:unknown"])
+        bazel_query.execute.assert_called_once_with(
+            query='visible("@@//foo:bar", set("//lib:external_group" "//lib:unknown"))',
+            args=["--output=label"],
+            enforce_query=True,
+            use_query_file=True,
+        )
+
+    def test_fall_back_to_query_for_consumer_from_external_repository(self) -> None:
+        bazel_query = make_bazel_query_mock("")
+        unit = VisibilityChecker(bazel_query)
+        unit.register_declared_visibility(dep="//lib:private", visibility=["//visibility:private"])
+
+        unit.filter_visible(target="@@repo+//foo:bar", candidates=["//lib:private"])
+
+        bazel_query.execute.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
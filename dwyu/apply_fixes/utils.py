@@ -13,3 +13,47 @@ def args_string_to_list(args: str | None) -> list[str]:
 def execute_and_capture(cmd: list[str], cwd: Path, check: bool = True) -> subprocess.CompletedProcess:
     log.debug(f"Executing command: {shlex.join(cmd)}")
     return subprocess.run(cmd, cwd=cwd, check=check, capture_output=True, text=True)
+
+
+def normalize_label(label: str) -> str:
+    """
+    The DWYU aspect reports labels from the main repository in the canonical form '@@//foo:bar', whereas Bazel query
+    reports them as '//foo:bar'.
+    """
+    if label.startswith("@@//"):
+        return label[2:]
+    if label.startswith("@//"):
+        return label[1:]
+    return label
+
+
+def to_apparent_label(label: str, apparent_repo_names: dict[str, str]) -> str:
+    """
+    The DWYU aspect reports labels from external repositories with the canonical repository name, e.g.
+    '@@rules_foo+//foo:bar'. Such labels must not be written into BUILD files, as canonical names are an implementation
+    detail of Bzlmod. Convert them to the apparent repository name used by the main repository, e.g. '@rules_foo//foo:bar'.
+    Labels from repositories not visible to the main repository are kept as they are.
+    """
+    label = normalize_label(label)
+    if not label.startswith("@@"):
+        return label
+    canonical_repo, separator, package_and_name = label[2:].partition("//")
+    if canonical_repo not in apparent_repo_names:
+        return label
+    return f"@{apparent_repo_names[canonical_repo]}{separator}{package_and_name}"
+
+
+def to_canonical_label(label: str, repo_mapping: dict[str, str]) -> str:
+    """
+    Convert a label with an apparent repository name, e.g. '@rules_foo//foo:bar', to the canonical form Bazel query
+    reports, e.g. '@@rules_foo+//foo:bar'. The repository mapping maps the apparent names visible to the main repository
+    to their canonical names. Labels with unknown repository names are kept as they are.
+    """
+    label = normalize_label(label)
+    if not label.startswith("@") or label.startswith("@@"):
+        return label
+    apparent_repo, separator, package_and_name = label[1:].partition("//")
+    if apparent_repo not in repo_mapping:
+        return label
+    canonical_repo = repo_mapping[apparent_repo]
+    return f"@@{canonical_repo}{separator}{package_and_name}" if canonical_repo else f"//{package_and_name}"
@@ -0,0 +1,275 @@
+import json
+import logging
+from dataclasses import dataclass, field
+from itertools import chain
+from threading import Lock
+
+from dwyu.apply_fixes.bazel_query import BazelQuery
+from dwyu.apply_fixes.utils import normalize_label, to_canonical_label
+
+log = logging.getLogger()
+
+PUBLIC_VISIBILITY = "//visibility:public"
+PRIVATE_VISIBILITY = "//visibility:private"
+
+
+@dataclass
+class PackageGroup:
+    # Package specifications as reported by Bazel query, e.g. '//foo', '//foo/...' or '-//foo/bar'
+    packages: list[str] = field(default_factory=list)
+    includes: list[str] = field(default_factory=list)
+
+
+def parse_package_group(queried_package_group: dict) -> tuple[str, PackageGroup]:
+    """
+    Work on a package group as it is returned by a Bazel query
+    """
+    return normalize_label(queried_package_group["name"]), PackageGroup(
+        packages=queried_package_group.get("containedPackage", []),
+        includes=[normalize_label(g) for g in queried_package_group.get("includedPackageGroup", [])],
+    )
+
+
+def is_package_group_reference(spec: str) -> bool:
+    """
+    Package groups from other repositories are not supported, see 'match_package_specification'.
+    """
+    return (
+        spec.startswith("//")
+        and not spec.startswith("//visibility:")
+        and not spec.endswith((":__pkg__", ":__subpackages__"))
+    )
+
+
+def get_package(label: str) -> str:
+    return normalize_label(label).rsplit(":", maxsplit=1)[0]
+
+
+def split_package(package: str) -> tuple[str, str]:
+    """
+    Split a package like '//foo/bar' or '@repo//foo/bar' into the repository and the path of the package.
+    """
+    repo, path = package.split("//", maxsplit=1)
+    return repo, path
+
+
+def is_package_matching(package: str, spec_package: str, recursive: bool) -> bool:
+    repo, path = split_package(package)
+    spec_repo, spec_path = split_package(spec_package)
+    if repo != spec_repo:
+        return False
+    if path == spec_path:
+        return True
+    return recursive and (spec_path == "" or path.startswith(f"{spec_path}/"))
+
+
+def match_package_specification(package: str, spec: str) -> bool | None:
+    """
+    Evaluate a single package specification of a package_group. Return None for specifications we cannot evaluate.
+    """
+    if spec == "public":
+        return True
+    if spec == "private":
+        return False
+    if not spec.startswith("//"):
+        # Specifications for other repositories are not normalized in a way we can compare them reliably
+        return None
+    if spec == "//...":
+        # Depending on '--incompatible_package_group_has_public_syntax' this means all packages of the main repository
+        # or all packages everywhere. Both agree for the main repository.
+        return True if split_package(package)[0] == "" else None
+    if spec.endswith("/..."):
+        return is_package_matching(package=package, spec_package=spec.removesuffix("/..."), recursive=True)
+    return is_package_matching(package=package, spec_package=spec, recursive=False)
+
+
+class VisibilityChecker:
+    """
+    We can find dependencies, which are actually not usable. For example, the cc_library providing the required
+    header file might be private and only some alias target pointing to it might be visible for the target
+    consuming the header file.
+
+    Visibility is granted per package. Thus, we remember the results per package of the consuming target and the
+    candidate dependency.
+
+    Whenever possible, we evaluate the 'visibility' attribute of the candidates, which we already know from querying
+    the dependencies, ourselves. The package groups referenced in visibility attributes are fetched lazily with a
+    single query. Only for candidates whose visibility we cannot evaluate, we ask Bazel. For a single target, all
+    those candidates are checked with a single query.
+
+    The checker is shared between all concurrently processed reports. Accessing the caches is guarded by a lock. The
+    lock is not held while querying Bazel for the visibility of candidates, to not block reports whose candidates
+    are already known. Package groups are fetched while holding the lock, as evaluating visibility attributes depends
+    on them.
+    """
+
+    def __init__(self, bazel_query: BazelQuery) -> None:
+        self._bazel_query = bazel_query
+        self._cache: dict[tuple[str, str], bool] = {}
+        self._declared_visibility: dict[str, list[str]] = {}
+        # None represents referenced package groups which we were not able to fetch
+        self._package_groups: dict[str, PackageGroup | None] = {}
+        self._lock = Lock()
+
+    def register_declared_visibility(self, dep: str, visibility: list[str]) -> None:
+        """
+        Only provide visibility attributes which have been explicitly specified. Otherwise, the visibility depends on
+        the package default visibility.
+        """
+        with self._lock:
+            self._declared_visibility[normalize_label(dep)] = [normalize_label(v) for v in visibility]
+
+    def register_package_group(self, name: str, package_group: PackageGroup) -> None:
+        """
+        Provide an already known package group, which thus does not have to be fetched.
+        """
+        with self._lock:
+            self._package_groups[normalize_label(name)] = package_group
+
+    def filter_visible(self, target: str, candidates: list[str]) -> list[str]:
+        package = get_package(target)
+        with self._lock:
+            unknown_candidates = self._evaluate_candidates(package=package, candidates=candidates)
+        visible_candidates = (
+            self._query_visible(target=target, candidates=sorted(unknown_candidates)) if unknown_candidates else set()
+        )
+        with self._lock:
+            for dep in unknown_candidates:
+                self._cache[(package, dep)] = dep in visible_candidates
+            return [dep for dep in candidates if self._cache[(package, dep)]]
+
+    def _evaluate_candidates(self, package: str, candidates: list[str]) -> set[str]:
+        """
+        Evaluate and cache the visibility of the candidates we can decide offline. Return the candidates we have to ask
+        Bazel about.
+        """
+        unknown_candidates = set()
+        for dep in candidates:
+            if (package, dep) in self._cache:
+                continue
+            if (is_visible := self._evaluate_visibility(package=package, dep=dep)) is None:
+                unknown_candidates.add(dep)
+            else:
+                self._cache[(package, dep)] = is_visible
+        return unknown_candidates
+
+    def _evaluate_visibility(self, package: str, dep: str) -> bool | None:
+        if get_package(dep) == package:
+            return True
+        declared_visibility = self._declared_visibility.get(normalize_label(dep))
+        if declared_visibility is None or split_package(package)[0] != "":
+            # We evaluate visibility only for consumers from the main repository, as we cannot compare repository
+            # names reliably due to the mix of apparent and canonical repository names
+            return None
+
+        result = False
+        for spec in declared_visibility:
+            if spec == PUBLIC_VISIBILITY:
+                return True
+            if spec == PRIVATE_VISIBILITY:
+                continue
+            spec_package, _, spec_name = spec.rpartition(":")
+            if spec_name == "__pkg__":
+                matches = is_package_matching(package=package, spec_package=spec_package, recursive=False)
+            elif spec_name == "__subpackages__":
+                matches = is_package_matching(package=package, spec_package=spec_package, recursive=True)
+            else:
+                matches = self._is_in_package_group(package=package, group=spec)
+
+            if matches:
+                return True
+            if matches is None:
+                result = None
+        return result
+
+    def _is_in_package_group(self, package: str, group: str, visited: frozenset[str] = frozenset()) -> bool | None:
+        if group not in self._package_groups:
+            self._fetch_package_groups()
+            self._package_groups.setdefault(group, None)
+        package_group = self._package_groups[group]
+        if package_group is None or group in visited:
+            return None
+
+        is_member = False
+        for spec in package_group.packages:
+            is_negation = spec.startswith("-")
+            matches = match_package_specification(package=package, spec=spec.removeprefix("-"))
+            if matches is None:
+                return None
+            if matches and is_negation:
+                is_member = False
+                break
+            is_member = is_member or matches
+        if is_member:
+            return True
+
+        result = False
+        for included_group in package_group.includes:
+            matches = self._is_in_package_group(package=package, group=included_group, visited=visited | {group})
+            if matches:
+                return True
+            if matches is None:
+                result = None
+        return result
+
+    def _fetch_package_groups(self) -> None:
+        """
+        Fetch all package groups referenced by the visibility attributes we know so far with a single query. Package
+        groups can include further package groups, which we have to fetch afterwards.
+        """
+        referenced_groups = {
+            spec
+            for visibility in self._declared_visibility.values()
+            for spec in visibility
+            if is_package_group_reference(spec)
+        }
+        groups = sorted(referenced_groups - self._package_groups.keys())
+        while groups:
+            log.debug(f"Fetching {len(groups)} package groups for evaluating visibility")
+            groups_set = " ".join(f'"{group}"' for group in groups)
+            process = self._bazel_query.execute(
+                query=f"set({groups_set})",
+                args=["--output=streamed_jsonproto"],
+                enforce_query=True,
+                use_query_file=True,
+            )
+            for line in process.stdout.splitlines():
+                if line and (target := json.loads(line))["type"] == "PACKAGE_GROUP":
+                    name, package_group = parse_package_group(target["packageGroup"])
+                    self._package_groups[name] = package_group
+            # Remember groups which are not reported as package group to not fetch them again
+            for group in groups:
+                self._package_groups.setdefault(group, None)
+            groups = sorted(
+                {
+                    include
+                    for package_group in self._package_groups.values()
+                    if package_group is not None
+                    for include in package_group.includes
+                    if is_package_group_reference(include)
+                }
+                - self._package_groups.keys()
+            )
+
+    def _query_visible(self, target: str, candidates: list[str]) -> set[str]:
+        """
+        Bazel query reports labels from external repositories with their canonical repository name, whereas the
+        candidates can use apparent repository names, e.g. if they are derived from the processed dependencies. Thus,
+        we map the reported labels back to the candidates. If canonical names are involved, both are compared in their
+        canonical form based on the repository mapping of the main repository.
+        """
+        log.debug(f"Checking visibility of {len(candidates)} dependencies for target '{target}'")
+        candidates_set = " ".join(f'"{dep}"' for dep in candidates)
+        process = self._bazel_query.execute(
+            query=f'visible("{target}", set({candidates_set}))',
+            args=["--output=label"],
+            enforce_query=True,
+            use_query_file=True,
+        )
+        visible = {normalize_label(line.strip()) for line in process.stdout.splitlines() if line.strip()}
+        if not any(label.startswith("@@") for label in chain(visible, map(normalize_label, candidates))):
+            return {dep for dep in candidates if normalize_label(dep) in visible}
+
+        repo_mapping = self._bazel_query.get_repo_mapping()
+        visible = {to_canonical_label(label=label, repo_mapping=repo_mapping) for label in visible}
+        return {dep for dep in candidates if to_canonical_label(label=dep, repo_mapping=repo_mapping) in visible}
@@ -378,13 +378,48 @@ def _gather_transitive_reports(ctx):
             reports.extend(_dywu_results_from_deps(ctx.rule.attr.implementation_deps))
     return reports
 
-def _return_on_skip(ctx):
+def _aggregate_reports(ctx, target, reports):
+    """
+    Aggregate the findings from all reports into a single manifest. Since this action runs only after all analysis
+    actions finished, the analysis actions do not fail for findings in this mode. Instead, this action fails if any
+    report contains findings.
+    """
+    manifest = ctx.actions.declare_file("{}_dwyu_manifest.jsonl".format(target.label.name))
+
+    args = make_param_file_args(ctx)
+    args.add("--target", str(target.label))
+    args.add("--output", manifest)
+    args.add_all("--reports", reports, omit_if_empty = False)
+    if _is_verbose(ctx):
+        args.add("--verbose")
+
+    ctx.actions.run(
+        executable = ctx.executable._tool_aggregate_reports,
+        inputs = reports,
+        outputs = [manifest],
+        mnemonic = "DwyuAggregateReports",
+        progress_message = "Aggregate DWYU reports for {}".format(target.label),
+        arguments = [args],
+    )
+
+    return manifest
+
+def _make_output_groups(ctx, target, reports):
+    """
+    The manifest is only created if its output group is requested. As the manifest output group is not propagated to
+    the dependencies, only the manifests for the targets requested on the command line are created.
+    """
+    if not ctx.attr._aggregate_reports:
+        return [OutputGroupInfo(dwyu = reports)]
+    return [OutputGroupInfo(dwyu = reports, dwyu_manifest = depset([_aggregate_reports(ctx, target, reports)]))]
+
+def _return_on_skip(ctx, target):
     """
     In recursive mode we have to decide if skipping a target also stops the recursive analysis of its dependencies.
     """
     if ctx.attr._recursion_stops_on_skip:
         return []
-    return [OutputGroupInfo(dwyu = depset(transitive = _gather_transitive_reports(ctx)))]
+    return _make_output_groups(ctx, target = target, reports = depset(transitive = _gather_transitive_reports(ctx)))
 
 def _extract_includes_from_files(ctx, config, target, files, defines, cc_toolchain, attr_prefix):
     """
@@ -460,21 +495,21 @@ def dwyu_cc_aspect_impl(target, ctx):
 
     # We might extend the list of supported rules eventually, but right now we only support and test the core cc_* rules.
     if not ctx.rule.kind in ["cc_binary", "cc_library", "cc_test"]:
-        return _return_on_skip(ctx)
+        return _return_on_skip(ctx, target)
 
     # Skip targets which the user explicitly excluded from the analysis.
     # In contrast to the other skipping mechanisms we still propagate the reports of the dependencies.
     # Excluding a single target from the analysis shall not stop the recursive analysis below it.
     if _is_skipped_target(ctx, target):
-        return _return_on_skip(ctx)
+        return _return_on_skip(ctx, target)
 
     # If configured, skip external targets
     if ctx.attr._skip_external_targets and _is_external(ctx):
-        return _return_on_skip(ctx)
+        return _return_on_skip(ctx, target)
 
     # Skip targets which explicitly opt-out
     if any([tag in ctx.attr._skip_tags for tag in ctx.rule.attr.tags]):
-        return _return_on_skip(ctx)
+        return _return_on_skip(ctx, target)
 
     cc_toolchain = find_cc_toolchain(ctx)
     feature_configuration = cc_common.configure_features(
@@ -487,23 +522,23 @@ def dwyu_cc_aspect_impl(target, ctx):
     for feature in ctx.attr._skip_features:
         if feature.startswith("-"):
             if feature[1:] in ctx.disabled_features:
-                return _return_on_skip(ctx)
+                return _return_on_skip(ctx, target)
         elif feature in ctx.features:
-            return _return_on_skip(ctx)
+            return _return_on_skip(ctx, target)
 
     for feature in ctx.attr._skip_toolchain_features:
         if feature.startswith("-"):
             if not cc_common.is_enabled(feature_configuration = feature_configuration, feature_name = feature[1:]):
-                return _return_on_skip(ctx)
+                return _return_on_skip(ctx, target)
         elif cc_common.is_enabled(feature_configuration = feature_configuration, feature_name = feature):
-            return _return_on_skip(ctx)
+            return _return_on_skip(ctx, target)
 
     public_files, private_files = _get_target_sources(ctx.rule)
 
     # We skip targets which have no source files. cc_* targets can also be of value if they only specify the 'deps'
     # attribute without own sources. But those targets are not of interest for DWYU.
     if not public_files and not private_files:
-        return _return_on_skip(ctx)
+        return _return_on_skip(ctx, target)
 
     #
     # Execute DWYU analysis for the target under inspection
@@ -566,6 +601,8 @@ def dwyu_cc_aspect_impl(target, ctx):
         args.add("--report_missing_direct_deps")
     if config.report_unused_deps:
         args.add("--report_unused_deps")
+    if ctx.attr._aggregate_reports:
+        args.add("--defer_failure")
     if _is_verbose(ctx):
         args.add("--verbose")
 
@@ -583,4 +620,4 @@ def dwyu_cc_aspect_impl(target, ctx):
     )
 
     accumulated_reports = depset(direct = [report_file], transitive = _gather_transitive_reports(ctx))
-    return [OutputGroupInfo(dwyu = accumulated_reports)]
+    return _make_output_groups(ctx, target = target, reports = accumulated_reports)
@@ -28,6 +28,7 @@ def _validate_skip_targets(patterns):
             fail("Invalid 'skip_targets' pattern '{}'. Patterns have to name a target explicitly (e.g. '//foo:bar' or '//foo:all').".format(pattern))
 
 def dwyu_cc_aspect_factory(
+        aggregate_reports = False,
         analysis_ignores_private_headers_from_deps = True,
         analysis_optimizes_impl_deps = False,
         analysis_reports_missing_direct_deps = True,
@@ -68,6 +69,14 @@ def dwyu_cc_aspect_factory(
     | `dwyu:preprocessing_mode=<mode>`                       | Control the preprocessing mode. |
 
     Args:
+        aggregate_reports: Setting this to `True` allows requesting the output group `dwyu_manifest`, e.g. via `--output_groups=dwyu_manifest`.
+                           For each target the aspect is applied to, this creates a single manifest file `<target_name>_dwyu_manifest.jsonl`.
+                           The manifest contains one line per analyzed target with findings, which includes the findings and the path to the DWYU report file.
+                           The `apply_fixes` tool can read the manifest via `--dwyu-manifest` instead of discovering and reading the individual report files.<br>
+                           In this mode, the analysis of the individual targets does not fail for findings.
+                           Instead, creating the manifest fails if any of the analyzed targets has findings.
+                           Thus, always request the `dwyu_manifest` output group when using this option, as otherwise no findings cause a failure.
+
         analysis_ignores_private_headers_from_deps: Setting this to `False` will allow headers listed in the `srcs` attributes of a dependency to fulfill the DWYU checks on top of those from the `hdrs` attribute.
                                                     By default, DWYU uses only headers from the `hdrs` attribute.</br>
                                                     Strictly speaking, using headers from the `srcs` attribute of a dependency is wrong, as they are an implementation detail of the dependency.
@@ -236,6 +245,9 @@ def dwyu_cc_aspect_factory(
             "dwyu_verbose": attr.bool(
                 default = verbose,
             ),
+            "_aggregate_reports": attr.bool(
+                default = aggregate_reports,
+            ),
             "_ignored_includes": attr.label_list(
                 default = aspect_ignored_includes,
                 allow_files = [".json"],
@@ -271,6 +283,12 @@ def dwyu_cc_aspect_factory(
                 providers = [DwyuCcInfoMappingInfo],
                 default = aspect_target_mapping,
             ),
+            "_tool_aggregate_reports": attr.label(
+                default = Label("//dwyu/cc/aspect/private/aggregate_reports:main"),
+                executable = True,
+                cfg = "exec",
+                doc = "Aggregate the findings from all DWYU reports of a target and its dependencies into a single manifest.",
+            ),
             "_tool_analyze_includes": attr.label(
                 default = Label("//dwyu/cc/aspect/private/analyze_includes:main"),
                 executable = True,
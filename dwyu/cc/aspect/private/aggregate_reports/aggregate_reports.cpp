@@ -0,0 +1,49 @@
+#include "dwyu/cc/aspect/private/aggregate_reports/aggregate_reports.h"
+
+#include <nlohmann/json.hpp>
+
+#include <array>
+#include <cstddef>
+#include <fstream>
+#include <ostream>
+#include <stdexcept>
+#include <string>
+#include <vector>
+
+namespace dwyu {
+
+bool hasFindings(const nlohmann::json& report) {
+    // Report fields listing findings
+    const std::array<const char*, 5> findings{{"public_includes_without_dep", "private_includes_without_dep",
+                                               "unused_deps", "unused_implementation_deps",
+                                               "deps_which_should_be_private"}};
+    for (const auto* finding : findings) {
+        const auto it = report.find(finding);
+        if (it != report.end() && !it->empty()) {
+            return true;
+        }
+    }
+    return false;
+}
+
+std::size_t aggregateReports(const std::vector<std::string>& report_paths, std::ostream& manifest) {
+    std::size_t reports_with_findings{0};
+    for (const auto& report_path : report_paths) {
+        std::ifstream report_file{report_path};
+        if (!report_file.is_open()) {
+            throw std::runtime_error("Unable to open report file '" + report_path + "'");
+        }
+        auto report = nlohmann::json::parse(report_file);
+        if (!hasFindings(report)) {
+            continue;
+        }
+
+        // Inline the findings, but keep the report path to allow locating the files stored next to the report
+        report["report"] = report_path;
+        manifest << report.dump() << "\n";
+        ++reports_with_findings;
+    }
+    return reports_with_findings;
+}
+
+} // namespace dwyu
@@ -0,0 +1,22 @@
+#ifndef DWYU_CC_ASPECT_PRIVATE_AGGREGATE_REPORTS_AGGREGATE_REPORTS_H
+#define DWYU_CC_ASPECT_PRIVATE_AGGREGATE_REPORTS_AGGREGATE_REPORTS_H
+
+#include <nlohmann/json.hpp>
+
+#include <cstddef>
+#include <ostream>
+#include <string>
+#include <vector>
+
+namespace dwyu {
+
+// A report without any finding belongs to a target which passed the analysis
+bool hasFindings(const nlohmann::json& report);
+
+// Write each report with findings as a single line into the manifest. The report path is added to each entry to allow
+// locating the files stored next to the report. Returns the amount of reports with findings.
+std::size_t aggregateReports(const std::vector<std::string>& report_paths, std::ostream& manifest);
+
+} // namespace dwyu
+
+#endif
@@ -0,0 +1,80 @@
+#include "dwyu/cc/aspect/private/aggregate_reports/aggregate_reports.h"
+#include "dwyu/cc/private/program_options.h"
+#include "dwyu/cc/private/utils.h"
+
+#include <exception>
+#include <fstream>
+#include <iostream>
+#include <string>
+#include <vector>
+
+namespace dwyu {
+namespace {
+
+struct ProgramOptions {
+    std::string target{};
+    std::string output{};
+    std::vector<std::string> reports{};
+    bool verbose{false};
+};
+
+ProgramOptions parseProgramOptions(const int argc, ProgramOptionsParser::ConstCharArray argv) {
+    ProgramOptions options{};
+
+    ProgramOptionsParser parser{};
+    // Target for which the reports are aggregated
+    parser.addOptionValue("--target", options.target);
+    // Stores the manifest in this file
+    parser.addOptionValue("--output", options.output);
+    // DWYU reports of the target and its transitive dependencies
+    parser.addOptionList("--reports", options.reports);
+    // Print debugging information
+    parser.addOptionFlag("--verbose", options.verbose);
+    parser.parseOptions(argc, argv);
+
+    return options;
+}
+
+void printOptions(const ProgramOptions& options) {
+    std::cout << "\n";
+    std::cout << ">> Aggregating reports for " << options.target << "\n";
+    std::cout << "\n";
+    std::cout << "Output            : " << options.output << "\n";
+    std::cout << "Reports           : " << listToStr(options.reports) << "\n";
+}
+
+int main_impl(const ProgramOptions& options) {
+    if (options.verbose) {
+        printOptions(options);
+    }
+
+    std::ofstream output{options.output};
+    if (!output.is_open()) {
+        abortWithError("Unable to open output file '", options.output, "'");
+    }
+
+    const auto failing_targets = aggregateReports(options.reports, output);
+    output.close();
+
+    if (failing_targets > 0 || options.verbose) {
+        std::cout << "DWYU found issues in " << failing_targets << " of " << options.reports.size()
+                  << " analyzed targets\n";
+        std::cout << "DWYU Manifest: " << options.output << "\n";
+    }
+
+    return failing_targets == 0 ? 0 : 1;
+}
+
+} // namespace
+} // namespace dwyu
+
+int main(int argc, char* argv[]) {
+    try {
+        return dwyu::main_impl(dwyu::parseProgramOptions(argc, argv));
+    } catch (const std::exception& exception) {
+        dwyu::abortWithError("Aborting due to exception: ", exception.what());
+    } catch (...) {
+        dwyu::abortWithError("Aborting due to an unknown exception");
+    }
+    return 1;
+}
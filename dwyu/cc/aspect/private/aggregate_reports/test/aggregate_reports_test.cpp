@@ -0,0 +1,77 @@
+#include "dwyu/cc/aspect/private/aggregate_reports/aggregate_reports.h"
+
+#include <gtest/gtest.h>
+#include <nlohmann/json.hpp>
+
+#include <sstream>
+#include <stdexcept>
+#include <string>
+
+namespace dwyu {
+namespace {
+
+constexpr const char* report_with_findings{
+    "dwyu/cc/aspect/private/aggregate_reports/test/data/report_with_findings.json"};
+constexpr const char* report_without_findings{
+    "dwyu/cc/aspect/private/aggregate_reports/test/data/report_without_findings.json"};
+
+TEST(HasFindings, FalseForReportWithEmptyFindings) {
+    const auto report = nlohmann::json::parse(R"({"analyzed_target": "//:foo", "unused_deps": [],
+                                                  "public_includes_without_dep": {}, "use_implementation_deps": true})");
+    EXPECT_FALSE(hasFindings(report));
+}
+
+TEST(HasFindings, FalseForReportWithoutFindingFields) {
+    const auto report = nlohmann::json::parse(R"({"analyzed_target": "//:foo", "is_ok": true})");
+    EXPECT_FALSE(hasFindings(report));
+}
+
+TEST(HasFindings, TrueForAnyKindOfFinding) {
+    EXPECT_TRUE(hasFindings(nlohmann::json::parse(R"({"public_includes_without_dep": {"a.h": ["b.h"]}})")));
+    EXPECT_TRUE(hasFindings(nlohmann::json::parse(R"({"private_includes_without_dep": {"a.cpp": ["b.h"]}})")));
+    EXPECT_TRUE(hasFindings(nlohmann::json::parse(R"({"unused_deps": ["//:bar"]})")));
+    EXPECT_TRUE(hasFindings(nlohmann::json::parse(R"({"unused_implementation_deps": ["//:bar"]})")));
+    EXPECT_TRUE(hasFindings(nlohmann::json::parse(R"({"deps_which_should_be_private": ["//:bar"]})")));
+}
+
+TEST(AggregateReports, EmptyManifestWithoutReports) {
+    std::ostringstream manifest{};
+
+    EXPECT_EQ(aggregateReports({}, manifest), 0U);
+    EXPECT_EQ(manifest.str(), "");
+}
+
+TEST(AggregateReports, SkipReportsWithoutFindings) {
+    std::ostringstream manifest{};
+
+    EXPECT_EQ(aggregateReports({report_without_findings}, manifest), 0U);
+    EXPECT_EQ(manifest.str(), "");
+}
+
+TEST(AggregateReports, InlineReportsWithFindingsAndTheirPath) {
+    std::ostringstream manifest{};
+
+    const auto reports_with_findings =
+        aggregateReports({report_without_findings, report_with_findings, report_with_findings}, manifest);
+
+    EXPECT_EQ(reports_with_findings, 2U);
+    std::istringstream lines{manifest.str()};
+    std::string line{};
+    for (int i = 0; i < 2; ++i) {
+        ASSERT_TRUE(std::getline(lines, line));
+        const auto entry = nlohmann::json::parse(line);
+        EXPECT_EQ(entry["analyzed_target"], "//foo:bad");
+        EXPECT_EQ(entry["unused_deps"], nlohmann::json::parse(R"(["//baz:baz"])"));
+        EXPECT_EQ(entry["report"], report_with_findings);
+    }
+    EXPECT_FALSE(std::getline(lines, line));
+}
+
+TEST(AggregateReports, ThrowForMissingReport) {
+    std::ostringstream manifest{};
+
+    EXPECT_THROW(aggregateReports({"does/not/exist.json"}, manifest), std::runtime_error);
+}
+
+} // namespace
+} // namespace dwyu
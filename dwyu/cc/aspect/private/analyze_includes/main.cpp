@@ -30,6 +30,7 @@ struct ProgramOptions {
     bool optimize_implementation_deps{};
     bool report_missing_direct_deps{};
     bool report_unused_deps{};
+    bool defer_failure{};
     bool verbose{false};
 };
 
@@ -63,6 +64,8 @@ ProgramOptions parseProgramOptions(int argc, ProgramOptionsParser::ConstCharArra
     parser.addOptionFlag("--report_missing_direct_deps", options.report_missing_direct_deps);
     // If this is checked, the analysis will report unused dependencies.
     parser.addOptionFlag("--report_unused_deps", options.report_unused_deps);
+    // Do not fail for findings, as a later action aggregating the reports is responsible for failing
+    parser.addOptionFlag("--defer_failure", options.defer_failure);
     // Print debugging information
     parser.addOptionFlag("--verbose", options.verbose);
 
@@ -86,6 +89,7 @@ int main_impl(const ProgramOptions& options) {
         std::cout << "Optimize implementation deps     : " << options.optimize_implementation_deps << "\n";
         std::cout << "Report missing direct deps       : " << options.report_missing_direct_deps << "\n";
         std::cout << "Report unused deps               : " << options.report_unused_deps << "\n";
+        std::cout << "Defer failure                    : " << options.defer_failure << "\n";
         std::cout << "\n";
     }
 
@@ -112,7 +116,7 @@ int main_impl(const ProgramOptions& options) {
         dwyu::abortWithError("Unable to open output file '", options.output, "'");
     }
 
-    return result.isOk() ? 0 : 1;
+    return result.isOk() || options.defer_failure ? 0 : 1;
 }
 
 } // namespace
@@ -123,6 +123,9 @@ nlohmann::json Result::toJson(const bool use_implementation_deps) const {
     // Only cc_library targets with the 'optimize_implementation_deps' flag set to true should add missing private
     // dependencies to 'implementation_deps'.
     data["use_implementation_deps"] = use_implementation_deps;
+    // Allows skipping reports without findings without decoding them. The fixing script relies on the compact output
+    // of the ordered keys, which places 'analyzed_target' first, and looks for the raw '"is_ok":true' marker.
+    data["is_ok"] = isOk();
     return data;
 }
 
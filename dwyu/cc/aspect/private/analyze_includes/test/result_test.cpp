@@ -120,6 +120,16 @@ TEST(Result, dumpToJsonForSuccess) {
     EXPECT_TRUE(data["unused_implementation_deps"].empty());
     EXPECT_TRUE(data["deps_which_should_be_private"].empty());
     EXPECT_TRUE(data["use_implementation_deps"].get<bool>());
+    EXPECT_TRUE(data["is_ok"].get<bool>());
+}
+
+TEST(Result, dumpToJsonStartsWithAnalyzedTargetAndContainsCompactOkMarker) {
+    const Result unit{"//:foo"};
+
+    const auto dumped = unit.toJson(false).dump();
+
+    EXPECT_THAT(dumped, testing::StartsWith(R"({"analyzed_target":"//:foo",)"));
+    EXPECT_THAT(dumped, testing::HasSubstr(R"("is_ok":true)"));
 }
 
 TEST(Result, dumpToJsonForFailure) {
@@ -149,6 +159,7 @@ TEST(Result, dumpToJsonForFailure) {
     EXPECT_EQ(data["unused_implementation_deps"], unused_impl_deps);
     EXPECT_EQ(data["deps_which_should_be_private"], public_deps_which_should_be_private);
     EXPECT_FALSE(data["use_implementation_deps"].get<bool>());
+    EXPECT_FALSE(data["is_ok"].get<bool>());
 
     ASSERT_THAT(getMapKeys(data["public_includes_without_dep"]),
                 testing::UnorderedElementsAre("pub_file_a.h", "pub_file_b.h"));
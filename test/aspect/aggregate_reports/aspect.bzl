@@ -0,0 +1,3 @@
+load("@depend_on_what_you_use//dwyu/cc:defs.bzl", "dwyu_cc_aspect_factory")
+
+dwyu_aggregate_reports = dwyu_cc_aspect_factory(aggregate_reports = True, recursive = True)
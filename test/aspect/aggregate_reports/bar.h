@@ -0,0 +1,10 @@
+#ifndef BAR_H
+#define BAR_H
+
+#include "aggregate_reports/foo.h"
+
+int doBar() {
+    return doFoo();
+}
+
+#endif
@@ -0,0 +1,8 @@
+#ifndef FOO_H
+#define FOO_H
+
+int doFoo() {
+    return 1;
+}
+
+#endif
@@ -0,0 +1,5 @@
+#include "aggregate_reports/bar.h"
+
+int main() {
+    return doBar();
+}
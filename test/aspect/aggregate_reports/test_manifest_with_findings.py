@@ -0,0 +1,22 @@
+from expected_result import ExpectedDwyuFailure, ExpectedManifest
+from test_case import TestCaseBase
+
+from test.support.result import Result
+
+
+class TestCase(TestCaseBase):
+    def execute_test_logic(self) -> Result:
+        expected = ExpectedManifest(
+            [
+                ExpectedDwyuFailure(
+                    target="//aggregate_reports:with_findings", unused_public_deps=["//aggregate_reports:unused_dep"]
+                )
+            ]
+        )
+        actual = self._run_dwyu(
+            target="//aggregate_reports:with_findings",
+            aspect=self.choose_aspect("//aggregate_reports:aspect.bzl%dwyu_aggregate_reports"),
+            extra_args=["--output_groups=dwyu_manifest"],
+        )
+
+        return self._check_result(actual=actual, expected=expected)
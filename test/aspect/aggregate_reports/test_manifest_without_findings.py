@@ -0,0 +1,16 @@
+from expected_result import ExpectedManifest
+from test_case import TestCaseBase
+
+from test.support.result import Result
+
+
+class TestCase(TestCaseBase):
+    def execute_test_logic(self) -> Result:
+        actual = self._run_dwyu(
+            target="//aggregate_reports:valid",
+            aspect=self.choose_aspect("//aggregate_reports:aspect.bzl%dwyu_aggregate_reports"),
+            # The manifest path is only reported for failures or in verbose mode
+            extra_args=["--output_groups=dwyu_manifest", "--aspects_parameters=dwyu_verbose=True"],
+        )
+
+        return self._check_result(actual=actual, expected=ExpectedManifest([]))
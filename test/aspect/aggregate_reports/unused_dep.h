@@ -0,0 +1,8 @@
+#ifndef UNUSED_DEP_H
+#define UNUSED_DEP_H
+
+int doNothing() {
+    return 0;
+}
+
+#endif
@@ -7,6 +7,7 @@ from test.support.result import Error, Result, Success
 
 DWYU_FAILURE = "Result: FAILURE"
 DWYU_REPORT = "DWYU Report:"
+DWYU_MANIFEST = "DWYU Manifest:"
 
 
 def normalize_file_path(path: str) -> str:
@@ -111,6 +112,46 @@ class ExpectedResult:
         return not self.success and return_code != 0 and DWYU_FAILURE in output
 
 
+class ExpectedManifest(ExpectedResult):
+    """
+    Expectation for a DWYU aspect with 'aggregate_reports = True' when requesting the 'dwyu_manifest' output group.
+    Only creating the manifest fails and the manifest contains exactly the findings of the failing targets.
+    The path of the manifest is printed only for failures or in verbose mode.
+    """
+
+    def __init__(self, failures: list[ExpectedDwyuFailure]) -> None:
+        super().__init__(success=not failures, failures=failures)
+
+    def matches_expectation(self, return_code: int, dwyu_output: str, reports_root: Path) -> Result:  # noqa: PLR0911
+        if (return_code == 0) != self.success:
+            return Error("unexpected DWYU status code")
+
+        manifest_paths = [
+            line.split(DWYU_MANIFEST)[1].strip() for line in dwyu_output.splitlines() if DWYU_MANIFEST in line
+        ]
+        if len(manifest_paths) != 1:
+            return Error("expected exactly one DWYU manifest")
+        manifest = reports_root / manifest_paths[0]
+        if not manifest.exists():
+            return Error(f"missing DWYU manifest file: {manifest}")
+
+        entries = [json.loads(line) for line in manifest.read_text().splitlines() if line.strip()]
+        if len(self.failures) != len(entries):
+            return Error("number of DWYU manifest entries does not match expected failures")
+
+        all_entries = {normalize_target_name(entry["analyzed_target"]): entry for entry in entries}
+        for expected_failure in self.failures:
+            entry = all_entries.get(normalize_target_name(expected_failure.target))
+            if entry is None:
+                return Error("missing manifest entry for expected failure")
+            if not (reports_root / entry["report"]).exists():
+                return Error(f"missing DWYU report file: {reports_root / entry['report']}")
+            if not expected_failure.check_expectation(entry):
+                return Error("found unexpected DWYU results")
+
+        return Success()
+
+
 class ExpectedSuccess(ExpectedResult):
     def __init__(self) -> None:
         super().__init__(success=True, failures=[])
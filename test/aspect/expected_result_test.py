@@ -1,8 +1,17 @@
 import json
 import unittest
 from pathlib import Path
-
-from expected_result import DWYU_FAILURE, DWYU_REPORT, ExpectedDwyuFailure, ExpectedFailure, ExpectedSuccess
+from tempfile import TemporaryDirectory
+
+from expected_result import (
+    DWYU_FAILURE,
+    DWYU_MANIFEST,
+    DWYU_REPORT,
+    ExpectedDwyuFailure,
+    ExpectedFailure,
+    ExpectedManifest,
+    ExpectedSuccess,
+)
 
 from test.support.result import Error, Success
 
@@ -204,6 +213,66 @@ class ExpectedResultTest(unittest.TestCase):
         self.assertEqual(result.error, "found unexpected DWYU results")
 
 
+class ExpectedManifestTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.reports = Path(tmp_dir.name)
+        (self.reports / "foo.json").write_text(json.dumps(make_report_data(analyzed_target="//:foo")))
+
+    def _make_manifest(self, entries: list[dict]) -> str:
+        (self.reports / "manifest.jsonl").write_text("".join(f"{json.dumps(entry)}\n" for entry in entries))
+        return f"{DWYU_MANIFEST} manifest.jsonl"
+
+    def test_empty_manifest_for_success(self) -> None:
+        unit = ExpectedManifest([])
+        output = self._make_manifest([])
+
+        result = unit.matches_expectation(return_code=0, dwyu_output=output, reports_root=self.reports)
+
+        self.assertTrue(result.is_success())
+
+    def test_manifest_with_findings(self) -> None:
+        unit = ExpectedManifest([make_failure(target="//:foo", unused_public_deps=["//:bar"])])
+        output = self._make_manifest(
+            [{**make_report_data(analyzed_target="@@//:foo", unused_deps=["@@//:bar"]), "report": "foo.json"}]
+        )
+
+        result = unit.matches_expectation(return_code=1, dwyu_output=output, reports_root=self.reports)
+
+        self.assertTrue(result.is_success())
+
+    def test_fail_for_unexpected_status_code(self) -> None:
+        output = self._make_manifest([])
+
+        result = ExpectedManifest([]).matches_expectation(return_code=1, dwyu_output=output, reports_root=self.reports)
+
+        self.assertEqual(result.error, "unexpected DWYU status code")
+
+    def test_fail_for_missing_manifest(self) -> None:
+        result = ExpectedManifest([]).matches_expectation(return_code=0, dwyu_output="", reports_root=self.reports)
+
+        self.assertEqual(result.error, "expected exactly one DWYU manifest")
+
+    def test_fail_for_unexpected_manifest_entry(self) -> None:
+        unit = ExpectedManifest([make_failure(target="//:foo", unused_public_deps=["//:bar"])])
+        output = self._make_manifest(
+            [{**make_report_data(analyzed_target="//:foo", unused_deps=["//:unexpected"]), "report": "foo.json"}]
+        )
+
+        result = unit.matches_expectation(return_code=1, dwyu_output=output, reports_root=self.reports)
+
+        self.assertEqual(result.error, "found unexpected DWYU results")
+
+    def test_fail_for_wrong_number_of_manifest_entries(self) -> None:
+        unit = ExpectedManifest([make_failure(target="//:foo")])
+        output = self._make_manifest([])
+
+        result = unit.matches_expectation(return_code=1, dwyu_output=output, reports_root=self.reports)
+
+        self.assertEqual(result.error, "number of DWYU manifest entries does not match expected failures")
+
+
 class TestResult(unittest.TestCase):
     def test_success(self) -> None:
         unit = Success()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+
+import argparse
+import logging
+import subprocess
+import sys
+from collections.abc import Callable
+from io import StringIO
+from pathlib import Path
+from time import perf_counter
+from typing import Any
+
+logging.basicConfig(format="%(message)s", level=logging.INFO)
+log = logging.getLogger()
+
+# Allow importing the apply_fixes code. Relative imports do not work in our case.
+WS_ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(WS_ROOT))
+
+from dwyu.apply_fixes.bazel_query import iter_streamed_jsonproto  # noqa: E402
+from dwyu.apply_fixes.search_missing_deps import (  # noqa: E402
+    Dependency,
+    DependencyGraph,
+    VirtualIncludes,
+    make_lean_proto_args,
+    target_to_path,
+)
+
+#
+# Test Parameters
+#
+
+ITERATIONS = 5
+
+BENCHMARKS_DIR = WS_ROOT / "test/benchmark"
+RECORDING_DIR = BENCHMARKS_DIR / "generated/query_output"
+JSON_RECORDING = "query.streamed_jsonproto"
+PROTO_RECORDING = "query.streamed_proto"
+
+
+def record_query_output(workspace: Path, target: str) -> None:
+    """
+    Record the output of the batched dependency graph query apply_fixes executes for the given targets.
+    """
+    RECORDING_DIR.mkdir(parents=True, exist_ok=True)
+    for output, recording in (("streamed_jsonproto", JSON_RECORDING), ("streamed_proto", PROTO_RECORDING)):
+        cmd = [
+            "bazel",
+            "query",
+            f"--output={output}",
+            "--noimplicit_deps",
+            *make_lean_proto_args(with_rule_inputs=True),
+            f'kind("rule", deps({target}))',
+        ]
+        log.info(f"Recording query output: {' '.join(cmd)}")
+        with (RECORDING_DIR / recording).open("wb") as recording_file:
+            subprocess.run(cmd, cwd=workspace, check=True, stdout=recording_file)
+
+
+def make_target_message_class() -> type:
+    """
+    Protobuf message class for the subset of 'blaze_query.Target' from Bazel's build.proto which apply_fixes queries.
+    The descriptor is created at runtime to avoid generating bindings for build.proto. Fields not part of the subset
+    are skipped by the protobuf runtime while parsing.
+    """
+    from google.protobuf import descriptor_pb2, descriptor_pool, message_factory  # noqa: PLC0415
+
+    field = descriptor_pb2.FieldDescriptorProto
+    optional, repeated = field.LABEL_OPTIONAL, field.LABEL_REPEATED
+    file_proto = descriptor_pb2.FileDescriptorProto(
+        name="dwyu_build_subset.proto", package="dwyu_blaze_query", syntax="proto2"
+    )
+    messages = {
+        "Attribute": [
+            ("name", 1, field.TYPE_STRING, optional, None),
+            ("string_value", 5, field.TYPE_STRING, optional, None),
+            ("string_list_value", 6, field.TYPE_STRING, repeated, None),
+            ("explicitly_specified", 13, field.TYPE_BOOL, optional, None),
+        ],
+        "Rule": [
+            ("name", 1, field.TYPE_STRING, optional, None),
+            ("rule_class", 2, field.TYPE_STRING, optional, None),
+            ("attribute", 4, field.TYPE_MESSAGE, repeated, ".dwyu_blaze_query.Attribute"),
+            ("rule_input", 5, field.TYPE_STRING, repeated, None),
+        ],
+        "Target": [
+            ("type", 1, field.TYPE_INT32, optional, None),
+            ("rule", 2, field.TYPE_MESSAGE, optional, ".dwyu_blaze_query.Rule"),
+        ],
+    }
+    for message_name, fields in messages.items():
+        message = file_proto.message_type.add(name=message_name)
+        for name, number, field_type, label, type_name in fields:
+            message_field = message.field.add(name=name, number=number, type=field_type, label=label)
+            if type_name:
+                message_field.type_name = type_name
+
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(file_proto)
+    return message_factory.GetMessageClass(pool.FindMessageTypeByName("dwyu_blaze_query.Target"))
+
+
+def read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def parse_proto_dependency(rule: Any) -> Dependency | None:  # noqa: ANN401
+    """
+    Equivalent to 'parse_dependency' working directly on the protobuf message instead of a decoded JSON document.
+    """
+    hdrs = None
+    strings = {}
+    visibility = None
+    for attr in rule.attribute:
+        if not attr.explicitly_specified:
+            continue
+        if attr.name == "hdrs":
+            hdrs = list(attr.string_list_value)
+        elif attr.name == "visibility":
+            visibility = list(attr.string_list_value)
+        elif attr.name in ("name", "include_prefix", "strip_include_prefix"):
+            strings[attr.name] = attr.string_value
+    if not hdrs:
+        return None
+
+    added_prefix = strings.get("include_prefix", "")
+    stripped_prefix = strings.get("strip_include_prefix", "")
+    return Dependency(
+        target=rule.name,
+        headers=[target_to_path(hdr) for hdr in hdrs],
+        visibility=visibility,
+        virtual_includes=VirtualIncludes(
+            header_labels=hdrs,
+            target_name=strings.get("name", ""),
+            added_prefix=added_prefix,
+            stripped_prefix=stripped_prefix,
+        )
+        if added_prefix or stripped_prefix
+        else None,
+    )
+
+
+def build_graph_from_json(output: str) -> int:
+    graph = DependencyGraph()
+    for target in iter_streamed_jsonproto(StringIO(output)):
+        graph.add_target(target)
+    return len(graph._pending_rule_inputs)  # noqa: SLF001
+
+
+def build_graph_from_proto(output: bytes, target_message_class: type) -> int:
+    graph = DependencyGraph()
+    pos = 0
+    while pos < len(output):
+        length, pos = read_varint(output, pos)
+        target = target_message_class.FromString(output[pos : pos + length])
+        pos += length
+        rule = target.rule
+        dependency = parse_proto_dependency(rule) if rule.rule_class.startswith("cc_") else None
+        graph.add_rule(name=rule.name, rule_inputs=rule.rule_input, dependency=dependency)
+    return len(graph._pending_rule_inputs)  # noqa: SLF001
+
+
+def measure(description: str, build_graph: Callable[[], int]) -> float:
+    times = []
+    targets = 0
+    for _ in range(ITERATIONS):
+        start = perf_counter()
+        targets = build_graph()
+        times.append(perf_counter() - start)
+    log.info(f"  {description:<20}: {min(times):.3f} [s] for {targets} targets")
+    return min(times)
+
+
+def main(args: argparse.Namespace) -> None:
+    """
+    Benchmarking building the dependency graph apply_fixes uses to search for missing dependencies from the query
+    output. We compare decoding the 'streamed_jsonproto' output with the json module to parsing the binary
+    'streamed_proto' output with the protobuf runtime. The protobuf messages are evaluated directly instead of being
+    converted to the JSON structure. The query outputs are recorded once and decoded from memory to measure purely the
+    decoding and graph construction.
+    """
+    if args.record:
+        record_query_output(workspace=args.workspace, target=args.target)
+
+    json_output = (RECORDING_DIR / JSON_RECORDING).read_text(encoding="utf-8")
+    proto_output = (RECORDING_DIR / PROTO_RECORDING).read_bytes()
+
+    log.info("\n#### Running Benchmark - Decoding query output\n")
+    log.info(f"  Size streamed_jsonproto : {len(json_output.encode()) / 1e6:.1f} [MB]")
+    log.info(f"  Size streamed_proto     : {len(proto_output) / 1e6:.1f} [MB]\n")
+    json_time = measure("streamed_jsonproto", lambda: build_graph_from_json(json_output))
+    try:
+        target_message_class = make_target_message_class()
+    except ImportError:
+        log.info("\n  Skipping streamed_proto, the Python package 'protobuf' is not available\n")
+        return
+    proto_time = measure("streamed_proto", lambda: build_graph_from_proto(proto_output, target_message_class))
+    log.info(f"\n  Speedup: {json_time / proto_time:.2f}\n")
+
+
+def cli() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help=f"Record the query outputs instead of using a previous recording from '{RECORDING_DIR}'.",
+    )
+    parser.add_argument(
+        "--workspace",
+        type=Path,
+        default=BENCHMARKS_DIR,
+        help="Workspace in which the query is recorded. Use a large project for meaningful results.",
+    )
+    parser.add_argument(
+        "--target",
+        default="//...",
+        help="Target pattern for which the dependency graph is queried.",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(cli())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+
+import argparse
+import logging
+import sys
+from collections.abc import Callable, Iterable
+from os import walk
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+logging.basicConfig(format="%(message)s", level=logging.INFO)
+log = logging.getLogger()
+
+# Allow importing the apply_fixes code. Relative imports do not work in our case.
+WS_ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(WS_ROOT))
+
+from dwyu.apply_fixes.get_dwyu_reports import REPORT_SUFFIX, search_reports  # noqa: E402
+
+#
+# Test Parameters
+#
+
+ITERATIONS = 3
+
+# Files per directory in the synthetic output tree
+FILES_PER_PACKAGE = 10
+OBJECTS_PER_PACKAGE = 20
+VIRTUAL_HEADERS_PER_PACKAGE = 10
+RUNFILES_PER_PACKAGE = 40
+
+
+def create_package(package: Path, index: int) -> int:
+    """
+    Create a package resembling the output of a cc_library analyzed by DWYU and of a binary with runfiles.
+    Returns the amount of created files and directories.
+    """
+    target = f"lib_{index}"
+    virtual_includes = package / "_virtual_includes" / target
+    objects = package / "_objs" / target
+    runfiles = package / f"bin_{index}.runfiles" / "_main"
+    for directory in (virtual_includes, objects, runfiles):
+        directory.mkdir(parents=True)
+
+    (package / f"{target}{REPORT_SUFFIX}").touch()
+    for i in range(FILES_PER_PACKAGE):
+        (package / f"{target}_processed_dep_{i}.json").touch()
+    for i in range(OBJECTS_PER_PACKAGE):
+        (objects / f"file_{i}.o").touch()
+    for i in range(VIRTUAL_HEADERS_PER_PACKAGE):
+        (virtual_includes / f"header_{i}.h").touch()
+    for i in range(RUNFILES_PER_PACKAGE):
+        (runfiles / f"data_{i}").touch()
+    return 9 + FILES_PER_PACKAGE + OBJECTS_PER_PACKAGE + VIRTUAL_HEADERS_PER_PACKAGE + RUNFILES_PER_PACKAGE
+
+
+def create_output_tree(root: Path, entries: int) -> int:
+    """
+    Create an output tree with nested packages until the desired amount of files and directories exists.
+    Returns the amount of packages.
+    """
+    created = 0
+    packages = 0
+    while created < entries:
+        package = root / f"dir_{packages % 100}" / f"sub_{packages // 100 % 100}" / f"pkg_{packages}"
+        package.mkdir(parents=True)
+        created += create_package(package=package, index=packages)
+        packages += 1
+    return packages
+
+
+def walk_all(search_path: Path) -> Iterable[Path]:
+    """
+    Search for reports like apply_fixes did before pruning directories and listing them in parallel.
+    """
+    for root, _, files in walk(search_path):
+        for file in files:
+            if file.endswith(REPORT_SUFFIX):
+                yield Path(root) / file
+
+
+def measure(description: str, search: Callable[[], Iterable[Path]]) -> float:
+    times = []
+    reports = 0
+    for _ in range(ITERATIONS):
+        start = perf_counter()
+        reports = sum(1 for _ in search())
+        times.append(perf_counter() - start)
+    log.info(f"  {description:<20}: {min(times):.3f} [s] for {reports} reports")
+    return min(times)
+
+
+def main(args: argparse.Namespace) -> None:
+    """
+    Benchmarking the discovery of report files in a synthetic output tree. We compare walking the whole tree to the
+    pruned and parallel search apply_fixes uses. Beware, on a local file system the results are dominated by the file
+    system cache. The parallel search is expected to shine on network file systems.
+    """
+    with TemporaryDirectory(dir=args.directory) as tmp_dir:
+        root = Path(tmp_dir)
+        log.info(f"\nCreating output tree with {args.entries} entries in '{root}'")
+        packages = create_output_tree(root=root, entries=args.entries)
+        log.info(f"Created {packages} packages")
+
+        log.info("\n#### Running Benchmark - Discovering reports\n")
+        walk_time = measure("os.walk", lambda: walk_all(root))
+        search_time = measure("search_reports", lambda: search_reports(root, threads=args.threads))
+        log.info(f"\n  Speedup: {walk_time / search_time:.2f}\n")
+
+
+def cli() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--entries",
+        type=int,
+        default=1_000_000,
+        help="Amount of files and directories in the synthetic output tree.",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=16,
+        help="Amount of directories listed in parallel.",
+    )
+    parser.add_argument(
+        "--directory",
+        type=Path,
+        help="Create the synthetic output tree in this directory, e.g. on a network file system.",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(cli())